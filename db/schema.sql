@@ -19,6 +19,8 @@ create table if not exists va_messages (
   content text
 );
 create index if not exists idx_va_messages_session_id on va_messages(session_id);
+-- keyset paging of a session's history (where session_id = ? and id < ? order by id desc)
+create index if not exists idx_va_messages_session_id_id on va_messages(session_id, id);
 alter table va_messages enable row level security;
 
 create table if not exists va_tool_events (
@@ -32,6 +34,91 @@ create table if not exists va_tool_events (
 create index if not exists idx_va_tool_events_session_id on va_tool_events(session_id);
 alter table va_tool_events enable row level security;
 
+-- Pre-aggregated counters so dashboards read O(1) rows instead of running
+-- count(*) over va_sessions / va_messages. Maintained by statement-level
+-- triggers (one update per insert batch); va_stats_reconcile() recomputes
+-- everything from scratch and can be run periodically.
+alter table va_sessions add column if not exists message_count int not null default 0;
+alter table va_sessions add column if not exists last_message_at timestamptz;
+
+create table if not exists va_stats (
+  key text primary key,
+  value bigint not null default 0,
+  updated_at timestamptz default now()
+);
+-- seeded from the current row counts; run `select va_stats_reconcile();` once
+-- after adding the columns to fill message_count/last_message_at for old rows
+insert into va_stats(key, value)
+  select 'va_sessions', count(*) from va_sessions
+  union all select 'va_messages', count(*) from va_messages
+on conflict (key) do nothing;
+alter table va_stats enable row level security;
+
+create or replace function va_stats_sessions_trg() returns trigger
+language plpgsql as $$
+begin
+  if tg_op = 'INSERT' then
+    update va_stats set value = value + (select count(*) from new_rows), updated_at = now() where key = 'va_sessions';
+  else
+    update va_stats set value = value - (select count(*) from old_rows), updated_at = now() where key = 'va_sessions';
+  end if;
+  return null;
+end $$;
+
+drop trigger if exists va_stats_sessions_ins on va_sessions;
+create trigger va_stats_sessions_ins after insert on va_sessions
+  referencing new table as new_rows for each statement execute function va_stats_sessions_trg();
+drop trigger if exists va_stats_sessions_del on va_sessions;
+create trigger va_stats_sessions_del after delete on va_sessions
+  referencing old table as old_rows for each statement execute function va_stats_sessions_trg();
+
+create or replace function va_stats_messages_trg() returns trigger
+language plpgsql as $$
+begin
+  if tg_op = 'INSERT' then
+    update va_stats set value = value + (select count(*) from new_rows), updated_at = now() where key = 'va_messages';
+    update va_sessions s
+      set message_count = s.message_count + d.n,
+          last_message_at = greatest(s.last_message_at, d.last_at)
+      from (select session_id, count(*) as n, max(created_at) as last_at
+              from new_rows where session_id is not null group by session_id) d
+      where s.id = d.session_id;
+  else
+    update va_stats set value = value - (select count(*) from old_rows), updated_at = now() where key = 'va_messages';
+    update va_sessions s
+      set message_count = greatest(0, s.message_count - d.n)
+      from (select session_id, count(*) as n
+              from old_rows where session_id is not null group by session_id) d
+      where s.id = d.session_id;
+  end if;
+  return null;
+end $$;
+
+drop trigger if exists va_stats_messages_ins on va_messages;
+create trigger va_stats_messages_ins after insert on va_messages
+  referencing new table as new_rows for each statement execute function va_stats_messages_trg();
+drop trigger if exists va_stats_messages_del on va_messages;
+create trigger va_stats_messages_del after delete on va_messages
+  referencing old table as old_rows for each statement execute function va_stats_messages_trg();
+
+create or replace function va_stats_reconcile() returns jsonb
+language plpgsql as $$
+declare s bigint; m bigint;
+begin
+  select count(*) into s from va_sessions;
+  select count(*) into m from va_messages;
+  update va_stats set value = s, updated_at = now() where key = 'va_sessions';
+  update va_stats set value = m, updated_at = now() where key = 'va_messages';
+  update va_sessions v
+    set message_count = coalesce(d.n, 0), last_message_at = d.last_at
+    from va_sessions s2
+    left join (select session_id, count(*) as n, max(created_at) as last_at
+                 from va_messages group by session_id) d on d.session_id = s2.id
+    where v.id = s2.id
+      and (v.message_count is distinct from coalesce(d.n, 0) or v.last_message_at is distinct from d.last_at);
+  return jsonb_build_object('va_sessions', s, 'va_messages', m);
+end $$;
+
 create table if not exists va_settings (
   id bigint primary key generated always as identity,
   key text unique,
@@ -40,6 +127,38 @@ create table if not exists va_settings (
 );
 alter table va_settings enable row level security;
 
+-- Settings version counter: bumped (and announced via NOTIFY va_settings) on
+-- every write to va_settings so each replica can drop its cached snapshot.
+create table if not exists va_settings_version (
+  id int primary key default 1 check (id = 1),
+  version bigint not null default 0,
+  updated_at timestamptz default now()
+);
+insert into va_settings_version(id, version) values (1, 0) on conflict (id) do nothing;
+alter table va_settings_version enable row level security;
+
+create or replace function va_settings_bump() returns bigint
+language plpgsql as $$
+declare v bigint;
+begin
+  update va_settings_version set version = version + 1, updated_at = now()
+    where id = 1 returning version into v;
+  perform pg_notify('va_settings', v::text);
+  return v;
+end $$;
+
+create or replace function va_settings_bump_trg() returns trigger
+language plpgsql as $$
+begin
+  perform va_settings_bump();
+  return null;
+end $$;
+
+drop trigger if exists va_settings_version_bump on va_settings;
+create trigger va_settings_version_bump
+  after insert or update or delete on va_settings
+  for each statement execute function va_settings_bump_trg();
+
 -- Optional seed
 insert into va_settings(key, value)
 values
@@ -81,6 +200,72 @@ create table if not exists va_task_events (
   data jsonb               -- free-form event payload
 );
 create index if not exists idx_va_task_events_task on va_task_events(task_id);
+-- resuming a task stream (where task_id = ? and id > ? order by id)
+create index if not exists idx_va_task_events_task_id on va_task_events(task_id, id);
+
+-- va_tasks is the Ops queue. Workers on any replica claim the oldest queued
+-- task with FOR UPDATE SKIP LOCKED, so two workers never claim the same row.
+-- Each claim is a lease held by lease_owner until lease_until and renewed by
+-- heartbeats. Heartbeat and finish only succeed for the current owner of a
+-- running task, so a worker whose lease expired (or whose task was
+-- cancelled) learns it lost the task and stops. Expired leases go back to
+-- 'queued' until max_attempts is reached.
+alter table va_tasks add column if not exists lease_owner text;
+alter table va_tasks add column if not exists lease_until timestamptz;
+alter table va_tasks add column if not exists heartbeat_at timestamptz;
+alter table va_tasks add column if not exists attempts int not null default 0;
+alter table va_tasks add column if not exists started_at timestamptz;
+alter table va_tasks add column if not exists finished_at timestamptz;
+create index if not exists idx_va_tasks_queued on va_tasks(id) where status = 'queued';
+create index if not exists idx_va_tasks_lease on va_tasks(lease_until) where status = 'running';
+
+create or replace function va_task_claim(p_worker text, p_lease_s int default 60) returns setof va_tasks
+language sql as $$
+  with c as (
+    select id from va_tasks where status = 'queued' order by id
+    for update skip locked limit 1
+  )
+  update va_tasks t
+    set status = 'running', lease_owner = p_worker, lease_until = now() + make_interval(secs => p_lease_s),
+        heartbeat_at = now(), attempts = t.attempts + 1, started_at = coalesce(t.started_at, now()), error = null
+    from c where t.id = c.id
+    returning t.*;
+$$;
+
+create or replace function va_task_heartbeat(p_id bigint, p_worker text, p_lease_s int default 60) returns boolean
+language plpgsql as $$
+begin
+  update va_tasks set lease_until = now() + make_interval(secs => p_lease_s), heartbeat_at = now()
+    where id = p_id and status = 'running' and lease_owner = p_worker;
+  return found;
+end $$;
+
+create or replace function va_task_finish(p_id bigint, p_worker text, p_status text, p_error text default null)
+returns boolean
+language plpgsql as $$
+begin
+  update va_tasks set status = p_status, error = p_error, finished_at = now(), lease_owner = null, lease_until = null
+    where id = p_id and status = 'running' and lease_owner = p_worker;
+  return found;
+end $$;
+
+create or replace function va_task_requeue_expired(p_max_attempts int default 3) returns int
+language plpgsql as $$
+declare n int;
+begin
+  with x as (
+    select id from va_tasks where status = 'running' and lease_until < now()
+    for update skip locked
+  )
+  update va_tasks t
+    set status = case when t.attempts >= p_max_attempts then 'failed' else 'queued' end,
+        error = case when t.attempts >= p_max_attempts then 'lease expired' else t.error end,
+        finished_at = case when t.attempts >= p_max_attempts then now() else null end,
+        lease_owner = null, lease_until = null
+    from x where t.id = x.id;
+  get diagnostics n = row_count;
+  return n;
+end $$;
 create table if not exists va_meeting_segments (
   id bigint primary key generated always as identity,
   created_at timestamptz default now(),
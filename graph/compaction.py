@@ -0,0 +1,284 @@
+"""Rolling summary of older turns for long sessions.
+
+`graph.memory` sends prior turns trimmed to a token budget, so once a
+session outgrows the budget its oldest turns silently fall off, and until
+then every turn resends the whole history. With compaction on,
+`build_messages` sends:
+
+  - one system message carrying the session's rolling summary of the turns
+    before the window, then
+  - the turns since the summary's boundary verbatim (at least
+    AGENT_COMPACT_KEEP_TURNS of them), then the new message.
+
+When more than KEEP_TURNS + AGENT_COMPACT_BATCH turns have piled up past
+the boundary, the oldest of them are folded into the summary: the previous
+summary plus only those turns are summarized again, so the cost per fold is
+bounded. The fold runs in a background thread; the turn that triggered it
+still goes out with the previous summary. Long code blocks and tool output
+in folded turns are dropped before summarizing, and in verbatim turns older
+than the last two.
+
+The boundary is kept two ways. In-process it is a turn position
+(`graph.memory` reports how many turns it trimmed off the front, so
+positions stay valid as the capped list scrolls). Positions don't survive a
+restart or a re-seed, so the boundary is also stored as a fingerprint of
+the last two folded turns. A fingerprint is matched at its oldest
+occurrence: if a later turn pair repeats the boundary pair ("status?" and
+the same answer), matching the newer copy would skip the turns in between,
+which would then be in neither the summary nor the verbatim window.
+Matching too early only re-sends some summarized turns. Summaries are kept
+per session in-process and persisted as a `context_summary` tool event,
+which is read back when a session is first seen by this process; nothing is
+regenerated on a cold start.
+
+With the LangGraph agent enabled (AGENT_USE_LANGGRAPH and OPENAI_API_KEY),
+the summary is written by AGENT_COMPACT_MODEL. Otherwise it is a clipped
+extract of the folded turns.
+
+Environment:
+  - AGENT_COMPACT (default 1): set 0 to disable
+  - AGENT_COMPACT_KEEP_TURNS (default 12)
+  - AGENT_COMPACT_BATCH (default 6): turns folded at least per summary update
+  - AGENT_COMPACT_SUMMARY_TOKENS (default 400)
+  - AGENT_COMPACT_MODEL (default: the lightest AGENT_MODEL_TIERS tier, else OPENAI_MODEL)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from vme_lib import supabase_client as _sb
+from graph.memory import count_tokens
+
+PREFIX = "Summary of the earlier conversation:\n"
+_FENCE = re.compile(r"```[^\n]*\n(.*?)```", re.DOTALL)
+_MAX_BLOCK_CHARS = 400
+_MAX_SESSIONS = 512
+
+
+def strip_outputs(text: str) -> str:
+    """Replace long fenced blocks (code, tool output) with a one-line marker."""
+    def repl(m: "re.Match[str]") -> str:
+        body = m.group(1)
+        if len(body) <= _MAX_BLOCK_CHARS:
+            return m.group(0)
+        return f"[{body.count(chr(10)) + 1} lines of output omitted]"
+    return _FENCE.sub(repl, text or "")
+
+
+def _fingerprint(turns: List[Dict[str, Any]], end: int) -> Optional[str]:
+    if end <= 0:
+        return None
+    h = hashlib.sha1()
+    for t in turns[max(0, end - 2):end]:
+        h.update(f"{t.get('role')}\0{t.get('content')}\0".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def extract_summary(previous: str, turns: List[Dict[str, Any]], max_tokens: int, model: Optional[str] = None) -> str:
+    """No-model fallback: previous summary plus one clipped line per turn, newest kept."""
+    lines = [l for l in (previous or "").splitlines() if l.strip()]
+    for t in turns:
+        text = " ".join(str(t.get("content") or "").split())
+        if text:
+            lines.append(f"{t.get('role', 'user').capitalize()}: {text[:160]}")
+    while len(lines) > 1 and count_tokens("\n".join(lines), model) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def llm_summary(previous: str, turns: List[Dict[str, Any]], max_tokens: int, model: Optional[str] = None) -> str:
+    if not (os.getenv("OPENAI_API_KEY") and os.getenv("AGENT_USE_LANGGRAPH", "0") in ("1", "true", "yes")):
+        return extract_summary(previous, turns, max_tokens, model)
+    try:
+        from langchain_openai import ChatOpenAI
+        from graph import model_router as _router
+
+        tiers = _sb.settings_get("AGENT_MODEL_TIERS", os.getenv("AGENT_MODEL_TIERS", ""))
+        default = str(_sb.settings_get("OPENAI_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini")))
+        name = os.getenv("AGENT_COMPACT_MODEL") or _router.parse_tiers(tiers, default)[0]
+        base_url = _sb.settings_get("OPENAI_BASE_URL", os.getenv("OPENAI_BASE_URL")) or None
+        llm = ChatOpenAI(model=name, temperature=0, max_tokens=max_tokens, base_url=base_url,
+                         api_key=_sb.settings_get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"), decrypt=True))
+        convo = "\n".join(f"{t.get('role')}: {t.get('content')}" for t in turns)
+        prompt = ("Update the running summary of a coding-assistant conversation with the new turns. "
+                  "Keep decisions, file paths, open tasks and user preferences; drop pleasantries and tool output. "
+                  f"Answer with the updated summary only, under {max_tokens} tokens.\n\n"
+                  f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{convo}")
+        out = llm.invoke(prompt)
+        text = str(getattr(out, "content", out) or "").strip()
+        return text or extract_summary(previous, turns, max_tokens, model)
+    except Exception:
+        return extract_summary(previous, turns, max_tokens, model)
+
+
+def _load_persisted(session_id: int) -> Optional[Dict[str, Any]]:
+    rows = _sb.select_tool_events(session_id=session_id, limit=1, tool_name="context_summary")
+    out = rows[0].get("output_json") if rows else None
+    return out if isinstance(out, dict) and out.get("summary") else None
+
+
+def _persist(session_id: int, state: Dict[str, Any]):
+    _sb.safe_log_tool_event(session_id=session_id, tool_name="context_summary",
+                            input_json={"folded": state["folded"]},
+                            output_json={"summary": state["summary"], "fp": state["fp"], "folded": state["folded"]})
+
+
+class Compactor:
+    def __init__(self, keep_turns: int = 12, batch: int = 6, summary_tokens: int = 400,
+                 summarize: Callable[[str, List[Dict[str, Any]], int, Optional[str]], str] = llm_summary,
+                 loader: Callable[[int], Optional[Dict[str, Any]]] = _load_persisted,
+                 persist: Callable[[int, Dict[str, Any]], None] = _persist,
+                 background: bool = True):
+        self.keep_turns = max(1, keep_turns)
+        self.batch = max(1, batch)
+        self.summary_tokens = summary_tokens
+        self._summarize = summarize
+        self._loader = loader
+        self._persist = persist
+        self.background = background
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._folding: set = set()
+        self._stats = {"folds": 0, "fold_errors": 0, "folded_turns": 0, "loads": 0, "reused": 0}
+
+    def _state(self, sid: int) -> Dict[str, Any]:
+        with self._lock:
+            st = self._data.get(sid)
+            if st is not None:
+                self._data.move_to_end(sid)
+                return st
+        try:
+            saved = self._loader(sid)
+        except Exception:
+            saved = None
+        with self._lock:
+            self._stats["loads"] += 1
+            st = self._data.setdefault(sid, {
+                "summary": (saved or {}).get("summary") or "",
+                "fp": (saved or {}).get("fp"),
+                "pos": None,  # offset-based boundary, valid in this process only
+                "folded": int((saved or {}).get("folded") or 0),
+            })
+            self._data.move_to_end(sid)
+            while len(self._data) > _MAX_SESSIONS:
+                self._data.popitem(last=False)
+            return st
+
+    @staticmethod
+    def _boundary(turns: List[Dict[str, Any]], fp: Optional[str], pos: Optional[int] = None, offset: int = 0) -> int:
+        """Index of the first turn not yet in the summary."""
+        if fp is None:
+            return 0
+        if pos is not None:
+            end = pos - offset
+            if end <= 0:
+                return 0  # boundary scrolled out of the loaded turns: all of them are newer
+            if end <= len(turns) and _fingerprint(turns, end) == fp:
+                return end
+        # oldest first: a repeat of the boundary pair further on must not skip the turns between
+        for end in range(1, len(turns) + 1):
+            if _fingerprint(turns, end) == fp:
+                return end
+        return 0  # boundary scrolled out of the loaded turns: all of them are newer
+
+    def context(self, session_id: Any, turns: List[Dict[str, Any]], model: Optional[str] = None,
+                offset: int = 0) -> Tuple[str, int]:
+        """(summary, n): the summary to send and how many of the newest turns to send verbatim.
+
+        `offset` is the number of older turns trimmed off the front of `turns`
+        (see `ConversationMemory.snapshot`).
+        """
+        sid = _sb._coerce_session_id(session_id)
+        if sid is None:
+            return "", len(turns)
+        st = self._state(sid)
+        with self._lock:
+            fp, pos = st["fp"], st["pos"]
+        start = self._boundary(turns, fp, pos, offset)
+        if fp is not None and start:
+            with self._lock:
+                if st["fp"] == fp:
+                    st["pos"] = offset + start
+        pending = len(turns) - start
+        if pending >= self.keep_turns + self.batch:
+            end = len(turns) - self.keep_turns
+            if self.background:
+                self._fold_async(sid, turns, start, end, model, offset)
+            else:
+                self._fold(sid, turns, start, end, model, offset)
+                start = end
+        elif st["summary"]:
+            with self._lock:
+                self._stats["reused"] += 1
+        return st["summary"], len(turns) - start
+
+    def _fold_async(self, sid: int, turns: List[Dict[str, Any]], start: int, end: int, model: Optional[str],
+                    offset: int = 0):
+        with self._lock:
+            if sid in self._folding:
+                return
+            self._folding.add(sid)
+
+        def run():
+            try:
+                self._fold(sid, turns, start, end, model, offset)
+            finally:
+                with self._lock:
+                    self._folding.discard(sid)
+
+        threading.Thread(target=run, name="vme-compact", daemon=True).start()
+
+    def _fold(self, sid: int, turns: List[Dict[str, Any]], start: int, end: int, model: Optional[str],
+              offset: int = 0):
+        st = self._state(sid)
+        folded = [{"role": t.get("role"), "content": strip_outputs(t.get("content") or "")} for t in turns[start:end]]
+        try:
+            summary = self._summarize(st["summary"], folded, self.summary_tokens, model)
+        except Exception:
+            with self._lock:
+                self._stats["fold_errors"] += 1
+            return
+        with self._lock:
+            st.update(summary=summary, fp=_fingerprint(turns, end), pos=offset + end,
+                      folded=st["folded"] + len(folded))
+            self._stats["folds"] += 1
+            self._stats["folded_turns"] += len(folded)
+            snapshot = dict(st)
+        try:
+            self._persist(sid, snapshot)
+        except Exception:
+            pass
+
+    def forget(self, session_id: Any):
+        with self._lock:
+            self._data.pop(_sb._coerce_session_id(session_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(sessions=len(self._data), folding=len(self._folding),
+                       keep_turns=self.keep_turns, batch=self.batch)
+        return out
+
+
+_ENABLED = os.getenv("AGENT_COMPACT", "1").lower() not in ("0", "false", "no", "off")
+compactor = Compactor(
+    keep_turns=int(os.getenv("AGENT_COMPACT_KEEP_TURNS", "12")),
+    batch=int(os.getenv("AGENT_COMPACT_BATCH", "6")),
+    summary_tokens=int(os.getenv("AGENT_COMPACT_SUMMARY_TOKENS", "400")),
+)
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def stats() -> Dict[str, Any]:
+    out = compactor.stats()
+    out["enabled"] = _ENABLED
+    return out
@@ -0,0 +1,244 @@
+"""Conversation memory for the agent graph.
+
+`routes/agent.chat` used to hand the graph only the newest user message, so
+every turn started cold. `ConversationMemory` keeps each session's user /
+assistant turns in-process and returns them trimmed to a token budget, to be
+sent ahead of the new message.
+
+Turns are recorded by the route as they happen, so a follow-up arriving
+before the write-behind logger has flushed still sees the previous reply.
+Sessions not held in memory (first use after a restart, eviction, another
+replica) are seeded once from the persisted messages through
+`vme_lib.history_cache`, which serves from its LRU or does a single keyset
+read of the newest rows — never a full `va_messages` scan. Persistence is
+therefore the message log itself (Supabase or the SQLite backend).
+
+Token counts come from tiktoken when it is installed (and its encoding is
+available locally); otherwise a chars/4 estimate is used. Counts are cached
+per message so trimming is a walk over integers.
+
+Long sessions are compacted by `graph.compaction`: turns before a rolling
+summary boundary are replaced by one system message holding the summary.
+
+Environment:
+  - AGENT_MEMORY (default 1): set 0 to send only the new message
+  - AGENT_MEMORY_TOKENS (default 3000): budget for prior turns + new message
+  - AGENT_MEMORY_MAX_MESSAGES (default 60): turns kept per session
+  - AGENT_MEMORY_MAX_SESSIONS (default 512): sessions kept in memory (LRU)
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from vme_lib import supabase_client as _sb
+
+try:
+    import tiktoken  # type: ignore
+except Exception:
+    tiktoken = None
+
+# OpenAI chat format adds a few tokens of framing per message
+_PER_MESSAGE_TOKENS = 4
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    key = model or ""
+    if key in _encodings:
+        return _encodings[key]
+    enc = None
+    try:
+        enc = tiktoken.encoding_for_model(model) if model else None
+    except Exception:
+        enc = None
+    if enc is None:
+        try:
+            enc = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            enc = None  # encoding files unavailable offline
+    _encodings[key] = enc
+    return enc
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    enc = _encoding(model)
+    if enc is not None:
+        try:
+            return len(enc.encode(text or "", disallowed_special=()))
+        except Exception:
+            pass
+    return len(text or "") // 4 + 1
+
+
+def _load_persisted(session_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Newest `limit` persisted messages of a session, oldest first."""
+    sb = _sb._client()
+    if not sb:
+        return []
+    # rows this process logged may still be queued for write-behind
+    _sb.log_writer_flush(timeout=0.5)
+    from vme_lib import history_cache
+    page = history_cache.history_page(sb, session_id, limit)
+    return list(reversed(page["rows"]))
+
+
+class ConversationMemory:
+    def __init__(self, max_sessions: int = 512, max_messages: int = 60,
+                 loader: Callable[[int, int], List[Dict[str, Any]]] = _load_persisted):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._dropped: Dict[int, int] = {}  # turns trimmed from the front since the session was loaded
+        self._stats = {"hits": 0, "seeds": 0, "seed_errors": 0, "trimmed": 0}
+
+    def _turns(self, sid: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            turns = self._data.get(sid)
+            if turns is not None:
+                self._data.move_to_end(sid)
+                self._stats["hits"] += 1
+                return turns
+        try:
+            rows = self._loader(sid, self.max_messages)
+            self._stats["seeds"] += 1
+        except Exception:
+            rows = []
+            self._stats["seed_errors"] += 1
+        seeded = [{"role": r.get("role"), "content": r.get("content") or ""}
+                  for r in rows if r.get("role") in ("user", "assistant")]
+        with self._lock:
+            if sid not in self._data:
+                self._dropped[sid] = 0
+            turns = self._data.setdefault(sid, seeded)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_sessions:
+                old, _ = self._data.popitem(last=False)
+                self._dropped.pop(old, None)
+            return turns
+
+    def turns(self, session_id: Any) -> List[Dict[str, Any]]:
+        """Copy of the session's turns, oldest first."""
+        return self.snapshot(session_id)[1]
+
+    def snapshot(self, session_id: Any) -> Tuple[int, List[Dict[str, Any]]]:
+        """(offset, turns): turns as in `turns()`, and how many older turns were trimmed off the front.
+
+        `offset + i` names the same turn across calls while the session stays
+        loaded; it restarts at 0 when the session is seeded again.
+        """
+        sid = _sb._coerce_session_id(session_id)
+        if sid is None:
+            return 0, []
+        turns = self._turns(sid)
+        with self._lock:
+            return self._dropped.get(sid, 0), [{"role": t["role"], "content": t["content"]} for t in turns]
+
+    def window(self, session_id: Any, message: str, budget: int, model: Optional[str] = None,
+               keep: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Prior turns (oldest first) that fit in `budget` tokens alongside `message`.
+
+        `keep` limits the candidates to the newest `keep` turns.
+        """
+        sid = _sb._coerce_session_id(session_id)
+        if sid is None:
+            return []
+        turns = self._turns(sid)
+        left = budget - count_tokens(message, model) - _PER_MESSAGE_TOKENS
+        picked: List[Dict[str, Any]] = []
+        with self._lock:
+            candidates = turns if keep is None else turns[len(turns) - keep:] if keep > 0 else []
+            for t in reversed(candidates):
+                n = t.get("tokens")
+                if n is None or t.get("model") != model:
+                    n = count_tokens(t["content"], model) + _PER_MESSAGE_TOKENS
+                    t["tokens"], t["model"] = n, model
+                if n > left:
+                    break
+                left -= n
+                picked.append({"role": t["role"], "content": t["content"]})
+            if len(picked) < len(candidates):
+                self._stats["trimmed"] += 1
+        picked.reverse()
+        return picked
+
+    def append(self, session_id: Any, role: str, content: str):
+        sid = _sb._coerce_session_id(session_id)
+        if sid is None:
+            return
+        with self._lock:
+            turns = self._data.get(sid)
+            if turns is None:
+                return  # not loaded; the next window() seeds from storage
+            turns.append({"role": role, "content": content or ""})
+            if len(turns) > self.max_messages:
+                n = len(turns) - self.max_messages
+                del turns[:n]
+                self._dropped[sid] = self._dropped.get(sid, 0) + n
+
+    def forget(self, session_id: Any):
+        sid = _sb._coerce_session_id(session_id)
+        with self._lock:
+            self._data.pop(sid, None)
+            self._dropped.pop(sid, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._dropped.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["sessions"] = len(self._data)
+        out["tokenizer"] = "tiktoken" if _encoding(None) is not None else "estimate"
+        return out
+
+
+_ENABLED = os.getenv("AGENT_MEMORY", "1").lower() not in ("0", "false", "no", "off")
+_BUDGET = int(os.getenv("AGENT_MEMORY_TOKENS", "3000"))
+memory = ConversationMemory(
+    max_sessions=int(os.getenv("AGENT_MEMORY_MAX_SESSIONS", "512")),
+    max_messages=int(os.getenv("AGENT_MEMORY_MAX_MESSAGES", "60")),
+)
+
+
+def build_messages(session_id: Any, message: str, model: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Graph input messages for a turn: [summary], trimmed prior turns, then the new user message."""
+    if not _ENABLED:
+        return [{"role": "user", "content": message}]
+    from graph import compaction as _compaction
+
+    if not _compaction.enabled():
+        return memory.window(session_id, message, _BUDGET, model) + [{"role": "user", "content": message}]
+    offset, turns = memory.snapshot(session_id)
+    summary, recent = _compaction.compactor.context(session_id, turns, model, offset=offset)
+    head = [{"role": "system", "content": _compaction.PREFIX + summary}] if summary else []
+    budget = _BUDGET - sum(count_tokens(m["content"], model) + _PER_MESSAGE_TOKENS for m in head)
+    history = memory.window(session_id, message, budget, model, keep=recent)
+    # output pasted into older replies is stale by now
+    for t in history[:-2]:
+        t["content"] = _compaction.strip_outputs(t["content"])
+    return head + history + [{"role": "user", "content": message}]
+
+
+def record(session_id: Any, role: str, content: str):
+    if _ENABLED:
+        memory.append(session_id, role, content)
+
+
+def stats() -> Dict[str, Any]:
+    out = memory.stats()
+    out.update(enabled=_ENABLED, budget_tokens=_BUDGET)
+    try:
+        from graph import compaction as _compaction
+        out["compaction"] = _compaction.stats()
+    except Exception:
+        pass
+    return out
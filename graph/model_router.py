@@ -0,0 +1,151 @@
+"""Pick a model tier per agent turn.
+
+One `OPENAI_MODEL` used to serve everything from "hi" to a multi-tool
+refactor. With AGENT_MODEL_TIERS set (lightest first, e.g.
+"gpt-4o-mini,gpt-4o") each turn is routed:
+
+  - a session override (`set_override`) always wins;
+  - "hard" turns — a prompt over AGENT_ROUTER_LARGE_TOKENS, or a last user
+    message that looks like it needs tools (files, git, tables) — go to the
+    heavier tiers, heaviest first;
+  - everything else goes to the lighter tiers, lightest first;
+  - within those candidates the first tier whose recent p95 latency is under
+    AGENT_ROUTER_P95_MS (or not yet measured) is used; if all are over it,
+    the one with the lowest p95.
+
+The decision is returned as a dict and recorded with the turn's tool events
+(tool_name "model_router"). With a single tier routing is a no-op.
+
+Environment / settings:
+  - AGENT_MODEL_TIERS (default: OPENAI_MODEL only)
+  - AGENT_ROUTER_LARGE_TOKENS (default 1500)
+  - AGENT_ROUTER_P95_MS (default 8000)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from graph.memory import count_tokens
+
+_TOOL_HINTS = re.compile(
+    r"\b(files?|folders?|director(y|ies)|read|write|edit|save|ls|list|repo|code|refactor|"
+    r"fix|git|status|diff|commit|push|branch|tables?|rows?|supabase|select|upsert)\b",
+    re.IGNORECASE,
+)
+_MAX_OVERRIDES = 1024
+
+
+def parse_tiers(raw: Any, default: str) -> List[str]:
+    tiers = [t.strip() for t in str(raw or "").split(",") if t.strip()]
+    return tiers or [default]
+
+
+class ModelRouter:
+    def __init__(self, tiers: List[str], large_tokens: int = 1500, p95_budget_ms: float = 8000.0,
+                 window: int = 50):
+        self.tiers = list(tiers)
+        self.large_tokens = large_tokens
+        self.p95_budget_ms = p95_budget_ms
+        self.window = window
+        self._lock = threading.Lock()
+        self._lat: Dict[str, Deque[float]] = {}
+        self._overrides: "OrderedDict[str, str]" = OrderedDict()
+        self._counts: Dict[str, int] = {}
+
+    # ---- configuration ----
+    def set_tiers(self, tiers: List[str]):
+        with self._lock:
+            self.tiers = list(tiers)
+
+    def set_override(self, session_id: Any, model: Optional[str]):
+        sid = str(session_id)
+        with self._lock:
+            if not model:
+                self._overrides.pop(sid, None)
+                return
+            self._overrides[sid] = model
+            self._overrides.move_to_end(sid)
+            while len(self._overrides) > _MAX_OVERRIDES:
+                self._overrides.popitem(last=False)
+
+    def override(self, session_id: Any) -> Optional[str]:
+        with self._lock:
+            return self._overrides.get(str(session_id))
+
+    # ---- latency ----
+    def observe(self, model: str, seconds: float):
+        with self._lock:
+            self._lat.setdefault(model, deque(maxlen=self.window)).append(seconds * 1000.0)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self._lock:
+            xs = sorted(self._lat.get(model) or ())
+        if not xs:
+            return None
+        return xs[min(len(xs) - 1, int(len(xs) * 0.95))]
+
+    # ---- routing ----
+    def route(self, messages: List[Dict[str, Any]], session_id: Any = None, model_hint: Optional[str] = None) -> Dict[str, Any]:
+        tokens = sum(count_tokens(str(m.get("content") or ""), model_hint) for m in messages)
+        last_user = next((str(m.get("content") or "") for m in reversed(messages) if m.get("role") == "user"), "")
+        tools_likely = bool(_TOOL_HINTS.search(last_user))
+        decision: Dict[str, Any] = {"tokens": tokens, "tools_likely": tools_likely}
+        with self._lock:
+            tiers = list(self.tiers)
+            forced = self._overrides.get(str(session_id)) if session_id is not None else None
+        if forced:
+            decision.update(model=forced, reason="session_override")
+            return self._count(decision)
+        if len(tiers) == 1:
+            decision.update(model=tiers[0], reason="single_tier")
+            return self._count(decision)
+
+        hard = tokens > self.large_tokens or tools_likely
+        if hard:
+            candidates = list(reversed(tiers[1:]))
+            reason = "hard:tokens" if tokens > self.large_tokens else "hard:tools"
+        else:
+            candidates = tiers[:-1]
+            reason = "light"
+        p95s = {m: self.p95(m) for m in candidates}
+        pick = next((m for m in candidates if p95s[m] is None or p95s[m] <= self.p95_budget_ms), None)
+        if pick is None:
+            pick = min(candidates, key=lambda m: p95s[m])
+        if pick != candidates[0]:
+            reason += "+latency"
+        decision.update(model=pick, reason=reason,
+                        p95_ms={m: (round(v, 1) if v is not None else None) for m, v in p95s.items()})
+        return self._count(decision)
+
+    def _count(self, decision: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._counts[decision["model"]] = self._counts.get(decision["model"], 0) + 1
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {
+                "tiers": list(self.tiers),
+                "routed": dict(self._counts),
+                "overrides": len(self._overrides),
+                "large_tokens": self.large_tokens,
+                "p95_budget_ms": self.p95_budget_ms,
+            }
+            models = list(self._lat)
+        out["p95_ms"] = {m: round(self.p95(m) or 0.0, 1) for m in models}
+        return out
+
+
+router = ModelRouter(
+    tiers=[os.getenv("OPENAI_MODEL", "gpt-4o-mini")],
+    large_tokens=int(os.getenv("AGENT_ROUTER_LARGE_TOKENS", "1500")),
+    p95_budget_ms=float(os.getenv("AGENT_ROUTER_P95_MS", "8000")),
+)
+
+
+def stats() -> Dict[str, Any]:
+    return router.stats()
@@ -0,0 +1,145 @@
+"""Agent readiness: build the graph and check credentials off the request path.
+
+`_build_graph` used to ping the model (and list models on failure) inside
+whichever request first called `get_graph()`, so the first chat after every
+deploy or settings reload paid for it. A background thread now builds the
+graph at startup, installs it in the graph registry and checks the
+OpenAI key with a metadata call (no tokens billed). The outcome is cached
+and re-checked every READINESS_INTERVAL seconds, or sooner via `kick()`
+after settings change.
+
+`/health` stays a pure liveness check; `/health/ready` reports `snapshot()`
+and answers 503 until the agent can serve. Chat requests never wait on a
+probe: they use the installed graph, or build one themselves if startup
+hasn't finished yet.
+
+Environment:
+  - READINESS_INTERVAL (default 300): seconds between re-checks
+  - READINESS_PROBE (default 1): set 0 to skip the credential check
+  - READINESS_TIMEOUT (default 10): seconds allowed for the credential check
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from vme_lib.supabase_client import settings_get
+
+
+def probe_credentials(model: str, timeout: float) -> None:
+    """Raise if the configured key can't see `model`. Metadata only, no tokens."""
+    import openai  # type: ignore
+
+    api_key = settings_get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"), decrypt=True)
+    client = openai.OpenAI(api_key=api_key, timeout=timeout, max_retries=0)
+    client.models.retrieve(model)
+
+
+class Readiness:
+    def __init__(self, interval: float = 300.0, probe: bool = True, timeout: float = 10.0):
+        self.interval = interval
+        self.probe = probe
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._state: Dict[str, Any] = {"ready": False, "status": "starting", "checks": 0}
+
+    def check(self) -> Dict[str, Any]:
+        """Build the graph if its configuration changed, then probe credentials."""
+        from graph import registry as _registry
+
+        st: Dict[str, Any] = {"checked_at": time.time()}
+        try:
+            _registry.reload(wait=True)
+            wrapper = _registry.current()
+        except Exception as e:
+            wrapper = None
+            _registry.registry.last_error = str(e)[:300]
+        if wrapper is None:
+            st.update(ready=False, status="build_failed", error=_registry.registry.last_error)
+            return self._set(st)
+        st["build_ms"] = _registry.registry.last_build_ms
+        ident = getattr(wrapper._graph, "vme_ident", None)
+        if ident is None:
+            # echo responder: nothing external to check
+            st.update(ready=True, status="ok", mode="echo")
+            return self._set(st)
+        st.update(mode="langgraph", model=ident[0], tools=len(ident[1]))
+        if not self.probe:
+            st.update(ready=True, status="ok", credentials="unchecked")
+            return self._set(st)
+        t1 = time.monotonic()
+        try:
+            probe_credentials(ident[0], self.timeout)
+            st.update(ready=True, status="ok", credentials="ok")
+        except Exception as e:
+            st.update(ready=False, status="credentials_failed", credentials="failed", error=str(e)[:300])
+        st["probe_ms"] = round((time.monotonic() - t1) * 1000.0, 1)
+        return self._set(st)
+
+    def _set(self, st: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            st["checks"] = self._state.get("checks", 0) + 1
+            self._state = st
+            return dict(st)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._state)
+        if out.get("checked_at"):
+            out["age_s"] = round(time.time() - out["checked_at"], 1)
+        return out
+
+    def kick(self):
+        """Re-check now (e.g. after the API key or model changed)."""
+        self._wake.set()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vme-readiness", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception:
+                pass
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+readiness = Readiness(
+    interval=float(os.getenv("READINESS_INTERVAL", "300")),
+    probe=os.getenv("READINESS_PROBE", "1").lower() not in ("0", "false", "no", "off"),
+    timeout=float(os.getenv("READINESS_TIMEOUT", "10")),
+)
+
+
+def start():
+    readiness.start()
+
+
+def stop():
+    readiness.stop()
+
+
+def kick():
+    readiness.kick()
+
+
+def snapshot() -> Dict[str, Any]:
+    return readiness.snapshot()
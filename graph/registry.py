@@ -0,0 +1,208 @@
+"""Versioned registry of built agent graphs.
+
+Settings changes used to replace `va_graph._singleton` with a fresh
+`_Wrapper()` built inline by whichever handler noticed the change, while
+other requests might still be using the old one. The registry instead keys
+each built graph by the configuration it was built from (model, tools
+enabled, LangGraph toggle, API key fingerprint, model tiers) and:
+
+  - builds a new version in a background thread when that key changes, then
+    swaps it in atomically; requests keep getting the previous version until
+    the new one is ready, so a model or tool toggle never stalls a request;
+  - counts requests using each version (`using()`), so in-flight turns
+    finish on the version they started with;
+  - retires superseded versions once their last request has drained.
+
+Only the very first `current()` call builds inline, as `get_graph()` always
+did.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from vme_lib.supabase_client import settings_get
+
+
+def config_key() -> Tuple[str, ...]:
+    """Everything `_build_graph` depends on; a change means a rebuild."""
+    use_lg = os.getenv("AGENT_USE_LANGGRAPH", "0") in ("1", "true", "yes")
+    model = str(settings_get("OPENAI_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini")))
+    tools = str(settings_get("AGENT_TOOLS_ENABLED", os.getenv("AGENT_TOOLS_ENABLED", "1"))).lower()
+    key = settings_get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"), decrypt=True) or ""
+    fp = hashlib.sha256(str(key).encode("utf-8")).hexdigest()[:12] if key else "none"
+    tiers = str(settings_get("AGENT_MODEL_TIERS", os.getenv("AGENT_MODEL_TIERS", "")) or "")
+    base_url = str(settings_get("OPENAI_BASE_URL", os.getenv("OPENAI_BASE_URL")) or "")
+    return ("langgraph" if use_lg else "echo", model, tools, fp, "env" if os.getenv("OPENAI_API_KEY") else "noenv",
+            tiers, base_url)
+
+
+class GraphVersion:
+    __slots__ = ("version", "key", "wrapper", "created_at", "active", "served")
+
+    def __init__(self, version: int, key: Tuple[str, ...], wrapper: Any):
+        self.version = version
+        self.key = key
+        self.wrapper = wrapper
+        self.created_at = time.time()
+        self.active = 0   # requests currently running on this version
+        self.served = 0
+
+    def info(self) -> Dict[str, Any]:
+        return {"version": self.version, "model": self.key[1], "mode": self.key[0],
+                "key_fingerprint": self.key[3], "active": self.active, "served": self.served,
+                "age_s": round(time.time() - self.created_at, 1)}
+
+
+class GraphRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._current: Optional[GraphVersion] = None
+        self._draining: List[GraphVersion] = []
+        self._next = 1
+        self._pending = False
+        self._builder: Optional[threading.Thread] = None
+        self._stats = {"builds": 0, "build_errors": 0, "swaps": 0, "retired": 0, "skipped": 0}
+        self.last_build_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    # ---- reads ----
+    def current(self) -> Any:
+        """The wrapper new requests should use (built inline only on first use)."""
+        cur = self._current
+        if cur is None:
+            with self._build_lock:
+                if self._current is None:
+                    self._build_and_swap(config_key())
+            cur = self._current
+        return cur.wrapper if cur is not None else None
+
+    @contextmanager
+    def using(self, wrapper: Any):
+        """Count a request against the version that owns `wrapper` until it finishes."""
+        ver = self._owner(wrapper)
+        if ver is not None:
+            with self._lock:
+                ver.active += 1
+                ver.served += 1
+        try:
+            yield wrapper
+        finally:
+            if ver is not None:
+                with self._lock:
+                    ver.active -= 1
+                    self._retire_drained()
+
+    def _owner(self, wrapper: Any) -> Optional[GraphVersion]:
+        with self._lock:
+            for v in [self._current] + self._draining:
+                if v is not None and v.wrapper is wrapper:
+                    return v
+        return None
+
+    # ---- builds ----
+    def reload(self, force: bool = False, wait: bool = False) -> bool:
+        """Rebuild if the configuration changed (or `force`), swapping when ready.
+
+        Runs in a background thread unless `wait`. Returns True when a build
+        was started (or, with `wait`, performed).
+        """
+        if wait:
+            with self._build_lock:
+                key = config_key()
+                if not force and self._current is not None and self._current.key == key:
+                    self._stats["skipped"] += 1
+                    return False
+                return self._build_and_swap(key)
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                self._pending = True  # rebuild again once the running build finishes
+                return True
+            self._builder = threading.Thread(target=self._bg_build, args=(force,), name="vme-graph-build", daemon=True)
+            self._builder.start()
+        return True
+
+    def _bg_build(self, force: bool):
+        while True:
+            try:
+                self.reload(force=force, wait=True)
+            except Exception:
+                pass
+            with self._lock:
+                if not self._pending:
+                    self._builder = None
+                    return
+                self._pending = False
+            force = False
+
+    def _build_and_swap(self, key: Tuple[str, ...]) -> bool:
+        import graph.va_graph as _vg
+
+        t0 = time.monotonic()
+        try:
+            wrapper = _vg._Wrapper()
+        except Exception as e:
+            self._stats["build_errors"] += 1
+            self.last_error = str(e)[:300]
+            return False
+        self.last_build_ms = round((time.monotonic() - t0) * 1000.0, 1)
+        self._stats["builds"] += 1
+        self.install(wrapper, key)
+        return True
+
+    def install(self, wrapper: Any, key: Optional[Tuple[str, ...]] = None) -> GraphVersion:
+        """Atomically make `wrapper` the current version."""
+        with self._lock:
+            ver = GraphVersion(self._next, key or ("custom", "", "", "none", ""), wrapper)
+            self._next += 1
+            old, self._current = self._current, ver
+            if old is not None:
+                self._draining.append(old)
+                self._stats["swaps"] += 1
+            self._retire_drained()
+            return ver
+
+    def _retire_drained(self):
+        # caller holds self._lock
+        keep = [v for v in self._draining if v.active > 0]
+        self._stats["retired"] += len(self._draining) - len(keep)
+        self._draining = keep
+
+    def reset(self):
+        with self._lock:
+            self._current = None
+            self._draining = []
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out["current"] = self._current.info() if self._current else None
+            out["draining"] = [v.info() for v in self._draining]
+            out["building"] = bool(self._builder is not None and self._builder.is_alive())
+        out["last_build_ms"] = self.last_build_ms
+        out["last_error"] = self.last_error
+        return out
+
+
+registry = GraphRegistry()
+
+
+def current() -> Any:
+    return registry.current()
+
+
+def using(wrapper: Any):
+    return registry.using(wrapper)
+
+
+def reload(force: bool = False, wait: bool = False) -> bool:
+    return registry.reload(force=force, wait=wait)
+
+
+def stats() -> Dict[str, Any]:
+    return registry.stats()
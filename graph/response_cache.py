@@ -0,0 +1,125 @@
+"""Exact-match cache of agent replies.
+
+The graph runs its model at temperature 0, so the same model, tool set and
+conversation produce the same answer; users re-ask the same questions
+("what's the status", "list files in routes") often enough that replaying
+the previous reply is worth it. Entries are keyed by a hash of the model
+name, the tool names and the full message list sent to the graph (trimmed
+history plus the new user message), expire after a TTL and are bounded LRU.
+
+Turns that called a mutating tool are never stored: their reply describes
+a side effect that a replay would not perform. They also drop every stored
+reply and bump the cache generation, since earlier answers ("list files",
+"what's the status") may no longer be true. A turn that started before the
+bump is not stored either.
+
+Environment:
+  - RESPONSE_CACHE (default 0): set 1 to enable
+  - RESPONSE_CACHE_TTL (default 300): seconds an entry is served
+  - RESPONSE_CACHE_MAX_ENTRIES (default 256): LRU bound
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+MUTATING_TOOLS = frozenset({"write_file", "git_commit", "git_push", "sb_upsert"})
+
+
+def make_key(model: str, tools: Iterable[str], messages: List[Dict[str, Any]]) -> str:
+    payload = {
+        "model": model,
+        "tools": sorted(tools),
+        "messages": [[m.get("role"), m.get("content")] for m in messages if m.get("role") != "tool"],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def mutated(result: Dict[str, Any]) -> bool:
+    """True when the turn called a tool with side effects."""
+    return any((e or {}).get("tool_name") in MUTATING_TOOLS for e in result.get("tool_events") or [])
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (stored_at, text, latency_s)
+        self._data: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()
+        self.generation = 0  # bumped by every mutating turn
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "skipped_mutating": 0, "invalidations": 0,
+                       "skipped_stale": 0, "evictions": 0, "expired": 0, "saved_ms": 0.0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None and time.time() - hit[0] > self.ttl:
+                del self._data[key]
+                self._stats["expired"] += 1
+                hit = None
+            if hit is None:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            self._stats["saved_ms"] += hit[2] * 1000.0
+            return hit[1]
+
+    def put(self, key: Optional[str], result: Dict[str, Any], latency_s: float,
+            generation: Optional[int] = None):
+        """Store a turn's reply. `generation` is `self.generation` read when the turn started."""
+        if mutated(result):
+            with self._lock:
+                self._stats["skipped_mutating"] += 1
+                self._stats["invalidations"] += 1
+                self.generation += 1
+                self._data.clear()
+            return
+        if not key or not result.get("last_text"):
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self._stats["skipped_stale"] += 1  # a write landed while this turn ran
+                return
+            self._data[key] = (time.time(), result["last_text"], latency_s)
+            self._data.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(entries=len(self._data), max_entries=self.max_entries, ttl=self.ttl)
+        out["saved_ms"] = round(out["saved_ms"], 1)
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / total, 4) if total else None
+        return out
+
+
+_ENABLED = os.getenv("RESPONSE_CACHE", "0").lower() in ("1", "true", "yes", "on")
+cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+)
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def stats() -> Dict[str, Any]:
+    out = cache.stats()
+    out["enabled"] = _ENABLED
+    return out
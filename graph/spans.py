@@ -0,0 +1,235 @@
+"""Timing spans for agent runs.
+
+A slow `/agent/chat` can be the model, a tool, or the logging afterwards.
+Each run gets a `Trace`; a LangChain callback handler (`Trace.handler()`)
+opens and closes a span for every chat-model call and every tool call the
+graph makes, and the wrapper adds one `run` span for the whole turn. A span
+is a dict:
+
+    {"kind": "llm" | "tool" | "run" | "log", "name", "start_ms", "ms",
+     "tokens_in", "tokens_out", "bytes_in", "bytes_out", "error", "model"}
+
+(`start_ms` is relative to the start of the run; absent fields are
+omitted). The list rides on the wrapper result as `spans`, next to
+`tool_events`; routes persist it in `compact()` form as a `trace` tool
+event and feed it to `SpanStats`, which keeps a rolling window per
+(kind, name) for the percentiles served at /api/metrics/spans. `run` and
+`log` spans are named after the endpoint (`chat`, `stream`); the run span
+carries the routed model as `model`.
+
+Environment:
+  - TRACE_SPANS (default 1): set 0 to disable
+  - TRACE_SPANS_WINDOW (default 500): spans kept per (kind, name)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except Exception:  # pragma: no cover - langchain is optional at import time
+    BaseCallbackHandler = object  # type: ignore
+
+# compact() field order after kind, name, start_ms, ms
+_FIELDS = ("tokens_in", "tokens_out", "bytes_in", "bytes_out", "error", "model")
+
+
+def _size(value: Any) -> int:
+    try:
+        return len(str(getattr(value, "content", value)).encode("utf-8"))
+    except Exception:
+        return 0
+
+
+class Trace:
+    """Spans of one agent run; safe to feed from tool worker threads."""
+
+    def __init__(self):
+        self.t0 = time.monotonic()
+        self.spans: List[Dict[str, Any]] = []
+        self._open: Dict[Any, Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _ms(self, t: float) -> float:
+        return round((t - self.t0) * 1000.0, 1)
+
+    def start(self, key: Any, kind: str, name: str, **attrs):
+        with self._lock:
+            self._open[key] = (time.monotonic(), dict(attrs, kind=kind, name=name))
+
+    def end(self, key: Any, **attrs):
+        now = time.monotonic()
+        with self._lock:
+            opened = self._open.pop(key, None)
+            if opened is None:
+                return
+            t, span = opened
+            span.update(attrs)
+            self.spans.append(self._close(span, t, now))
+
+    def _close(self, span: Dict[str, Any], t: float, now: float) -> Dict[str, Any]:
+        out = {"kind": span.pop("kind"), "name": span.pop("name"), "start_ms": self._ms(t),
+               "ms": round((now - t) * 1000.0, 1)}
+        out.update({k: v for k, v in span.items() if v is not None})
+        return out
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs):
+        key = object()
+        self.start(key, kind, name, **attrs)
+        try:
+            yield
+        finally:
+            self.end(key)
+
+    def finish(self, name: str, **attrs) -> List[Dict[str, Any]]:
+        """Close the run: add its `run` span; calls still open (e.g. a timed-out tool) end with error."""
+        now = time.monotonic()
+        with self._lock:
+            for t, span in self._open.values():
+                self.spans.append(self._close(dict(span, error="unfinished"), t, now))
+            self._open.clear()
+            self.spans.sort(key=lambda s: s["start_ms"])
+            self.spans.append(self._close(dict(attrs, kind="run", name=name), self.t0, now))
+            return list(self.spans)
+
+    def handler(self) -> "SpanHandler":
+        return SpanHandler(self)
+
+
+class SpanHandler(BaseCallbackHandler):
+    """Opens/closes spans from LangChain callbacks for chat models and tools."""
+
+    run_inline = True  # keep on the calling thread/loop; we only take timestamps
+
+    def __init__(self, trace: Trace):
+        super().__init__()
+        self.trace = trace
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        md = metadata or {}
+        name = md.get("ls_model_name") or (kwargs.get("invocation_params") or {}).get("model") or "llm"
+        size = sum(_size(m) for batch in messages or [] for m in batch)
+        self.trace.start(run_id, "llm", str(name), bytes_in=size)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        tokens_in = tokens_out = None
+        size = 0
+        try:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            tokens_in, tokens_out = usage.get("prompt_tokens"), usage.get("completion_tokens")
+            for gens in response.generations:
+                for g in gens:
+                    msg = getattr(g, "message", None)
+                    size += _size(g.text) + sum(_size(tc.get("args")) for tc in getattr(msg, "tool_calls", None) or [])
+                    um = getattr(msg, "usage_metadata", None)
+                    if um and tokens_in is None:
+                        tokens_in, tokens_out = um.get("input_tokens"), um.get("output_tokens")
+        except Exception:
+            pass
+        self.trace.end(run_id, tokens_in=tokens_in, tokens_out=tokens_out, bytes_out=size)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.trace.end(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self.trace.start(run_id, "tool", str(name), bytes_in=_size(input_str))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.trace.end(run_id, bytes_out=_size(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.trace.end(run_id, error=type(error).__name__)
+
+
+def with_handler(config: Optional[Dict[str, Any]], trace: Trace) -> Dict[str, Any]:
+    """A copy of `config` that also reports to `trace`."""
+    cfg = dict(config or {})
+    callbacks = cfg.get("callbacks")
+    if callbacks is None or isinstance(callbacks, list):
+        cfg["callbacks"] = list(callbacks or []) + [trace.handler()]
+    else:  # a callback manager
+        callbacks = callbacks.copy()
+        callbacks.add_handler(trace.handler(), inherit=True)
+        cfg["callbacks"] = callbacks
+    return cfg
+
+
+def compact(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Persisted form: {"v": 1, "fields": [...], "spans": [[kind, name, start_ms, ms, *fields]]}.
+
+    Trailing empty fields are dropped from each row.
+    """
+    rows = []
+    for s in spans:
+        row = [s.get("kind"), s.get("name"), s.get("start_ms"), s.get("ms")] + [s.get(f) for f in _FIELDS]
+        while len(row) > 4 and row[-1] is None:
+            row.pop()
+        rows.append(row)
+    return {"v": 1, "fields": ["kind", "name", "start_ms", "ms", *_FIELDS], "spans": rows}
+
+
+def expand(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    fields = data.get("fields") or []
+    return [{k: v for k, v in zip(fields, row) if v is not None} for row in data.get("spans") or []]
+
+
+class SpanStats:
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._ms: Dict[Tuple[str, str], Deque[float]] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, spans: List[Dict[str, Any]]):
+        with self._lock:
+            for s in spans or []:
+                key = (str(s.get("kind")), str(s.get("name")))
+                self._ms.setdefault(key, deque(maxlen=self.window)).append(float(s.get("ms") or 0.0))
+                self._counts[key] = self._counts.get(key, 0) + 1
+                if s.get("error"):
+                    self._errors[key] = self._errors.get(key, 0) + 1
+
+    def stats(self, kind: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """{kind: {name: {count, errors, p50_ms, p95_ms, p99_ms, max_ms}}} over the window."""
+        with self._lock:
+            items = [(k, sorted(v), self._counts[k], self._errors.get(k, 0)) for k, v in self._ms.items()
+                     if kind is None or k[0] == kind]
+        out: Dict[str, Dict[str, Any]] = {}
+        for (k, name), xs, count, errors in items:
+            def pct(p: float) -> float:
+                return round(xs[min(len(xs) - 1, int(len(xs) * p))], 1)
+            out.setdefault(k, {})[name] = {"count": count, "errors": errors, "p50_ms": pct(0.50),
+                                           "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(xs[-1], 1)}
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._ms.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+
+_ENABLED = os.getenv("TRACE_SPANS", "1").lower() not in ("0", "false", "no", "off")
+span_stats = SpanStats(window=int(os.getenv("TRACE_SPANS_WINDOW", "500")))
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def record(spans: List[Dict[str, Any]]):
+    span_stats.observe(spans)
+
+
+def stats(kind: Optional[str] = None) -> Dict[str, Any]:
+    out: Dict[str, Any] = span_stats.stats(kind)
+    out["enabled"] = _ENABLED
+    return out
@@ -0,0 +1,137 @@
+"""Tool execution for one agent step.
+
+LangGraph's stock `ToolNode` runs every tool call of an AIMessage at once:
+an unbounded `asyncio.gather` on the async path, the config's executor on
+the sync path. Mutating tools race each other and with reads, and nothing
+bounds a hung tool. `ScheduledToolNode` keeps the fan-out for reads only:
+
+  - consecutive read-only calls form a batch that runs concurrently on at
+    most AGENT_TOOL_WORKERS threads;
+  - each mutating call (`MUTATING_TOOLS`) is a barrier: it runs alone, after
+    the calls before it and before the calls after it, in message order;
+  - every call gets a timeout (AGENT_TOOL_TIMEOUT, or a per-tool value from
+    AGENT_TOOL_TIMEOUTS="git_diff=10,read_file=5"); a call that overruns is
+    answered with an error ToolMessage. The worker thread is not killed, so
+    a timed-out tool may still finish in the background.
+
+Outputs are returned in tool_call order, each ToolMessage carrying its own
+call's `tool_call_id`, which is what `_filter_tool_sequence` and the model
+expect.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+from langgraph.types import Command
+
+from graph.response_cache import MUTATING_TOOLS
+
+
+def parse_timeouts(raw: Optional[str]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (raw or "").split(","):
+        name, _, val = part.partition("=")
+        try:
+            out[name.strip()] = float(val)
+        except ValueError:
+            continue
+    return out
+
+
+def _batches(calls: List[Dict[str, Any]]) -> List[List[int]]:
+    """Indexes of calls grouped into read-only runs and single mutating calls."""
+    out: List[List[int]] = []
+    for i, call in enumerate(calls):
+        if call.get("name") in MUTATING_TOOLS:
+            out.append([i])
+            out.append([])
+        else:
+            if not out:
+                out.append([])
+            out[-1].append(i)
+    return [b for b in out if b]
+
+
+class ScheduledToolNode(ToolNode):
+    def __init__(self, tools, *, workers: int = 4, timeout: float = 30.0,
+                 timeouts: Optional[Dict[str, float]] = None, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+
+    def _timeout_for(self, call: Dict[str, Any]) -> float:
+        return self.timeouts.get(call.get("name"), self.timeout)
+
+    @staticmethod
+    def _timed_out(call: Dict[str, Any], seconds: float) -> ToolMessage:
+        return ToolMessage(content=f"Error: tool {call.get('name')} timed out after {seconds:g}s",
+                           name=call.get("name"), tool_call_id=call.get("id"), status="error")
+
+    def _combine(self, outputs: List[Any], input_type: str) -> Any:
+        # same output shape as ToolNode._func / _afunc
+        if not any(isinstance(o, Command) for o in outputs):
+            return outputs if input_type == "list" else {self.messages_key: outputs}
+        combined: List[Any] = []
+        for o in outputs:
+            if isinstance(o, Command):
+                combined.append(o)
+            else:
+                combined.append([o] if input_type == "list" else {self.messages_key: [o]})
+        return combined
+
+    def _func(self, input, config, *, store: Optional[BaseStore]) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        outputs: List[Any] = [None] * len(tool_calls)
+        # copies the context into workers so run-scoped state (e.g. tools.memo) is visible
+        executor = ContextThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for batch in _batches(tool_calls):
+                started = time.monotonic()
+                futures = {i: executor.submit(self._run_one, tool_calls[i], input_type, config) for i in batch}
+                for i, fut in futures.items():
+                    seconds = self._timeout_for(tool_calls[i])
+                    try:
+                        outputs[i] = fut.result(timeout=max(0.0, started + seconds - time.monotonic()))
+                    except FutureTimeout:
+                        fut.cancel()
+                        outputs[i] = self._timed_out(tool_calls[i], seconds)
+        finally:
+            # don't wait for timed-out workers
+            executor.shutdown(wait=False)
+        return self._combine(outputs, input_type)
+
+    async def _afunc(self, input, config, *, store: Optional[BaseStore]) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        outputs: List[Any] = [None] * len(tool_calls)
+        sem = asyncio.Semaphore(self.workers)
+
+        async def one(i: int):
+            call = tool_calls[i]
+            seconds = self._timeout_for(call)
+            async with sem:
+                try:
+                    outputs[i] = await asyncio.wait_for(self._arun_one(call, input_type, config), seconds)
+                except asyncio.TimeoutError:
+                    outputs[i] = self._timed_out(call, seconds)
+
+        for batch in _batches(tool_calls):
+            await asyncio.gather(*(one(i) for i in batch))
+        return self._combine(outputs, input_type)
+
+
+def from_env(tools) -> ScheduledToolNode:
+    return ScheduledToolNode(
+        tools,
+        workers=int(os.getenv("AGENT_TOOL_WORKERS", "4")),
+        timeout=float(os.getenv("AGENT_TOOL_TIMEOUT", "30")),
+        timeouts=parse_timeouts(os.getenv("AGENT_TOOL_TIMEOUTS")),
+    )
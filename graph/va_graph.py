@@ -15,8 +15,14 @@ try:
 except Exception:
     pass
 import os
-from typing import Any, Dict, List, TypedDict, TYPE_CHECKING
+from typing import Any, AsyncIterator, Dict, List, TypedDict, TYPE_CHECKING
+import threading
+import time
 from vme_lib.supabase_client import settings_get
+from graph import response_cache as _rc
+from graph import model_router as _router
+from graph import spans as _spans
+from tools import memo as _memo
 
 if TYPE_CHECKING:
     from langgraph.prebuilt import create_react_agent  # type: ignore
@@ -28,6 +34,7 @@ try:
     from langgraph.prebuilt import create_react_agent
     from langchain_openai import ChatOpenAI
     from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
+    from graph import tool_node as _tool_node
     _LG_OK = True
 except Exception:
     _LG_OK = False
@@ -127,7 +134,7 @@ class GuardedChatOpenAI:
         raise AttributeError(name)
 
 
-def _build_graph():
+def _build_graph(model: str | None = None):
     # Only build the real graph when langgraph + an API key are available
     # and the feature is explicitly enabled via AGENT_USE_LANGGRAPH.
     # This avoids accidental external API calls during tests or local runs.
@@ -169,7 +176,8 @@ def _build_graph():
 
     tools = sanitized_tools
 
-    _model = settings_get("OPENAI_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    _model = model or settings_get("OPENAI_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    _base_url = settings_get("OPENAI_BASE_URL", os.getenv("OPENAI_BASE_URL")) or None
     _api_key = settings_get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"), decrypt=True)
 
     # Defensive: log key length (not the key) to detect truncation issues
@@ -185,46 +193,20 @@ def _build_graph():
     # may require passing the key via the standard client parameter names; the
     # GuardedChatOpenAI will defer to the underlying ChatOpenAI implementation.
     # We pass the key as 'openai_api_key' because some wrappers accept that name.
-    llm = GuardedChatOpenAI(model=_model, temperature=0, api_key=_api_key, openai_api_key=_api_key)
-
-    # Optional lightweight validation: attempt a non-destructive test call to
-    # verify the key is accepted. We do this only if the underlying LLM
-    # appears to be constructed and has a 'invoke' method. Any failures are
-    # non-fatal but will be visible in logs to aid operators.
-    try:
-        if getattr(llm, '_inner', None) and hasattr(llm._inner, 'invoke'):
-            # Construct a minimal test message sequence depending on the client's
-            # expected shape. We avoid calling the real model with expensive
-            # tokens by crafting a tiny prompt; some SDKs may still hit billing.
-            try:
-                test_in = {'messages': [{'role': 'user', 'content': 'ping'}]}
-                resp = llm.invoke(test_in, config=None)
-                # Log a short indication of whether the call succeeded.
-                print('va_graph: OpenAI test invoke OK')
-            except Exception as e:
-                try:
-                    print('va_graph: OpenAI test invoke failed:', str(e)[:400])
-                    # If ChatOpenAI-based invoke fails, try the official openai SDK
-                    try:
-                        import openai
-                        try:
-                            # Use the same key for a lightweight models list call
-                            if _api_key:
-                                openai_client = openai.OpenAI(api_key=_api_key)
-                                models = openai_client.models.list()
-                                print('va_graph: openai SDK models.list OK')
-                        except Exception as e2:
-                            try:
-                                print('va_graph: openai SDK models.list failed:', str(e2)[:400])
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-    except Exception:
-        pass
-    return create_react_agent(llm, tools, state_schema=AgentState)
+    llm_kwargs = {"base_url": _base_url} if _base_url else {}
+    llm = GuardedChatOpenAI(model=_model, temperature=0, api_key=_api_key, openai_api_key=_api_key, **llm_kwargs)
+
+    # Credentials are checked by graph/readiness.py in the background; no
+    # model call happens here so building stays cheap on the request path.
+    # With tools, LangGraph calls bind_tools() and gets the inner runnable;
+    # without any it needs a Runnable itself, which the adapter isn't.
+    model_arg = llm if tools or llm._inner is None else llm._inner
+    # reads in one step run concurrently, writes in order (graph/tool_node.py)
+    tool_arg = _tool_node.from_env(tools) if tools else tools
+    agent = create_react_agent(model_arg, tool_arg, state_schema=AgentState)
+    # what the reply depends on besides the messages (response cache key)
+    agent.vme_ident = (str(_model), [t.name for t in tools])
+    return agent
 
 
 class _Wrapper:
@@ -232,6 +214,67 @@ class _Wrapper:
 
     def __init__(self):
         self._graph = _build_graph()
+        # one compiled graph per model tier, built on first use
+        self._graphs: Dict[str, Any] = {}
+        self._graphs_lock = threading.Lock()
+        self._router = None
+        ident = getattr(self._graph, "vme_ident", None)
+        if ident is not None:
+            self._graphs[ident[0]] = self._graph
+            tiers = settings_get("AGENT_MODEL_TIERS", os.getenv("AGENT_MODEL_TIERS", ""))
+            _router.router.set_tiers(_router.parse_tiers(tiers, ident[0]))
+            self._router = _router.router
+
+    def _select(self, state: Dict[str, Any]):
+        """(graph, routing decision) for a turn; decision is None without a router."""
+        router = getattr(self, "_router", None)
+        if router is None:
+            return self._graph, None
+        decision = router.route(state.get("messages", []), state.get("session_id"), self._graph.vme_ident[0])
+        model = decision["model"]
+        graph = self._graphs.get(model)
+        if graph is None:
+            with self._graphs_lock:
+                graph = self._graphs.get(model)
+                if graph is None:
+                    graph = _build_graph(model) or self._graph
+                    self._graphs[model] = graph
+        return graph, decision
+
+    @staticmethod
+    def _memo_stats(res: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach read-only tool memo hits to the matching tool events (by tool, in order)."""
+        records = _memo.take_records()
+        for evt in res.get("tool_events") or []:
+            for i, r in enumerate(records):
+                if r["tool"] == evt.get("tool_name"):
+                    evt["memo"] = {"hit": r["hit"], "saved_bytes": r["saved_bytes"]}
+                    del records[i]
+                    break
+        return res
+
+    def _finish(self, res: Dict[str, Any], decision: Dict[str, Any] | None, elapsed: float) -> Dict[str, Any]:
+        if decision is not None:
+            self._router.observe(decision["model"], elapsed)
+            res["route"] = decision
+        return res
+
+    def _trace(self):
+        return _spans.Trace() if _spans.enabled() else None
+
+    @staticmethod
+    def _config(config: Dict[str, Any] | None, trace) -> Dict[str, Any] | None:
+        return _spans.with_handler(config, trace) if trace is not None else config
+
+    def _traced(self, res: Dict[str, Any], trace, decision: Dict[str, Any] | None, state: Dict[str, Any],
+                **attrs) -> Dict[str, Any]:
+        """Close the run's trace onto res["spans"]: run span named after state["endpoint"], with the model."""
+        if trace is None:
+            return res
+        model = (decision or {}).get("model") or getattr(self._graph, "vme_ident", ("agent",))[0]
+        res["spans"] = trace.finish(str(state.get("endpoint") or "agent"), model=str(model), **attrs)
+        _spans.record(res["spans"])
+        return res
 
     def _to_lc_messages(self, items: List[Dict[str, Any]]):
         if not _LG_OK:
@@ -251,6 +294,23 @@ class _Wrapper:
                 out.append(SystemMessage(content=content))
         return out
 
+    def _graph_input(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        msgs = [m for m in state.get("messages", []) if m.get("role") != "tool"]
+        return {"session_id": state.get("session_id", ""), "messages": self._to_lc_messages(msgs)}
+
+    def _cache_key(self, state: Dict[str, Any], graph: Any = None) -> str | None:
+        ident = getattr(graph if graph is not None else self._graph, "vme_ident", None)
+        if not _rc.enabled() or ident is None:
+            return None
+        return _rc.make_key(ident[0], ident[1], state.get("messages", []))
+
+    def _cached(self, key: str | None, state: Dict[str, Any]) -> Dict[str, Any] | None:
+        text = _rc.cache.get(key) if key else None
+        if text is None:
+            return None
+        # tool calls of the original turn already ran and were logged then
+        return {"last_text": text, "session_id": state.get("session_id", ""), "tool_events": [], "cached": True}
+
     def invoke(self, state: Dict[str, Any], config: Dict[str, Any] | None = None) -> Dict[str, Any]:
         # Echo fallback when the graph isn't available
         if self._graph is None:
@@ -258,9 +318,100 @@ class _Wrapper:
             last = msgs[-1]["content"] if msgs else ""
             return {"last_text": f"Echo: {last}", "session_id": state.get("session_id", "")}
 
-        msgs = [m for m in state.get("messages", []) if m.get("role") != "tool"]
-        res = self._graph.invoke({"session_id": state.get("session_id", ""), "messages": self._to_lc_messages(msgs)}, config=config)
-
+        trace = self._trace()
+        graph, decision = self._select(state)
+        key = self._cache_key(state, graph)
+        hit = self._cached(key, state)
+        if hit is not None:
+            return self._traced(hit, trace, decision, state, cached=True)
+        gen, t0 = _rc.cache.generation, time.monotonic()
+        with _memo.scope(state.get("session_id")):
+            out = graph.invoke(self._graph_input(state), config=self._config(config, trace))
+            res = self._memo_stats(self._result(out, state))
+        if _rc.enabled():
+            _rc.cache.put(key, res, time.monotonic() - t0, generation=gen)
+        return self._traced(self._finish(res, decision, time.monotonic() - t0), trace, decision, state)
+
+    async def ainvoke(self, state: Dict[str, Any], config: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        """Awaitable invoke(): the model and tool calls run on the event loop."""
+        if self._graph is None:
+            return self.invoke(state, config)
+        trace = self._trace()
+        graph, decision = self._select(state)
+        key = self._cache_key(state, graph)
+        hit = self._cached(key, state)
+        if hit is not None:
+            return self._traced(hit, trace, decision, state, cached=True)
+        gen, t0 = _rc.cache.generation, time.monotonic()
+        with _memo.scope(state.get("session_id")):
+            out = await graph.ainvoke(self._graph_input(state), config=self._config(config, trace))
+            res = self._memo_stats(self._result(out, state))
+        if _rc.enabled():
+            _rc.cache.put(key, res, time.monotonic() - t0, generation=gen)
+        return self._traced(self._finish(res, decision, time.monotonic() - t0), trace, decision, state)
+
+    async def astream(self, state: Dict[str, Any], config: Dict[str, Any] | None = None) -> AsyncIterator[Dict[str, Any]]:
+        """Run the agent once, yielding events as they happen.
+
+        Yields {"type": "token", "text"} for each model token delta,
+        {"type": "tool_start", "name", "input", "id"} / {"type": "tool_end",
+        "name", "output", "id"} around tool calls, and finally {"type": "done",
+        "text", "tool_events", "route", "spans"} built from the same execution
+        (same shape as invoke()). Closing the generator cancels the run.
+        """
+        if self._graph is None:
+            msgs = state.get("messages", [])
+            last = msgs[-1]["content"] if msgs else ""
+            text = f"Echo: {last}"
+            yield {"type": "token", "text": text}
+            yield {"type": "done", "text": text, "tool_events": []}
+            return
+
+        trace = self._trace()
+        graph, decision = self._select(state)
+        key = self._cache_key(state, graph)
+        hit = self._cached(key, state)
+        if hit is not None:
+            hit = self._traced(hit, trace, decision, state, cached=True)
+            yield {"type": "token", "text": hit["last_text"]}
+            yield {"type": "done", "text": hit["last_text"], "tool_events": [], "cached": True,
+                   "spans": hit.get("spans")}
+            return
+        gen, t0 = _rc.cache.generation, time.monotonic()
+        with _memo.scope(state.get("session_id")):
+            final_state = None
+            async for ev in graph.astream_events(self._graph_input(state), config=self._config(config, trace),
+                                                 version="v2"):
+                kind = ev.get("event")
+                data = ev.get("data") or {}
+                if kind == "on_chat_model_stream":
+                    chunk = data.get("chunk")
+                    delta = getattr(chunk, "content", "")
+                    if isinstance(delta, list):  # content blocks
+                        delta = "".join(b.get("text", "") for b in delta if isinstance(b, dict))
+                    if delta:
+                        yield {"type": "token", "text": delta}
+                elif kind == "on_tool_start":
+                    yield {"type": "tool_start", "name": ev.get("name"), "input": data.get("input"), "id": ev.get("run_id")}
+                elif kind == "on_tool_end":
+                    out = data.get("output")
+                    yield {"type": "tool_end", "name": ev.get("name"), "id": ev.get("run_id"),
+                           "output": str(getattr(out, "content", out))[:2000]}
+                elif kind == "on_chain_end" and not ev.get("parent_ids"):
+                    # the graph itself finished: its output is the final state
+                    final_state = data.get("output")
+            res = self._memo_stats(self._result(final_state if isinstance(final_state, dict) else {}, state))
+        if _rc.enabled():
+            _rc.cache.put(key, res, time.monotonic() - t0, generation=gen)
+        res = self._traced(self._finish(res, decision, time.monotonic() - t0), trace, decision, state)
+        yield {"type": "done", "text": res.get("last_text", ""), "tool_events": res.get("tool_events", []),
+               "route": res.get("route"), "spans": res.get("spans")}
+
+    def _result(self, res: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+        """Reduce the graph's final state to {last_text, session_id, tool_events}.
+
+        invoke()/ainvoke() then add "route" (with a router) and "spans"
+        (graph/spans.py)."""
         last_text = ""
         tool_events: List[Dict[str, Any]] = []
         try:
@@ -295,16 +446,13 @@ class _Wrapper:
         return {"last_text": last_text, "session_id": state.get("session_id", ""), "tool_events": tool_events}
 
 
-_singleton: _Wrapper | None = None
-
-
 def get_graph():
-    """Return a singleton _Wrapper, creating it lazily on first call.
+    """Return the current _Wrapper, creating it lazily on first call.
 
     This prevents LangGraph and related heavy imports from running at
     module import time (which caused crashes during deploy earlier).
+    Versions are managed by graph/registry.py: configuration changes build
+    a replacement in the background and swap it in.
     """
-    global _singleton
-    if _singleton is None:
-        _singleton = _Wrapper()
-    return _singleton
+    from graph import registry as _registry
+    return _registry.current()
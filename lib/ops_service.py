@@ -0,0 +1,16 @@
+"""Server-side task creation for the Ops runner (used by /agent/plan)."""
+from typing import Optional
+
+from vme_lib import supabase_client as _sbmod
+
+
+def enqueue_task(title: str, body: Optional[str]) -> int:
+    """Persist a task (Supabase, else the in-proc store) and queue it for the runner. Returns its id."""
+    import routes.ops as _ops
+    import ops_runner
+
+    tid = _sbmod.insert_task(title, body)
+    if tid is None:
+        tid = _ops._inproc_task(title, body)
+    ops_runner.enqueue_task({'id': int(tid), 'title': title, 'body': body})
+    return int(tid)
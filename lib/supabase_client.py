@@ -1,6 +1,7 @@
 import os, time, json, base64
 from typing import Optional, Union, Dict, Any
 from supabase import create_client, Client
+from vme_lib import sqlite_store as _sqlite
 
 _sb: Optional[Client] = None
 _SETTINGS_CACHE: Dict[str, tuple[float, Any]] = {}
@@ -29,12 +30,18 @@ def _client() -> Optional[Client]:
     Environment variables checked:
       - SUPABASE_URL
       - SUPABASE_SERVICE_ROLE_KEY or SUPABASE_ANON_KEY
+      - STORAGE_BACKEND=sqlite|auto returns the embedded SQLite store instead
+        (see vme_lib.sqlite_store)
     """
     global _sb
     if _sb is not None:
         return _sb
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if _sqlite.selected(bool(url and key)):
+        # STORAGE_BACKEND=sqlite (or auto without credentials): local store
+        _sb = _sqlite.get_store()
+        return _sb
     if not url or not key:
         return None
     try:
@@ -62,27 +69,52 @@ def update_session_title(session_id: int, title: str) -> bool:
         return False
     try:
         sb.table("va_sessions").update({"label": title}).eq("id", int(session_id)).execute()
+        # shared listeners (e.g. the history cache) live in vme_lib
+        from vme_lib import supabase_client as _vme
+        _vme._notify_session_changed(int(session_id))
         return True
     except Exception:
         return False
 
 
+def _coerce_session_id(session_id: Union[int, str, None]) -> Optional[int]:
+    sid = session_id
+    if isinstance(sid, str):
+        try:
+            sid = int(sid)
+        except ValueError:
+            sid = None
+    return sid
+
+
+def _log_submit(sb: Client, table: str, row: Dict[str, Any]):
+    """Hand a log row to the shared write-behind writer in vme_lib, to be written with `sb`.
+
+    Sharing one queue with vme_lib keeps per-session ordering when the agent
+    (vme_lib) and voice/meeting routes (lib) log to the same session.
+    """
+    try:
+        from vme_lib import supabase_client as _vme
+        _vme._log_submit(sb, table, row)
+        return
+    except Exception:
+        pass
+    try:
+        sb.table(table).insert(row).execute()
+    except Exception:
+        pass
+
+
 def safe_log_message(session_id: Union[int, str, None], role: str, content: str):
     sb = _client()
     if not sb:
         return
     try:
-        sid = session_id
-        if isinstance(sid, str):
-            try:
-                sid = int(sid)
-            except ValueError:
-                sid = None
-        sb.table("va_messages").insert({
-            "session_id": sid,
+        _log_submit(sb, "va_messages", {
+            "session_id": _coerce_session_id(session_id),
             "role": role,
             "content": content,
-        }).execute()
+        })
     except Exception:
         pass
 
@@ -92,19 +124,13 @@ def safe_log_tool_event(session_id: Union[int, str, None], tool_name: str, input
     if not sb:
         return
     try:
-        sid = session_id
-        if isinstance(sid, str):
-            try:
-                sid = int(sid)
-            except ValueError:
-                sid = None
         payload = {
-            "session_id": sid,
+            "session_id": _coerce_session_id(session_id),
             "tool_name": tool_name,
             "input_json": input_json,
             "output_json": output_json,
         }
-        sb.table("va_tool_events").insert(payload).execute()
+        _log_submit(sb, "va_tool_events", payload)
     except Exception:
         pass
 
@@ -71,9 +71,14 @@ import uvicorn
 from routes.agent import router as agent_router
 from fastapi import Request, Header
 import json
+import asyncio
 from pathlib import Path
 import importlib
 from vme_lib import supabase_client as _sbmod
+from vme_lib import supabase_async as _asb
+from vme_lib import settings_sync as _settings_sync
+from graph import readiness as _readiness
+from graph import registry as _graph_registry
 from vme_lib.supabase_client import settings_list, settings_put, settings_refresh
 
 app = FastAPI(title="V-Me2")
@@ -289,15 +294,123 @@ try:
 except Exception:
   pass
 
+# Mount metrics router (in-process counters for background subsystems)
+try:
+  from routes.metrics import router as metrics_router
+  if metrics_router:
+    app.include_router(metrics_router)
+except Exception:
+  pass
+
+
+@app.on_event('shutdown')
+async def _close_async_supabase():
+  """Close the pooled async PostgREST connections."""
+  try:
+    await _asb.aclose()
+  except Exception:
+    pass
+
+
+@app.on_event('startup')
+def _start_settings_sync():
+  """Follow the va_settings version counter so writes on other replicas
+  invalidate this process's settings snapshot (SETTINGS_SYNC=off disables)."""
+  try:
+    w = _settings_sync.start()
+    if w is not None:
+      def _reset_graph(_version):
+        _graph_registry.reload()
+        _readiness.kick()
+      w.add_listener(_reset_graph)
+  except Exception:
+    pass
+
+
+@app.on_event('startup')
+def _start_readiness():
+  """Build the agent graph and check its credentials in the background."""
+  try:
+    _readiness.start()
+  except Exception:
+    pass
+
+
+@app.on_event('shutdown')
+def _stop_readiness():
+  try:
+    _readiness.stop()
+  except Exception:
+    pass
+
+
+@app.on_event('startup')
+def _start_stats_reconciler():
+  """Optionally recompute the va_stats counters every STATS_RECONCILE_INTERVAL seconds."""
+  try:
+    _sbmod.start_stats_reconciler(float(os.getenv('STATS_RECONCILE_INTERVAL', '0')))
+  except Exception:
+    pass
+
+
+@app.on_event('shutdown')
+def _stop_stats_reconciler():
+  try:
+    _sbmod.stop_stats_reconciler()
+  except Exception:
+    pass
+
+
+@app.on_event('shutdown')
+def _stop_settings_sync():
+  try:
+    _settings_sync.stop()
+  except Exception:
+    pass
+
+
+@app.on_event('shutdown')
+def _flush_log_writer():
+  """Drain the write-behind message/tool-event queue before the process exits."""
+  try:
+    _sbmod.log_writer_shutdown(timeout=float(os.getenv('LOG_SHUTDOWN_TIMEOUT', '5')))
+  except Exception:
+    pass
+
+@app.on_event('startup')
+def _start_ops_events():
+  """Receive Ops task events published on other replicas (OPS_EVENTS_FANOUT)."""
+  try:
+    from routes.ops import task_events
+    task_events.start()
+  except Exception:
+    pass
+
+
+@app.on_event('shutdown')
+def _stop_ops_events():
+  try:
+    from routes.ops import task_events
+    task_events.stop()
+  except Exception:
+    pass
+
 # start internal ops runner if available
 try:
-  from ops_runner import start_worker
+  from ops_runner import start_worker, stop_worker
   @app.on_event('startup')
   def _start_ops_runner():
     try:
       start_worker()
     except Exception:
       pass
+
+  @app.on_event('shutdown')
+  def _stop_ops_runner():
+    try:
+      stop_worker()
+    except Exception:
+      pass
 except Exception:
   pass
 
@@ -309,7 +422,7 @@ except Exception:
 _PROJECT_ROOT = Path(__file__).resolve().parents[0]
 
 
-def _load_settings():
+async def _load_settings():
   # defaults
   s = {
     "tts_speed": 1.0,
@@ -318,10 +431,8 @@ def _load_settings():
   }
   # Try Supabase first
   try:
-    sb = _sbmod._client()
-    if sb:
-      res = sb.table('va_settings').select('key,value').execute()
-      rows = res.data or []
+    rows = await _asb.settings_rows()
+    if rows is not None:
       for r in rows:
         k = r.get('key')
         v = r.get('value')
@@ -352,30 +463,25 @@ def _load_settings():
   return s
 
 
-def _save_settings(payload: dict):
+async def _save_settings(payload: dict):
   # Try Supabase first
   try:
-    sb = _sbmod._client()
-    if sb:
-      # Upsert each key into va_settings (simple delete/insert for simplicity)
+    if _sbmod._client():
+      # Upsert each key into va_settings
       for k, v in (payload or {}).items():
         try:
-          sb.table('va_settings').upsert({'key': k, 'value': v}).execute()
+          await _asb.settings_put({k: v})
         except Exception:
-          # fallback to insert-on-conflict
-          try:
-            sb.table('va_settings').insert({'key': k, 'value': v}).execute()
-          except Exception:
-            pass
+          pass
       # Return current settings after write
-      return _load_settings()
+      return await _load_settings()
   except Exception:
     pass
 
   # Fallback to file-backed
   _SETTINGS_FILE = _PROJECT_ROOT / '.vme2_settings.json'
   try:
-    data = _load_settings()
+    data = await _load_settings()
     data.update(payload or {})
     _SETTINGS_FILE.write_text(json.dumps(data, indent=2))
     return data
@@ -389,7 +495,7 @@ def _is_local_request(request: Request) -> bool:
   return host in ("127.0.0.1", "::1", "localhost", None)
 
 
-def _allowed_admin_tokens():
+async def _allowed_admin_tokens():
   """Return a set of admin tokens that are accepted by the server.
 
   This supports two kinds of tokens:
@@ -403,7 +509,7 @@ def _allowed_admin_tokens():
   out = set()
   try:
     # primary (rotatable) admin token: env override first, then Supabase-backed
-    t = os.getenv('SETTINGS_ADMIN_TOKEN') or _sbmod.settings_get('SETTINGS_ADMIN_TOKEN')
+    t = os.getenv('SETTINGS_ADMIN_TOKEN') or await _asb.settings_get('SETTINGS_ADMIN_TOKEN')
     if t:
       out.add(t)
   except Exception:
@@ -411,7 +517,7 @@ def _allowed_admin_tokens():
   try:
     # optional CI-only token kept stable for CI so you don't need to update
     # GitHub/GitLab secrets every time you rotate the UI token.
-    t2 = os.getenv('CI_SETTINGS_ADMIN_TOKEN') or _sbmod.settings_get('CI_SETTINGS_ADMIN_TOKEN')
+    t2 = os.getenv('CI_SETTINGS_ADMIN_TOKEN') or await _asb.settings_get('CI_SETTINGS_ADMIN_TOKEN')
     if t2:
       out.add(t2)
   except Exception:
@@ -422,7 +528,7 @@ def _allowed_admin_tokens():
 @app.get('/api/settings')
 async def api_get_settings(request: Request, x_admin_token: str | None = Header(None)):
   # Admin token may be configured as an environment variable, or managed in va_settings via the UI.
-  allowed = _allowed_admin_tokens()
+  allowed = await _allowed_admin_tokens()
   if allowed:
     if not x_admin_token or x_admin_token not in allowed:
       return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
@@ -432,19 +538,18 @@ async def api_get_settings(request: Request, x_admin_token: str | None = Header(
       return JSONResponse({'ok': False, 'error': 'admin token not set; settings API restricted to localhost'}, status_code=403)
   # Prefer Supabase-backed settings list
   try:
-    sb = _sbmod._client()
-    if sb:
-      return JSONResponse({'ok': True, 'settings': settings_list()})
+    if _sbmod._client():
+      return JSONResponse({'ok': True, 'settings': await _asb.settings_list()})
   except Exception:
     pass
   # fallback to file
-  return JSONResponse({'ok': True, 'settings': _load_settings(), 'note': 'fallback file-based'})
+  return JSONResponse({'ok': True, 'settings': await _load_settings(), 'note': 'fallback file-based'})
 
 
 @app.post('/api/settings')
 async def api_post_settings(request: Request, payload: dict, x_admin_token: str | None = Header(None)):
   # validate minimal types
-  allowed = _allowed_admin_tokens()
+  allowed = await _allowed_admin_tokens()
   if allowed:
     if not x_admin_token or x_admin_token not in allowed:
       return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
@@ -466,7 +571,7 @@ async def api_post_settings(request: Request, payload: dict, x_admin_token: str
   if 'agent_use_langgraph' in payload:
     ok_keys['agent_use_langgraph'] = bool(payload.get('agent_use_langgraph'))
 
-  saved = _save_settings(ok_keys)
+  saved = await _save_settings(ok_keys)
   if saved is None:
     return JSONResponse({'ok': False, 'error': 'failed to persist settings'}, status_code=500)
 
@@ -478,15 +583,13 @@ async def api_post_settings(request: Request, payload: dict, x_admin_token: str
       val = '1' if ok_keys['agent_use_langgraph'] else '0'
       os.environ['AGENT_USE_LANGGRAPH'] = val
       # Persist the flag to DB/file
-      _save_settings({'agent_use_langgraph': ok_keys['agent_use_langgraph']})
+      await _save_settings({'agent_use_langgraph': ok_keys['agent_use_langgraph']})
       # Try to reload the graph module so the in-process graph picks up the change.
       try:
-        import graph.va_graph as _vg
-        if hasattr(_vg, '_Wrapper'):
-          _vg._singleton = _vg._Wrapper()
-          applied = True
-        else:
-          applied = False
+        # built in the background and swapped in; in-flight turns finish on the old version
+        _graph_registry.reload()
+        _readiness.kick()
+        applied = True
       except Exception:
         applied = False
       # If we couldn't apply in-process, a restart is required
@@ -503,7 +606,7 @@ async def api_post_settings(request: Request, payload: dict, x_admin_token: str
 
 @app.put('/api/settings')
 async def api_put_settings(request: Request, x_admin_token: str | None = Header(None)):
-  allowed = _allowed_admin_tokens()
+  allowed = await _allowed_admin_tokens()
   if allowed:
     if not x_admin_token or x_admin_token not in allowed:
       return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
@@ -516,7 +619,7 @@ async def api_put_settings(request: Request, x_admin_token: str | None = Header(
     return JSONResponse({'ok': False, 'error': 'invalid json'}, status_code=400)
   # write to Supabase
   try:
-    settings_put(body)
+    await _asb.settings_put(body)
     return JSONResponse({'ok': True, 'updated': list(body.keys())})
   except Exception as e:
     return JSONResponse({'ok': False, 'error': str(e)}, status_code=500)
@@ -524,7 +627,7 @@ async def api_put_settings(request: Request, x_admin_token: str | None = Header(
 
 @app.post('/api/settings/refresh')
 async def api_post_settings_refresh(request: Request, x_admin_token: str | None = Header(None)):
-  allowed = _allowed_admin_tokens()
+  allowed = await _allowed_admin_tokens()
   if allowed:
     if not x_admin_token or x_admin_token not in allowed:
       return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
@@ -533,10 +636,12 @@ async def api_post_settings_refresh(request: Request, x_admin_token: str | None
       return JSONResponse({'ok': False, 'error': 'admin token not set; settings API restricted to localhost'}, status_code=403)
   try:
     settings_refresh()
+    # tell the other replicas to drop their snapshots too
+    await asyncio.to_thread(_settings_sync.bump)
     # Reload tokens from Supabase into the process environment so updates
     # to GITHUB_TOKEN / GITHUB_PAT via the UI take effect without restart.
     try:
-      _load_github_tokens_from_supabase()
+      await asyncio.to_thread(_load_github_tokens_from_supabase)
     except Exception:
       pass
     # Attempt to proactively load OPENAI_API_KEY and AGENT_USE_LANGGRAPH from
@@ -546,7 +651,7 @@ async def api_post_settings_refresh(request: Request, x_admin_token: str | None
     # authenticated admin calls /api/settings/refresh.
     try:
       try:
-        val = _sbmod.settings_get('OPENAI_API_KEY', default=None, decrypt=True)
+        val = await _asb.settings_get('OPENAI_API_KEY', default=None, decrypt=True)
       except Exception:
         val = None
       if val:
@@ -559,7 +664,7 @@ async def api_post_settings_refresh(request: Request, x_admin_token: str | None
           pass
       # Also sync agent_use_langgraph flag if present
       try:
-        ag = _sbmod.settings_get('agent_use_langgraph', default=None, decrypt=False)
+        ag = await _asb.settings_get('agent_use_langgraph', default=None, decrypt=False)
       except Exception:
         ag = None
       if ag is not None:
@@ -571,11 +676,9 @@ async def api_post_settings_refresh(request: Request, x_admin_token: str | None
     # new API key or configuration toggles. If we can't apply in-process a
     # restart may still be required.
     try:
-      import importlib
-      import graph.va_graph as _vg
-      if hasattr(_vg, '_Wrapper'):
-        _vg._singleton = _vg._Wrapper()
-        _log.info('Reinitialized graph after settings refresh')
+      if _graph_registry.reload():
+        _log.info('Rebuilding graph after settings refresh')
+      _readiness.kick()
     except Exception:
       pass
     return JSONResponse({'ok': True, 'cache': 'cleared'})
@@ -589,7 +692,7 @@ async def api_rotate_admin(request: Request, x_admin_token: str | None = Header(
 
   Returns the new token in the response so the operator can copy it and, if desired, set it as an environment variable.
   """
-  admin_token = os.getenv('SETTINGS_ADMIN_TOKEN') or _sbmod.settings_get('SETTINGS_ADMIN_TOKEN')
+  admin_token = os.getenv('SETTINGS_ADMIN_TOKEN') or await _asb.settings_get('SETTINGS_ADMIN_TOKEN')
   if admin_token:
     if not x_admin_token or x_admin_token != admin_token:
       return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
@@ -606,11 +709,11 @@ async def api_rotate_admin(request: Request, x_admin_token: str | None = Header(
 
   # Try to persist via settings_put (Supabase-backed) and fall back to file-backed _save_settings
   try:
-    settings_put({'SETTINGS_ADMIN_TOKEN': new_token})
+    await _asb.settings_put({'SETTINGS_ADMIN_TOKEN': new_token})
     return JSONResponse({'ok': True, 'new_token': new_token})
   except Exception as e:
     try:
-      saved = _save_settings({'SETTINGS_ADMIN_TOKEN': new_token})
+      saved = await _save_settings({'SETTINGS_ADMIN_TOKEN': new_token})
       if saved is None:
         raise RuntimeError('failed to persist locally')
       return JSONResponse({'ok': True, 'new_token': new_token, 'note': 'saved to local settings file'})
@@ -654,6 +757,13 @@ async def health():
     return PlainTextResponse("ok")
 
 
+@app.get("/health/ready")
+async def health_ready():
+  """Readiness (graph built, credentials accepted); 503 until the agent can serve."""
+  snap = _readiness.snapshot()
+  return JSONResponse(snap, status_code=200 if snap.get("ready") else 503)
+
+
 @app.get("/showme", response_class=HTMLResponse)
 async def showme():
   try:
@@ -665,18 +775,21 @@ async def showme():
 @app.get('/api/sessions')
 async def api_sessions(page: int = 1, page_size: int = 10):
   try:
-    from vme_lib import supabase_client as _sbmod
     sb = _sbmod._client()
   except Exception:
     sb = None
   if not sb:
     return JSONResponse({"ok": True, "counts": None, "page": page, "page_size": page_size})
   try:
-    c1 = sb.table('va_sessions').select('*', count='exact').limit(1).execute()
-    c2 = sb.table('va_messages').select('*', count='exact').limit(1).execute()
-    sessions_count = getattr(c1, 'count', None)
-    messages_count = getattr(c2, 'count', None)
+    # trigger-maintained counters (one row read); fall back to count scans
+    # while va_stats hasn't been created
+    stats = await _asb.stats_get()
+    if stats is not None:
+      sessions_count, messages_count = stats.get('va_sessions'), stats.get('va_messages')
+    else:
+      sessions_count, messages_count = await asyncio.gather(_asb.count_rows('va_sessions'), _asb.count_rows('va_messages'))
     return JSONResponse({"ok": True, "counts": {"va_sessions": sessions_count, "va_messages": messages_count},
+               "source": "stats" if stats is not None else "count",
                "page": page, "page_size": page_size})
   except Exception as e:
     return JSONResponse({"ok": False, "error": str(e), "page": page, "page_size": page_size}, status_code=500)
@@ -730,12 +843,12 @@ async def api_debug_status():
     # check values in va_settings only if client is available
     if out['supabase_connected']:
       try:
-        v = _sbmod.settings_get('CI_SETTINGS_ADMIN_TOKEN', default=None, decrypt=True)
+        v = await _asb.settings_get('CI_SETTINGS_ADMIN_TOKEN', default=None, decrypt=True)
         out['ci_in_settings'] = bool(v)
       except Exception:
         out['ci_in_settings'] = False
       try:
-        v2 = _sbmod.settings_get('SETTINGS_ADMIN_TOKEN', default=None, decrypt=True)
+        v2 = await _asb.settings_get('SETTINGS_ADMIN_TOKEN', default=None, decrypt=True)
         out['settings_in_settings'] = bool(v2)
       except Exception:
         out['settings_in_settings'] = False
@@ -760,7 +873,11 @@ async def api_debug_supacall():
     return JSONResponse({'ok': False, 'error': 'supabase client not configured (missing url/key)'} , status_code=500)
   try:
     # perform a lightweight read
-    res = sb.table('va_settings').select('key').limit(1).execute()
+    ac = _asb._aclient()
+    if ac is not None:
+      res = await _asb.execute(ac.table('va_settings').select('key').limit(1))
+    else:
+      res = await asyncio.to_thread(lambda: sb.table('va_settings').select('key').limit(1).execute())
     # success: don't return rows to avoid exposing values
     return JSONResponse({'ok': True, 'rows_returned': bool(getattr(res, 'data', None)), 'count': getattr(res, 'count', None)})
   except Exception as e:
@@ -782,7 +899,7 @@ async def api_debug_railway_inspect():
   token = os.getenv('RAILWAY_API_TOKEN')
   try:
     if not token:
-      token = _sbmod.settings_get('RAILWAY_API_TOKEN', default=None, decrypt=True)
+      token = await _asb.settings_get('RAILWAY_API_TOKEN', default=None, decrypt=True)
   except Exception:
     token = token
 
@@ -918,11 +1035,11 @@ async def api_public_auto_continue():
   try:
     # Prefer Supabase-backed settings when available
     try:
-      val = _sbmod.settings_get('auto_continue', default=None, decrypt=False)
+      val = await _asb.settings_get('auto_continue', default=None, decrypt=False)
     except Exception:
       val = None
     if val is None:
-      s = _load_settings() or {}
+      s = await _load_settings() or {}
       val = s.get('auto_continue')
     # normalize to boolean
     ok = False
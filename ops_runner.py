@@ -1,24 +1,411 @@
-import threading, time
+"""In-process runner for Ops tasks.
+
+Tasks are run by a pool of worker threads (OPS_WORKERS, resizable at runtime
+with `resize()`), so one long `graph.ops_graph.run_task` no longer holds up
+every task queued behind it. Idle workers block on a condition variable and
+are woken by `enqueue_task`; there is no polling.
+
+Each task runs on its own thread, supervised by the worker that picked it
+up. A task still running after OPS_TASK_TIMEOUT seconds is marked failed
+with a `timeout` event and the worker moves on. Python threads cannot be
+killed, so the run is abandoned rather than stopped: its cancel flag is set,
+and its next `emit` raises `TaskCancelled`, which ends a run that reports
+progress. A run that never emits keeps going in the background until it
+returns. If the same task is picked up again on this replica while an
+abandoned run of it is still alive, the new run waits for the old one to
+exit first (under the same timeout).
+
+With a store configured (Supabase, or STORAGE_BACKEND=sqlite|auto), the
+`va_tasks` table itself is the queue, so any number of replicas can share
+it. Workers claim the oldest queued task atomically (`va_task_claim`: FOR
+UPDATE SKIP LOCKED in Postgres, the write lock in SQLite). A claim is a lease
+of OPS_LEASE_S seconds, renewed every third of that while the task runs.
+When a renewal is refused (the lease expired and the task went to another
+worker, or it was cancelled), the run is abandoned the same way. A final
+status that can't be written (`va_task_finish` refused or failed) counts as
+a lost lease too: the task is left to expire and be re-queued.
+Workers that find the queue empty put tasks with expired leases back in the
+queue, or fail them after OPS_MAX_ATTEMPTS claims. They then wait for a
+local submit or OPS_CLAIM_POLL_S seconds before claiming again. Tasks that
+only exist in-process (the store write failed) are queued in memory.
+
+If claiming fails before it has ever worked (no store, or `va_task_claim`
+not applied yet), the pool falls back to the in-memory queue, runs the
+tasks submitted so far locally, and reports the error as `db_error` in
+`stats()`. It tries the table again every OPS_CLAIM_RETRY_S seconds once no
+fallback task is queued or running.
+
+`stats()` reports queue depth and, per worker, queue wait and run time.
+
+Environment:
+  - OPS_WORKERS (default 2)
+  - OPS_TASK_TIMEOUT (default 600): seconds
+  - OPS_QUEUE (default auto): db | memory (auto = db when a store is configured)
+  - OPS_LEASE_S (default 30)
+  - OPS_MAX_ATTEMPTS (default 3)
+  - OPS_CLAIM_POLL_S (default 2)
+  - OPS_CLAIM_RETRY_S (default 60)
+"""
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
 from collections import deque
-from typing import Dict, Any
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
+
 from graph.ops_graph import run_task as _run_task
 from vme_lib import supabase_client as _sbmod
 import routes.ops as _ops_module
 
-_queue = deque()
-_lock = threading.Lock()
-_worker_thread = None
-_stop = False
+_log = logging.getLogger("uvicorn.error")
 
 # In-proc fallback task store and id generator
 _inproc_next_id = 1000
 _inproc_tasks = {}
 
 
+def _pct(xs, p: float) -> Optional[float]:
+    xs = sorted(xs)
+    if not xs:
+        return None
+    return round(xs[min(len(xs) - 1, int(len(xs) * p))], 1)
+
+
+def _age_s(row: Dict[str, Any]) -> float:
+    """Seconds since a va_tasks row was created (0 if unknown)."""
+    try:
+        created = datetime.fromisoformat(str(row.get('created_at')).replace('Z', '+00:00'))
+        return max(0.0, time.time() - created.timestamp())
+    except Exception:
+        return 0.0
+
+
+class TaskCancelled(Exception):
+    """Raised by `emit` once a run has been abandoned (timeout, lost lease)."""
+
+
+class DbQueue:
+    """va_tasks as the queue: atomic claims held as renewable leases."""
+
+    def __init__(self, lease_s: float = 30.0, max_attempts: int = 3, poll_s: float = 2.0,
+                 retry_s: float = 60.0):
+        self.lease_s = max(1.0, lease_s)
+        self.max_attempts = max(1, max_attempts)
+        self.poll_s = poll_s
+        self.retry_s = retry_s
+        self._last_requeue = 0.0
+        self._lock = threading.Lock()
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """The claimed row, or None when nothing is queued; raises when the claim itself fails."""
+        return _sbmod.task_claim(owner, self.lease_s)
+
+    def heartbeat(self, task_id: int, owner: str) -> Optional[bool]:
+        return _sbmod.task_heartbeat(task_id, owner, self.lease_s)
+
+    def finish(self, task_id: int, owner: str, status: str, error: Optional[str] = None) -> Optional[bool]:
+        return _sbmod.task_finish(task_id, owner, status, error)
+
+    def requeue_expired(self) -> int:
+        """At most once per half lease per process."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_requeue < self.lease_s / 2:
+                return 0
+            self._last_requeue = now
+        return _sbmod.task_requeue_expired(self.max_attempts) or 0
+
+
+class _Worker:
+    def __init__(self, wid: int):
+        self.id = wid
+        self.thread: Optional[threading.Thread] = None
+        self.retire = False
+        self.task_id: Optional[int] = None
+        self.started_at: Optional[float] = None
+        self.waits_ms: Deque[float] = deque(maxlen=256)
+        self.runs_ms: Deque[float] = deque(maxlen=256)
+        self.counts = {"done": 0, "failed": 0, "timeouts": 0, "lost": 0}
+
+    def info(self) -> Dict[str, Any]:
+        running = self.task_id is not None
+        return dict(self.counts, id=self.id, state="running" if running else "idle", task_id=self.task_id,
+                    running_s=round(time.monotonic() - self.started_at, 1) if running and self.started_at else None,
+                    wait_ms_avg=round(sum(self.waits_ms) / len(self.waits_ms), 1) if self.waits_ms else None,
+                    wait_ms_p95=_pct(self.waits_ms, 0.95),
+                    run_ms_avg=round(sum(self.runs_ms) / len(self.runs_ms), 1) if self.runs_ms else None,
+                    run_ms_p95=_pct(self.runs_ms, 0.95),
+                    run_ms_max=round(max(self.runs_ms), 1) if self.runs_ms else None)
+
+
+class WorkerPool:
+    def __init__(self, workers: int = 2, task_timeout: float = 600.0,
+                 run: Optional[Callable[..., bool]] = None, queue: Optional[DbQueue] = None):
+        self.target = max(0, workers)
+        self.task_timeout = task_timeout
+        self._run = run
+        self.db = queue
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._cond = threading.Condition()
+        self._queue: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self._workers: Dict[int, _Worker] = {}
+        self._ids = itertools.count(1)
+        self._stopped = False
+        self._stats = {"enqueued": 0, "abandoned": 0, "claims": 0, "lost_leases": 0, "requeued": 0,
+                       "claim_errors": 0, "finish_errors": 0}
+        # db queue state: None until a claim has answered, False while falling back to memory
+        self._db_ok: Optional[bool] = None
+        self._unconfirmed: Dict[int, Tuple[float, Dict[str, Any]]] = {}
+        self._fallback: Set[int] = set()
+        self._retry_at = 0.0
+        self.db_error: Optional[str] = None
+        self._threads: Dict[int, threading.Thread] = {}  # task id -> its run thread, while alive
+
+    # ---- queue ----
+    def submit(self, task: Dict[str, Any], durable: bool = False):
+        """Queue a task; durable=True means it is already a queued va_tasks row, so just wake a worker."""
+        with self._cond:
+            now = time.monotonic()
+            if durable and self.db and self._db_ok is not False:
+                if self._db_ok is None:
+                    # kept until a claim shows the table works; run locally if it doesn't
+                    self._unconfirmed[int(task.get('id'))] = (now, task)
+            else:
+                if durable and self.db:
+                    self._fallback.add(int(task.get('id')))
+                self._queue.append((now, task))
+            self._stats["enqueued"] += 1
+            self._cond.notify()
+        self.start()
+
+    def _db_usable(self) -> bool:
+        """Whether to claim from the table now (called under the lock)."""
+        if not self.db:
+            return False
+        if self._db_ok is False:
+            if self._fallback or time.monotonic() < self._retry_at:
+                return False
+            self._db_ok = None  # try the table again
+        return True
+
+    def _claim_failed(self, e: Exception):
+        with self._cond:
+            self._stats["claim_errors"] += 1
+            self.db_error = str(e)[:200]
+            if self._db_ok is None:
+                # the queue has never worked: run what was submitted in memory
+                self._db_ok = False
+                self._retry_at = time.monotonic() + self.db.retry_s
+                for tid, item in sorted(self._unconfirmed.items(), key=lambda kv: kv[1][0]):
+                    self._fallback.add(tid)
+                    self._queue.append(item)
+                self._unconfirmed.clear()
+                self._cond.notify_all()
+            else:
+                self._cond.wait(self.db.poll_s)  # store hiccup; the rows stay queued
+
+    def _claim_ok(self):
+        with self._cond:
+            if self._db_ok is not True:
+                self._db_ok = True
+                self._unconfirmed.clear()
+
+    def _owner(self, w: _Worker) -> str:
+        return f"{self.owner}:{w.id}"
+
+    def _next(self, w: _Worker) -> Optional[Tuple[float, Dict[str, Any], bool]]:
+        """(queued_at, task, leased): a local task first, else a claimed va_tasks row."""
+        while True:
+            with self._cond:
+                while not self._queue and not self._db_usable():
+                    if self._stopped or w.retire:
+                        return None
+                    self._cond.wait(self.db.poll_s if self.db else None)
+                if self._stopped or w.retire:
+                    return None
+                if self._queue:
+                    queued_at, task = self._queue.popleft()
+                    return queued_at, task, False
+            try:
+                row = self.db.claim(self._owner(w))
+            except Exception as e:
+                self._claim_failed(e)
+                continue
+            self._claim_ok()
+            if row is not None:
+                with self._cond:
+                    self._stats["claims"] += 1
+                return time.monotonic() - _age_s(row), row, True
+            n = self.db.requeue_expired()
+            with self._cond:
+                self._stats["requeued"] += n
+                if not n and not self._queue and not (self._stopped or w.retire):
+                    self._cond.wait(self.db.poll_s)
+
+    # ---- workers ----
+    def start(self):
+        """Bring the pool up to its target size (idempotent)."""
+        with self._cond:
+            self._stopped = False
+            live = [w for w in self._workers.values() if not w.retire]
+            for _ in range(self.target - len(live)):
+                w = _Worker(next(self._ids))
+                w.thread = threading.Thread(target=self._loop, args=(w,), name=f"ops-worker-{w.id}", daemon=True)
+                self._workers[w.id] = w
+                w.thread.start()
+
+    def resize(self, workers: int) -> int:
+        """Set the worker count; extra workers exit after their current task."""
+        with self._cond:
+            self.target = max(0, workers)
+            live = sorted((w for w in self._workers.values() if not w.retire), key=lambda w: w.id)
+            for w in live[self.target:]:
+                w.retire = True
+            self._cond.notify_all()
+        self.start()
+        return self.target
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _loop(self, w: _Worker):
+        try:
+            while True:
+                item = self._next(w)
+                if item is None:
+                    return
+                queued_at, task, leased = item
+                w.waits_ms.append((time.monotonic() - queued_at) * 1000.0)
+                try:
+                    self._execute(w, task, leased)
+                finally:
+                    with self._cond:
+                        self._fallback.discard(int(task.get('id')))
+        finally:
+            with self._cond:
+                self._workers.pop(w.id, None)
+
+    def _execute(self, w: _Worker, task: Dict[str, Any], leased: bool = False):
+        tid = int(task.get('id'))
+        w.task_id, w.started_at = tid, time.monotonic()
+        finished = threading.Event()
+        cancel = threading.Event()  # set when this run is abandoned
+        outcome: Dict[str, Any] = {}
+        with self._cond:
+            prev = self._threads.get(tid)
+
+        def emit(kind, data):
+            if cancel.is_set():
+                raise TaskCancelled(tid)
+            _emit_event(tid, kind, data)
+
+        def target():
+            try:
+                if prev is not None:
+                    prev.join()  # an abandoned run of this task is still going
+                if not cancel.is_set():
+                    run = self._run or _run_task
+                    outcome["ok"] = bool(run(title=task.get('title'), body=task.get('body'), emit=emit))
+            except Exception as e:
+                outcome["error"] = str(e)
+            finally:
+                finished.set()
+                with self._cond:
+                    if self._threads.get(tid) is threading.current_thread():
+                        del self._threads[tid]
+
+        owner = self._owner(w)
+
+        def finish(status: str, error: Optional[str] = None) -> bool:
+            if not leased:
+                _set_status(tid, status, error=error)
+                return True
+            ok = self.db.finish(tid, owner, status, error)
+            if ok is None:
+                # the write failed: treat it like a lost lease; the lease runs out
+                # and requeue_expired hands the task out again
+                _log.warning("ops task %s: recording status %r failed; left for requeue", tid, status)
+                with self._cond:
+                    self._stats["finish_errors"] += 1
+            return ok is True
+
+        if not leased:
+            _set_status(tid, 'running')  # a claim already marked it
+        t = threading.Thread(target=target, name=f"ops-task-{tid}", daemon=True)
+        with self._cond:
+            self._threads[tid] = t
+        t.start()
+        deadline = w.started_at + self.task_timeout
+        done = lost = False
+        while True:
+            left = deadline - time.monotonic()
+            if finished.wait(max(0.0, min(left, self.db.lease_s / 3) if leased else left)):
+                done = True
+                break
+            if time.monotonic() >= deadline:
+                break
+            if leased and self.db.heartbeat(tid, owner) is False:
+                lost = True  # re-queued to another worker, or cancelled
+                break
+        w.runs_ms.append((time.monotonic() - w.started_at) * 1000.0)
+        w.task_id = w.started_at = None
+        if not done:
+            cancel.set()  # abandon the run: its next emit raises TaskCancelled
+            if not lost:
+                w.counts["timeouts"] += 1
+                with self._cond:
+                    self._stats["abandoned"] += 1
+                _emit_event(tid, 'error', {'msg': f'timeout after {self.task_timeout:g}s'})
+                lost = not finish('failed', error='timeout')
+        elif outcome.get("ok"):
+            w.counts["done"] += 1
+            lost = not finish('success')
+        else:
+            w.counts["failed"] += 1
+            lost = not finish('failed', error=outcome.get("error"))
+        if lost:
+            w.counts["lost"] += 1
+            with self._cond:
+                self._stats["lost_leases"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(target=self.target, task_timeout_s=self.task_timeout, queue_depth=len(self._queue),
+                       queue="db" if self.db and self._db_ok is not False else "memory",
+                       db_error=self.db_error if self.db else None, task_threads=len(self._threads),
+                       lease_s=self.db.lease_s if self.db else None,
+                       oldest_wait_ms=round((now - self._queue[0][0]) * 1000.0, 1) if self._queue else None,
+                       workers=[w.info() for w in sorted(self._workers.values(), key=lambda w: w.id)])
+        return out
+
+
+def _store_configured() -> bool:
+    url = os.getenv('SUPABASE_URL')
+    key = os.getenv('SUPABASE_SERVICE_ROLE_KEY') or os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_ANON_KEY')
+    return bool(url and key) or os.getenv('STORAGE_BACKEND', 'supabase').lower() in ('sqlite', 'auto')
+
+
+_QUEUE = os.getenv('OPS_QUEUE', 'auto').lower()
+pool = WorkerPool(workers=int(os.getenv('OPS_WORKERS', '2')),
+                  task_timeout=float(os.getenv('OPS_TASK_TIMEOUT', '600')),
+                  queue=DbQueue(lease_s=float(os.getenv('OPS_LEASE_S', '30')),
+                                max_attempts=int(os.getenv('OPS_MAX_ATTEMPTS', '3')),
+                                poll_s=float(os.getenv('OPS_CLAIM_POLL_S', '2')),
+                                retry_s=float(os.getenv('OPS_CLAIM_RETRY_S', '60')))
+                  if _QUEUE == 'db' or (_QUEUE == 'auto' and _store_configured()) else None)
+
+
 def enqueue_task(task: Dict[str, Any]):
-    with _lock:
-        _queue.append(task)
-    _ensure_worker()
+    # tasks the store didn't take live only in routes.ops._tasks_store
+    pool.submit(task, durable=int(task.get('id')) not in _ops_module._tasks_store)
 
 
 def inproc_create_task(title: str, body: str) -> int:
@@ -37,68 +424,36 @@ def enqueue(task: Dict[str, Any]):
     enqueue_task(task)
 
 
-def _ensure_worker():
-    global _worker_thread
-    if _worker_thread and _worker_thread.is_alive():
-        return
-    _worker_thread = threading.Thread(target=_worker_loop, daemon=True)
-    _worker_thread.start()
-
-
-def _emit_event(task_id: int, kind: str, data: Dict[str, Any]):
-    # persist
+def _set_status(task_id: int, status: str, error: Optional[str] = None):
     try:
-        _sbmod._client()
+        _sbmod.update_task_status(task_id, status, error=error)
     except Exception:
         pass
-    try:
-        _sbmod.insert_task_event(task_id=task_id, kind=kind, data_dict=data)
-    except Exception:
-        pass
-    # also append to in-proc buffer so SSE subscribers get it
+    # keep the in-proc store (no Supabase) in step for GET /ops/tasks
+    row = _ops_module._tasks_store.get(task_id)
+    if row is not None and row.get('status') != 'cancelled':
+        row['status'] = status
+
+
+def _emit_event(task_id: int, kind: str, data: Dict[str, Any]):
+    # persists when Supabase is configured, otherwise buffers for SSE subscribers
     try:
         _ops_module._append_event(task_id, kind, data)
     except Exception:
         pass
 
 
-def _worker_loop():
-    global _stop
-    while not _stop:
-        task = None
-        with _lock:
-            if _queue:
-                task = _queue.popleft()
-        if not task:
-            time.sleep(0.2)
-            continue
-        tid = int(task.get('id'))
-        try:
-            # mark running
-            try:
-                _sbmod.update_task_status(tid, 'running')
-            except Exception:
-                pass
-            # run the task via ops_graph
-            def emit(kind, data):
-                _emit_event(tid, kind, data)
-            ok = _run_task(title=task.get('title'), body=task.get('body'), emit=emit)
-            # set final status
-            try:
-                _sbmod.update_task_status(tid, 'success' if ok else 'failed')
-            except Exception:
-                pass
-        except Exception as e:
-            try:
-                _sbmod.update_task_status(tid, 'failed', error=str(e))
-            except Exception:
-                pass
+def resize(workers: int) -> int:
+    return pool.resize(workers)
+
+
+def stats() -> Dict[str, Any]:
+    return pool.stats()
 
 
 def stop_worker():
-    global _stop
-    _stop = True
+    pool.stop()
 
 
 def start_worker():
-    _ensure_worker()
+    pool.start()
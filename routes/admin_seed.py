@@ -29,6 +29,22 @@ def _allowed_admin_tokens():
     return out
 
 
+def admin_denied(request: Request, x_admin_token: Optional[str], dev_bypass: bool = False):
+    """403 response unless the caller is an admin (token, or localhost when none is set), else None.
+
+    dev_bypass: with DEV_LOCAL_LLM set, anyone is let through.
+    """
+    if dev_bypass and os.getenv('DEV_LOCAL_LLM') in ('1', 'true', 'True'):
+        return None
+    allowed = _allowed_admin_tokens()
+    if allowed:
+        if not x_admin_token or x_admin_token not in allowed:
+            return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
+    elif not _is_local_request(request):
+        return JSONResponse({'ok': False, 'error': 'admin token not set; restricted to localhost'}, status_code=403)
+    return None
+
+
 @router.post('/seed_memory')
 async def seed_memory(request: Request, x_admin_token: Optional[str] = Header(None)):
     """Seed two foundational sessions/messages into Supabase.
@@ -38,21 +54,9 @@ async def seed_memory(request: Request, x_admin_token: Optional[str] = Header(No
     """
     # Allow a dev/test bypass when DEV_LOCAL_LLM is set. This keeps CI/dev runs
     # deterministic and avoids flakey host checks under TestClient.
-    if os.getenv('DEV_LOCAL_LLM') in ('1', 'true', 'True'):
-        allowed = set()
-    else:
-        allowed = _allowed_admin_tokens()
-
-    if allowed:
-        if not x_admin_token or x_admin_token not in allowed:
-            return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
-    else:
-        if os.getenv('DEV_LOCAL_LLM') in ('1', 'true', 'True'):
-            # dev bypass active: allow the request
-            pass
-        else:
-            if not _is_local_request(request):
-                return JSONResponse({'ok': False, 'error': 'admin token not set; restricted to localhost'}, status_code=403)
+    denied = admin_denied(request, x_admin_token, dev_bypass=True)
+    if denied is not None:
+        return denied
 
     # Ensure supabase client exists
     cli = sb._client()
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 import os
 import sys
 try:
@@ -13,12 +13,21 @@ from typing import Optional, Dict, Any, List
 import os
 from vme_lib.supabase_client import safe_log_message, create_session, safe_log_tool_event, select_tool_events
 from graph.va_graph import get_graph
+from graph import memory as _memory
+from graph import registry as _graph_registry
+from graph import model_router as _model_router
+from graph import spans as _spans
 from fastapi import Query
 from typing import List, Dict
 from vme_lib import supabase_client as _sbmod
+from vme_lib import pagination as _pg
+from vme_lib import history_cache as _history
+from vme_lib.governor import Governor, Overloaded
+from vme_lib.session_lanes import SessionLanes
 from pathlib import Path
 import asyncio
 import json
+import time
 from fastapi.responses import StreamingResponse
 
 from pydantic import Field
@@ -33,6 +42,68 @@ except Exception:
 router = APIRouter(prefix="/agent", tags=["agent"])
 
 
+# Bounds concurrent graph runs from /agent/chat; excess requests wait up to
+# AGENT_CHAT_QUEUE_TIMEOUT seconds for a slot, then get 503 + Retry-After.
+chat_governor = Governor(
+    "agent_chat",
+    limit=int(os.getenv("AGENT_CHAT_CONCURRENCY", "8")),
+    max_wait=float(os.getenv("AGENT_CHAT_QUEUE_TIMEOUT", "10")),
+    max_queue=int(os.getenv("AGENT_CHAT_MAX_QUEUE", "64")),
+)
+
+# Turns of one session (chat and stream alike) run one at a time, in order;
+# a duplicate submission of the same message joins the running one.
+session_lanes = SessionLanes("agent_sessions", max_wait=float(os.getenv("AGENT_SESSION_QUEUE_TIMEOUT", "120")))
+
+
+def _memory_model() -> str:
+    return str(_sbmod.settings_get("OPENAI_MODEL", os.getenv("OPENAI_MODEL", "gpt-4o-mini")))
+
+
+def _log_tool_events(session_id, events: Optional[List[Dict[str, Any]]]):
+    """Log a turn's tool events (best-effort); memo hit stats ride along in input_json._memo."""
+    try:
+        for evt in events or []:
+            input_json = evt.get("input_json")
+            if evt.get("memo"):
+                input_json = dict(input_json or {}, _memo=evt["memo"])
+            safe_log_tool_event(session_id=session_id, tool_name=evt.get("tool_name") or "unknown",
+                                input_json=input_json, output_json=evt.get("output_json"))
+    except Exception:
+        pass
+
+
+def _log_route(session_id, route: Optional[Dict[str, Any]]):
+    """Record the model routing decision alongside the turn's tool events."""
+    if not route:
+        return
+    try:
+        safe_log_tool_event(session_id=session_id, tool_name="model_router",
+                            input_json={"tokens": route.get("tokens"), "tools_likely": route.get("tools_likely")},
+                            output_json=route)
+    except Exception:
+        pass
+
+
+def _log_trace(session_id, spans: Optional[List[Dict[str, Any]]], endpoint: str, log_s: float):
+    """Persist the turn's timing spans (compact) as a `trace` tool event.
+
+    `log_s` is the time spent logging the turn's messages and tool events;
+    it is added as a `log` span and counted in the span percentiles.
+    """
+    if not spans:
+        return
+    try:
+        log_span = {"kind": "log", "name": endpoint, "start_ms": spans[-1].get("ms"), "ms": round(log_s * 1000.0, 1)}
+        _spans.record([log_span])
+        run = spans[-1]
+        safe_log_tool_event(session_id=session_id, tool_name="trace",
+                            input_json={"endpoint": endpoint, "model": run.get("model"), "total_ms": run.get("ms")},
+                            output_json=_spans.compact(spans + [log_span]))
+    except Exception:
+        pass
+
+
 class ChatIn(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -44,15 +115,92 @@ class ChatOut(BaseModel):
     text: str
 
 
+def _prepare_turn(session_id: str, message: str):
+    """(graph, input messages) for a turn. Blocking (graph build, settings, history): run in a worker thread.
+
+    The messages are prior turns (token-budgeted) followed by the new one,
+    read before the user message is recorded so it isn't included twice.
+    """
+    graph = get_graph()
+    try:
+        turns = _memory.build_messages(session_id, message, _memory_model())
+    except Exception:
+        turns = [{"role": "user", "content": message}]
+    return graph, turns
+
+
+def _record_user(session_id: str, message: str):
+    # Best-effort: remember and log the user message when we have a session
+    try:
+        if session_id:
+            _memory.record(session_id, "user", message)
+            safe_log_message(session_id=session_id, role="user", content=message)
+    except Exception:
+        pass
+
+
+async def _chat_turn(session_id: str, message: str) -> str:
+    """One chat turn for a session: memory, graph run and logging. Runs in the session's lane."""
+    config = {"configurable": {"thread_id": session_id or None}}
+    try:
+        async with chat_governor.slot():
+            # only an admitted turn is recorded, so a 503 and its retry don't leave the message twice
+            graph, turns = await asyncio.to_thread(_prepare_turn, session_id, message)
+            state_in = {"session_id": session_id, "messages": turns, "endpoint": "chat"}
+            _record_user(session_id, message)
+            # pin the graph version for the whole turn, even if a reload swaps it
+            with _graph_registry.using(graph):
+                if hasattr(graph, "ainvoke"):
+                    result = await graph.ainvoke(state_in, config=config)
+                else:
+                    result = await asyncio.to_thread(graph.invoke, state_in, config)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="agent busy, retry shortly",
+                            headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        # LangGraph/LangChain/OpenAI may raise a BadRequest when message roles
+        # like 'tool' are passed directly to the OpenAI chat endpoint. Detect
+        # that specific case and return a helpful error so the developer can
+        # decide whether the issue is the key, the prompt, or the graph/tooling.
+        msg = str(e)
+        if "messages with role 'tool'" in msg or "role 'tool'" in msg:
+            raise HTTPException(status_code=400, detail=(
+                "OpenAI rejected the request: messages with role 'tool' were sent to the model. "
+                "This typically means the agent included tool messages in the chat payload. "
+                "Try running with DEV_LOCAL_LLM=true to avoid external calls, or adjust the graph/tool integration."))
+        # For other errors, surface a 500 with the original message for debugging
+        raise HTTPException(status_code=500, detail=f"agent error: {msg}")
+    text = result.get("last_text", "")
+
+    # Log assistant reply (best-effort)
+    t_log = time.monotonic()
+    _memory.record(session_id, "assistant", text)
+    safe_log_message(session_id=session_id, role="assistant", content=text)
+
+    # Log any tool events captured by the graph (best-effort)
+    _log_route(session_id, result.get("route"))
+    _log_tool_events(session_id, result.get("tool_events"))
+    _log_trace(session_id, result.get("spans"), "chat", time.monotonic() - t_log)
+    return text
+
+
 @router.post("/chat", response_model=ChatOut)
-def chat(payload: ChatIn):
+async def chat(payload: ChatIn):
+    """Run one agent turn.
+
+    Async so a slow LLM round trip doesn't hold a threadpool worker; the few
+    blocking calls (session insert, memory seeding) go to a worker thread.
+    Graph runs are bounded by `chat_governor`. Turns of one session run in
+    order via `session_lanes`; resubmitting a message that is still queued
+    or running returns that turn's reply instead of running it again.
+    """
     if not payload.message:
         raise HTTPException(status_code=400, detail="message required")
 
     # Ensure a numeric session id exists in DB (BIGINT)
     session_id = payload.session_id
     if not session_id:
-        sid = create_session(payload.label or "default")
+        sid = await asyncio.to_thread(create_session, payload.label or "default")
         session_id = str(sid) if sid is not None else ""
 
     # Prepare graph input
@@ -74,48 +222,34 @@ def chat(payload: ChatIn):
             pass
         return ChatOut(session_id=session_id, text=text)
 
-    graph = get_graph()
-    state_in = {
-        "session_id": session_id,
-        "messages": [{"role": "user", "content": payload.message}],
-    }
-    # Best-effort: also log the user message when we have a session
     try:
-        if session_id:
-            safe_log_message(session_id=session_id, role="user", content=payload.message)
-    except Exception:
-        pass
-    try:
-        result = graph.invoke(
-            state_in,
-            config={"configurable": {"thread_id": session_id or None}},
-        )
-    except Exception as e:
-        # LangGraph/LangChain/OpenAI may raise a BadRequest when message roles
-        # like 'tool' are passed directly to the OpenAI chat endpoint. Detect
-        # that specific case and return a helpful error so the developer can
-        # decide whether the issue is the key, the prompt, or the graph/tooling.
-        msg = str(e)
-        if "messages with role 'tool'" in msg or "role 'tool'" in msg:
-            raise HTTPException(status_code=400, detail=(
-                "OpenAI rejected the request: messages with role 'tool' were sent to the model. "
-                "This typically means the agent included tool messages in the chat payload. "
-                "Try running with DEV_LOCAL_LLM=true to avoid external calls, or adjust the graph/tool integration."))
-        # For other errors, surface a 500 with the original message for debugging
-        raise HTTPException(status_code=500, detail=f"agent error: {msg}")
-    text = result.get("last_text", "")
+        text = await session_lanes.run(session_id, payload.message, lambda: _chat_turn(session_id, payload.message))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail="agent busy, retry shortly",
+                            headers={"Retry-After": str(e.retry_after)})
+    return ChatOut(session_id=session_id, text=text)
 
-    # Log assistant reply (best-effort)
-    safe_log_message(session_id=session_id, role="assistant", content=text)
 
-    # Log any tool events captured by the graph (best-effort)
-    try:
-        for evt in result.get("tool_events", []) or []:
-            safe_log_tool_event(session_id=session_id, tool_name=evt.get("tool_name") or "unknown", input_json=evt.get("input_json"), output_json=evt.get("output_json"))
-    except Exception:
-        pass
+class ModelOverrideIn(BaseModel):
+    session_id: str
+    model: Optional[str] = None
 
-    return ChatOut(session_id=session_id, text=text)
+
+@router.get("/model")
+def model_route(session_id: str | None = None):
+    """Configured model tiers, routing stats and the session's override (if any)."""
+    out = _model_router.stats()
+    out["override"] = _model_router.router.override(session_id) if session_id else None
+    return out
+
+
+@router.post("/model")
+def model_override(payload: ModelOverrideIn):
+    """Pin a session to one of the configured model tiers (model=null clears it)."""
+    if payload.model and payload.model not in _model_router.router.tiers:
+        raise HTTPException(status_code=400, detail=f"unknown model tier: {payload.model}")
+    _model_router.router.set_override(payload.session_id, payload.model)
+    return {"ok": True, "session_id": payload.session_id, "model": payload.model}
 
 
 @router.get("/tool_events")
@@ -131,9 +265,30 @@ def tool_events(session_id: str, limit: int = Query(10, ge=1, le=50)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _cursors(before: Optional[str], after: Optional[str]):
+    try:
+        return _pg.decode_cursor(before), _pg.decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _cursor_headers(response: Response, page: Dict[str, Any]):
+    """List-shaped routes carry their cursors in headers."""
+    if page.get("next_cursor"):
+        response.headers["X-Next-Cursor"] = page["next_cursor"]
+    if page.get("prev_cursor"):
+        response.headers["X-Prev-Cursor"] = page["prev_cursor"]
+
+
 @router.get("/messages")
-def messages(session_id: str = Query(...), limit: int = Query(12)) -> List[Dict]:
-    """Return recent messages for a session (best-effort)."""
+def messages(response: Response, session_id: str = Query(...), limit: int = Query(12, ge=1, le=500),
+             before: Optional[str] = None, after: Optional[str] = None) -> List[Dict]:
+    """Return recent messages for a session (best-effort), oldest first.
+
+    Pages are keyed on message id: pass the `X-Next-Cursor` response header
+    back as `before` for older messages, `X-Prev-Cursor` as `after` for newer.
+    """
+    b, a = _cursors(before, after)
     sb = None
     try:
         sb = _sbmod._client()
@@ -142,13 +297,9 @@ def messages(session_id: str = Query(...), limit: int = Query(12)) -> List[Dict]
     if not sb:
         return []
     try:
-        res = (sb.table("va_messages")
-                 .select("*")
-                 .eq("session_id", int(session_id))
-                 .order("id", desc=True)
-                 .limit(limit)
-                 .execute())
-        rows = res.data or []
+        page = _history.history_page(sb, int(session_id), limit, before=b, after=a)
+        _cursor_headers(response, page)
+        rows = page["rows"]
         rows.reverse()
         return rows
     except Exception:
@@ -157,26 +308,46 @@ def messages(session_id: str = Query(...), limit: int = Query(12)) -> List[Dict]
 
 # ===== added: analytics + safe file read/write =====
 @router.get("/api/sessions")
-def api_sessions(page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100)):
-    # Returns {total_sessions,total_messages,last_session,recent:[...]}; [] if SB not configured.
+def api_sessions(page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=100),
+                 before: Optional[str] = None, after: Optional[str] = None,
+                 count: str = Query("stats", pattern="^(stats|exact|planned|estimated|none)$")):
+    # Returns {total_sessions,total_messages,last_session,recent:[...],next_cursor,prev_cursor};
+    # empty if SB not configured. `before`/`after` cursors page by id; `page` is
+    # kept for old clients and falls back to offset paging beyond page 1.
+    # Totals come from the va_stats counters (`count=stats`, falling back to
+    # an estimate); `count=none` skips them.
+    b, a = _cursors(before, after)
+    empty = {"total_sessions": None, "total_messages": None, "last_session": None, "recent": [],
+             "next_cursor": None, "prev_cursor": None}
     try:
         from vme_lib import supabase_client as _sbmod2
         sb = _sbmod2._client()
     except Exception:
         sb = None
     if not sb:
-        return {"total_sessions": None, "total_messages": None, "last_session": None, "recent": []}
+        return empty
     try:
-        # total sessions/messages (best effort with count='exact')
-        sess = sb.table("va_sessions").select("*", count="exact").order("id", desc=True).range((page-1)*page_size, page*page_size-1).execute()
-        total_sessions = getattr(sess, "count", None)
-        recent = sess.data or []
+        if page > 1 and b is None and a is None:
+            res = sb.table("va_sessions").select("*").order("id", desc=True).range((page-1)*page_size, page*page_size).execute()
+            rows = res.data or []
+            recent = rows[:page_size]
+            pg = {"next_cursor": _pg.encode_cursor(recent[-1]["id"]) if len(rows) > page_size else None,
+                  "prev_cursor": _pg.encode_cursor(recent[0]["id"]) if recent else None}
+        else:
+            pg = _pg.fetch_page(sb.table("va_sessions").select("*"), page_size, before=b, after=a)
+            recent = pg["rows"]
         last_session = recent[0] if recent else None
-        msgs = sb.table("va_messages").select("*", count="exact").limit(1).execute()
-        total_messages = getattr(msgs, "count", None)
-        return {"total_sessions": total_sessions, "total_messages": total_messages, "last_session": last_session, "recent": recent}
+        stats = _sbmod.stats_get() if count == "stats" else None
+        if stats is not None:
+            total_sessions, total_messages = stats.get("va_sessions"), stats.get("va_messages")
+        else:
+            mode = "estimated" if count == "stats" else count
+            total_sessions = _pg.count_rows(sb, "va_sessions", mode)
+            total_messages = _pg.count_rows(sb, "va_messages", mode)
+        return {"total_sessions": total_sessions, "total_messages": total_messages, "last_session": last_session,
+                "recent": recent, "next_cursor": pg["next_cursor"], "prev_cursor": pg["prev_cursor"]}
     except Exception:
-        return {"total_sessions": None, "total_messages": None, "last_session": None, "recent": []}
+        return empty
 
 
 _PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -321,8 +492,14 @@ def agent_write(req: WriteReq):
 
 
 @router.get("/sessions")
-def sessions(limit: int = Query(20)) -> List[Dict]:
-    """List recent sessions (id, label, created_at). Returns [] if SB not configured."""
+def sessions(response: Response, limit: int = Query(20, ge=1, le=200),
+             before: Optional[str] = None, after: Optional[str] = None) -> List[Dict]:
+    """List recent sessions (id, label, created_at), newest first. Returns [] if SB not configured.
+
+    Cursors for the neighbouring pages come back in `X-Next-Cursor` (older,
+    pass as `before`) and `X-Prev-Cursor` (newer, pass as `after`).
+    """
+    b, a = _cursors(before, after)
     try:
         sb = _sbmod._client()
     except Exception:
@@ -330,12 +507,9 @@ def sessions(limit: int = Query(20)) -> List[Dict]:
     if not sb:
         return []
     try:
-        res = (sb.table("va_sessions")
-                 .select("id,label,created_at")
-                 .order("id", desc=True)
-                 .limit(limit)
-                 .execute())
-        return res.data or []
+        page = _pg.fetch_page(sb.table("va_sessions").select("id,label,created_at"), limit, before=b, after=a)
+        _cursor_headers(response, page)
+        return page["rows"]
     except Exception:
         return []
 
@@ -394,89 +568,115 @@ def plan(in_: PlanIn):
 
 
 # --- SSE streaming endpoint (top-level) ---------------------------------------
+_STREAM_HEARTBEAT_S = float(os.getenv("STREAM_HEARTBEAT_S", "15"))
+
+
+def _sse(event: str, payload: Dict[str, Any]) -> str:
+    """One named SSE event; `payload["type"]` mirrors the event name."""
+    data = json.dumps(dict(payload, type=event), default=str)
+    return f"event: {event}\ndata: {data}\n\n"
+
+
 @router.get("/stream")
-async def stream(session_id: str | None = Query(None), label: str | None = Query(None)):
+async def stream(request: Request, session_id: str | None = Query(None), label: str | None = Query(None),
+                 message: str | None = Query(None)):
     """Server-Sent Events (SSE) endpoint that streams assistant output.
 
-    - In DEV_LOCAL_LLM or when OPENAI_API_KEY is missing, emits deterministic ticks
-      then a final done message (useful for tests and fake mode).
-    - If the graph exposes a streaming interface (e.g., `stream_invoke`), this
-      will attempt to use it; otherwise it falls back to a single final message.
+    Named events: `chunk` (token delta), `tool_start` / `tool_end`, then one
+    `done` carrying the full reply, or `error`. All carry `session_id`.
+
+    - In DEV_LOCAL_LLM or when OPENAI_API_KEY is missing, emits deterministic
+      `tick` events then a final done message (useful for tests and fake mode).
+    - Otherwise the graph runs once via `astream()`; the final text and tool
+      events come from that same execution. Idle gaps (tool calls, slow first
+      token) are filled with `: keep-alive` comments every STREAM_HEARTBEAT_S
+      seconds, and the run is cancelled if the client goes away.
+    - Turns of one session run in order (`session_lanes`, shared with
+      /agent/chat); a reconnect that repeats a message still queued or
+      running follows that run, replayed from its first event.
     """
+    fake = os.getenv("DEV_LOCAL_LLM", "").lower() in ("1", "true", "yes") or not os.getenv("OPENAI_API_KEY")
+    if not fake and not message:
+        raise HTTPException(status_code=400, detail="message required")
 
     # Ensure a session id
     sid = session_id
     if not sid:
         try:
-            sidv = create_session(label or "stream")
+            sidv = await asyncio.to_thread(create_session, label or "stream")
             sid = str(sidv) if sidv is not None else ""
         except Exception:
             sid = ""
 
-    async def event_generator():
-        # Fake/local mode: deterministic tick events
-        if os.getenv("DEV_LOCAL_LLM", "").lower() in ("1", "true", "yes") or not os.getenv("OPENAI_API_KEY"):
-            # Emit a few thinking ticks, then a final done event with an echo
-            for i in range(4):
-                payload = {"type": "tick", "text": f"thinking {i+1}/4"}
-                yield f"data: {json.dumps(payload)}\n\n"
-                await asyncio.sleep(0.15)
-            final = {"type": "done", "text": f"Echo stream for session {sid or ''}"}
-            # best-effort log
-            try:
-                safe_log_message(session_id=sid, role="assistant", content=final["text"])
-            except Exception:
-                pass
-            yield f"data: {json.dumps(final)}\n\n"
-            return
-
-        # Try to use the graph's streaming API if present
+    async def fake_events():
+        # Emit a few thinking ticks, then a final done event with an echo
+        for i in range(4):
+            yield _sse("tick", {"text": f"thinking {i+1}/4", "session_id": sid})
+            await asyncio.sleep(0.15)
+        final = {"text": f"Echo stream for session {sid or ''}", "session_id": sid}
+        # best-effort log
         try:
-            graph = get_graph()
-            # If graph provides an async generator interface 'stream_invoke', use it
-            if hasattr(graph, "stream_invoke"):
-                async for chunk in graph.stream_invoke({"session_id": sid, "messages": [{"role": "user", "content": ""}]}):
-                    # chunk expected to be dict-like with 'delta' or 'text'
-                    try:
-                        if isinstance(chunk, dict):
-                            payload = {"type": "chunk", "data": chunk}
-                            yield f"data: {json.dumps(payload)}\n\n"
-                        else:
-                            yield f"data: {json.dumps({"type": "chunk", "text": str(chunk)})}\n\n"
-                    except Exception:
-                        yield f"data: {json.dumps({"type": "chunk", "text": str(chunk)})}\n\n"
-                # After streaming, attempt to get final text
-                try:
-                    res = graph.invoke({"session_id": sid, "messages": [{"role": "user", "content": ""}]})
-                    final_text = res.get("last_text", "")
-                except Exception:
-                    final_text = ""
-                payload = {"type": "done", "text": final_text}
-                yield f"data: {json.dumps(payload)}\n\n"
-                return
+            safe_log_message(session_id=sid, role="assistant", content=final["text"])
         except Exception:
-            # fall through to non-stream fallback
             pass
+        yield _sse("done", final)
+
+    if fake:
+        return StreamingResponse(fake_events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    async def produce():
+        # One graph execution for the turn, run in the session's lane; shared
+        # by identical concurrent requests through session_lanes.follow().
+        graph, turns = await asyncio.to_thread(_prepare_turn, sid, message)
+        state_in = {"session_id": sid, "messages": turns, "endpoint": "stream"}
+        config = {"configurable": {"thread_id": sid or None}}
+        _record_user(sid, message)
+        with _graph_registry.using(graph):
+            if hasattr(graph, "astream"):
+                events = graph.astream(state_in, config=config)
+            else:
+                async def _once():
+                    res = await asyncio.to_thread(graph.invoke, state_in, config)
+                    yield {"type": "done", "text": res.get("last_text", ""),
+                           "tool_events": res.get("tool_events", [])}
+                events = _once()
+            async for ev in events:
+                if ev.get("type") == "done":
+                    try:
+                        t_log = time.monotonic()
+                        _memory.record(sid, "assistant", ev.get("text", ""))
+                        safe_log_message(session_id=sid, role="assistant", content=ev.get("text", ""))
+                        _log_route(sid, ev.get("route"))
+                        _log_tool_events(sid, ev.get("tool_events"))
+                        _log_trace(sid, ev.get("spans"), "stream", time.monotonic() - t_log)
+                    except Exception:
+                        pass
+                yield ev
 
-        # Fallback: no streaming available, call graph.invoke once and return final message
-        try:
-            graph = get_graph()
-            res = graph.invoke({"session_id": sid, "messages": [{"role": "user", "content": ""}]})
-            final_text = res.get("last_text", "")
-            payload = {"type": "done", "text": final_text}
-            # log best-effort
-            try:
-                safe_log_message(session_id=sid, role="assistant", content=final_text)
-            except Exception:
-                pass
-            yield f"data: {json.dumps(payload)}\n\n"
-            return
-        except Exception:
-            # Last-resort simulated ticks
-            for i in range(3):
-                payload = {"type": "tick", "text": f"thinking {i+1}/3"}
-                yield f"data: {json.dumps(payload)}\n\n"
-                await asyncio.sleep(0.2)
-            yield f"data: {json.dumps({"type": "done", "text": ""})}\n\n"
-
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    async def event_generator():
+        # closing this generator (client gone) unsubscribes; the run is
+        # cancelled once no request follows it any more
+        async with session_lanes.follow(sid, message, produce) as queue:
+            while True:
+                try:
+                    ev = await asyncio.wait_for(queue.get(), timeout=_STREAM_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if ev is None:
+                    break
+                kind = ev.get("type")
+                if kind == "token":
+                    yield _sse("chunk", {"text": ev.get("text", ""), "session_id": sid})
+                elif kind in ("tool_start", "tool_end"):
+                    yield _sse(kind, dict(ev, session_id=sid))
+                elif kind == "done":
+                    yield _sse("done", {"text": ev.get("text", ""), "session_id": sid})
+                elif kind == "error":
+                    yield _sse("error", {"detail": ev.get("detail", ""), "session_id": sid})
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
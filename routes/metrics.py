@@ -0,0 +1,156 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, Request
+from vme_lib import supabase_client as _sbmod
+from vme_lib import settings_sync as _settings_sync
+from vme_lib import history_cache as _history
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("")
+def metrics():
+    """In-process counters for the background subsystems (no secrets)."""
+    out = {"ok": True}
+    try:
+        out["log_writer"] = _sbmod.log_writer_stats()
+    except Exception as e:
+        out["log_writer"] = {"error": str(e)[:200]}
+    try:
+        out["history_cache"] = _history.stats()
+    except Exception as e:
+        out["history_cache"] = {"error": str(e)[:200]}
+    try:
+        from graph import memory as _memory
+        out["agent_memory"] = _memory.stats()
+    except Exception as e:
+        out["agent_memory"] = {"error": str(e)[:200]}
+    try:
+        from graph import response_cache as _rc
+        out["response_cache"] = _rc.stats()
+    except Exception as e:
+        out["response_cache"] = {"error": str(e)[:200]}
+    try:
+        from graph import registry as _graph_registry
+        out["graph"] = _graph_registry.stats()
+    except Exception as e:
+        out["graph"] = {"error": str(e)[:200]}
+    try:
+        from graph import model_router as _model_router
+        out["model_router"] = _model_router.stats()
+    except Exception as e:
+        out["model_router"] = {"error": str(e)[:200]}
+    try:
+        from tools import memo as _tool_memo
+        out["tool_memo"] = _tool_memo.stats()
+    except Exception as e:
+        out["tool_memo"] = {"error": str(e)[:200]}
+    try:
+        from routes.agent import chat_governor
+        out["agent_chat"] = chat_governor.stats()
+    except Exception as e:
+        out["agent_chat"] = {"error": str(e)[:200]}
+    try:
+        from routes.agent import session_lanes
+        out["agent_sessions"] = session_lanes.stats()
+    except Exception as e:
+        out["agent_sessions"] = {"error": str(e)[:200]}
+    try:
+        import ops_runner
+        out["ops_runner"] = ops_runner.stats()
+    except Exception as e:
+        out["ops_runner"] = {"error": str(e)[:200]}
+    try:
+        from routes.ops import task_bus, task_events
+        out["ops_events"] = task_bus.stats()
+        out["ops_events"]["fanout"] = task_events.stats()
+    except Exception as e:
+        out["ops_events"] = {"error": str(e)[:200]}
+    try:
+        out["settings"] = _sbmod.settings_stats()
+        out["settings"]["sync"] = _settings_sync.stats()
+    except Exception as e:
+        out["settings"] = {"error": str(e)[:200]}
+    return out
+
+
+@router.get("/log_writer")
+def log_writer():
+    """Write-behind logger: queue depth, drops and flush latency."""
+    return _sbmod.log_writer_stats()
+
+
+@router.get("/settings")
+def settings_cache():
+    """Settings snapshot: hits, stale hits, loads and snapshot age."""
+    out = _sbmod.settings_stats()
+    out["sync"] = _settings_sync.stats()
+    return out
+
+
+@router.get("/history_cache")
+def history_cache():
+    """Recent-history cache: hit rate, fills, write-through appends, size."""
+    return _history.stats()
+
+
+@router.get("/agent_chat")
+def agent_chat():
+    """Chat concurrency governor: in-flight, waiting, queue wait times, rejections."""
+    from routes.agent import chat_governor
+    return chat_governor.stats()
+
+
+@router.get("/agent_sessions")
+def agent_sessions():
+    """Per-session turn ordering: sessions with a turn running, queued turns, coalesced duplicates."""
+    from routes.agent import session_lanes
+    return session_lanes.stats()
+
+
+@router.get("/response_cache")
+def response_cache():
+    """Agent reply cache: hits, misses, stores, skipped mutating turns, latency saved."""
+    from graph import response_cache as _rc
+    return _rc.stats()
+
+
+@router.get("/graph")
+def graph_registry():
+    """Agent graph versions: current, draining (requests still in flight), builds and swaps."""
+    from graph import registry as _graph_registry
+    return _graph_registry.stats()
+
+
+@router.get("/tool_memo")
+def tool_memo():
+    """Read-only tool memoization: hits, misses, bytes of I/O saved, invalidations."""
+    from tools import memo as _tool_memo
+    return _tool_memo.stats()
+
+
+@router.get("/spans")
+def spans(request: Request, kind: Optional[str] = None, session_id: Optional[str] = None,
+          limit: int = 10, x_admin_token: Optional[str] = Header(None)):
+    """Agent timing percentiles per endpoint (`run`, `log`), model call (`llm`) and tool. Admin only.
+
+    With `session_id`, also returns that session's most recent persisted
+    traces (expanded from the compact `trace` tool events).
+    """
+    from routes.admin_seed import admin_denied
+    from graph import spans as _spans
+    denied = admin_denied(request, x_admin_token)
+    if denied is not None:
+        return denied
+    out = {"ok": True, "stats": _spans.stats(kind)}
+    if session_id:
+        traces = []
+        try:
+            for evt in _sbmod.select_tool_events(session_id=session_id, limit=max(1, min(limit, 50)), tool_name="trace") or []:
+                if isinstance(evt.get("output_json"), dict):
+                    traces.append({"created_at": evt.get("created_at"), "summary": evt.get("input_json"),
+                                   "spans": _spans.expand(evt["output_json"])})
+        except Exception:
+            pass
+        out["traces"] = traces
+    return out
@@ -3,9 +3,12 @@ from fastapi.responses import StreamingResponse, JSONResponse
 from typing import Optional, Dict, Any
 import hmac, hashlib, base64, secrets
 from datetime import datetime, timedelta
-import os, json, threading, time
+import asyncio, itertools, os, json, threading, time
 from collections import deque
 from vme_lib import supabase_client as _sbmod
+from vme_lib import supabase_async as _asb
+from vme_lib.event_bus import EventBus
+from vme_lib import event_fanout as _fanout
 
 router = APIRouter(prefix="/ops", tags=["ops"])
 
@@ -14,17 +17,28 @@ _tasks_store: Dict[int, Dict[str, Any]] = {}
 _task_events: Dict[int, deque] = {}
 _task_lock = threading.Lock()
 _next_inproc_id = 1
+_event_ids = itertools.count(1)  # in-proc event ids, increasing like va_task_events.id
+
+# Live task events: stored first, then published to the streams watching the task,
+# on this replica directly and on the others through the fan-out transport
+task_bus = EventBus('ops_tasks', buffer=int(os.getenv('OPS_BUS_BUFFER', '256')))
+task_events = _fanout.Fanout(task_bus, _fanout.make_transport())
+
+# SSE stream: idle keepalive (and storage catch-up) interval, and the kinds that end a stream
+_STREAM_HEARTBEAT_S = float(os.getenv('OPS_STREAM_HEARTBEAT_S', '15'))
+_STREAM_BATCH = 500
+_TERMINAL_KINDS = ('done', 'error')
 
 # Admin gating helper
-def _is_admin(request: Request, x_admin_token: Optional[str]):
+async def _is_admin(request: Request, x_admin_token: Optional[str]):
     allowed = set()
     try:
-        t = os.getenv('SETTINGS_ADMIN_TOKEN') or _sbmod.settings_get('SETTINGS_ADMIN_TOKEN')
+        t = os.getenv('SETTINGS_ADMIN_TOKEN') or await _asb.settings_get('SETTINGS_ADMIN_TOKEN')
         if t: allowed.add(t)
     except Exception:
         pass
     try:
-        t2 = os.getenv('CI_SETTINGS_ADMIN_TOKEN') or _sbmod.settings_get('CI_SETTINGS_ADMIN_TOKEN')
+        t2 = os.getenv('CI_SETTINGS_ADMIN_TOKEN') or await _asb.settings_get('CI_SETTINGS_ADMIN_TOKEN')
         if t2: allowed.add(t2)
     except Exception:
         pass
@@ -44,18 +58,18 @@ def _is_admin(request: Request, x_admin_token: Optional[str]):
     return host in ("127.0.0.1", "::1", "localhost", None)
 
 
-def _persist_task(title: str, body: Optional[str]) -> int:
+async def _persist_task(title: str, body: Optional[str]) -> int:
     """Try to persist task to Supabase, otherwise allocate in-proc id and store."""
     try:
-        sb = _sbmod._client()
+        tid = await _asb.insert_task(title, body)
+        if tid is not None:
+            return int(tid)
     except Exception:
-        sb = None
-    if sb:
-        try:
-            res = sb.table('va_tasks').insert({'title': title, 'body': body}).execute()
-            return int(res.data[0]['id'])
-        except Exception:
-            pass
+        pass
+    return _inproc_task(title, body)
+
+
+def _inproc_task(title: str, body: Optional[str]) -> int:
     global _next_inproc_id
     with _task_lock:
         tid = _next_inproc_id
@@ -72,19 +86,83 @@ def _append_event(task_id: int, kind: str, data: dict):
     except Exception:
         sb = None
     if sb:
-        try:
-            sb.table('va_task_events').insert({'task_id': int(task_id), 'kind': kind, 'data': data}).execute()
-        except Exception:
-            pass
+        ev = _sbmod.insert_task_event(task_id, kind, data)
     else:
+        ev = _append_inproc_event(task_id, kind, data)
+    _publish(task_id, ev, kind, data)
+
+
+async def _aappend_event(task_id: int, kind: str, data: dict):
+    """Awaitable `_append_event` for use inside async handlers."""
+    try:
+        sb = _sbmod._client()
+    except Exception:
+        sb = None
+    if sb:
+        ev = await _asb.insert_task_event(task_id, kind, data)
+    else:
+        ev = _append_inproc_event(task_id, kind, data)
+    _publish(task_id, ev, kind, data)
+
+
+def _publish(task_id: int, ev: Optional[dict], kind: str, data: dict):
+    # the stored row carries the id streams use as their cursor; without one it is sent as is
+    if not isinstance(ev, dict):
+        ev = {'task_id': task_id, 'created_at': time.time(), 'kind': kind, 'data': data}
+    try:
+        task_events.publish(int(task_id), ev)
+    except Exception:
+        pass
+
+
+def _append_inproc_event(task_id: int, kind: str, data: dict) -> dict:
+    with _task_lock:
         dq = _task_events.get(task_id)
         if dq is None:
             dq = deque()
             _task_events[task_id] = dq
-        dq.append({'created_at': time.time(), 'kind': kind, 'data': data})
+        ev = {'id': next(_event_ids), 'task_id': task_id, 'created_at': time.time(), 'kind': kind, 'data': data}
+        dq.append(ev)
         # bound it
         while len(dq) > 200:
             dq.popleft()
+        return ev
+
+
+def _inproc_events_after(task_id: int, cursor: int) -> list:
+    with _task_lock:
+        dq = _task_events.get(task_id)
+        if not dq:
+            return []
+        out = list(itertools.takewhile(lambda ev: ev['id'] > cursor, reversed(dq)))
+    out.reverse()
+    return out
+
+
+async def _events_after(task_id: int, cursor: int) -> list:
+    """Events with id > cursor, oldest first (at most _STREAM_BATCH from the store)."""
+    try:
+        sb = _sbmod._client()
+    except Exception:
+        sb = None
+    if sb:
+        return await _asb.select_task_events(task_id, after_id=cursor, limit=_STREAM_BATCH)
+    return _inproc_events_after(task_id, cursor)
+
+
+def _stream_cursor(request: Request) -> int:
+    """Resume point: the Last-Event-ID header (sent by EventSource on reconnect) or ?last_event_id=."""
+    raw = request.headers.get('last-event-id') or request.query_params.get('last_event_id')
+    try:
+        return max(0, int(raw))
+    except Exception:
+        return 0
+
+
+def _sse(ev: dict, event_id: Optional[int] = None) -> str:
+    eid = ev.get('id') if event_id is None else event_id
+    head = f"id: {eid}\n" if eid is not None else ''
+    return f"{head}data: {json.dumps(ev, default=str)}\n\n"
 
 
 # --- SSE token helpers -------------------------------------------------
@@ -145,13 +223,13 @@ def _validate_token(token: str) -> Optional[dict]:
 
 @router.post('/tasks')
 async def create_task(request: Request, payload: Dict[str, Any], x_admin_token: Optional[str] = Header(None)):
-    if not _is_admin(request, x_admin_token):
+    if not await _is_admin(request, x_admin_token):
         return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
     title = payload.get('title')
     body = payload.get('body')
     if not title:
         raise HTTPException(400, 'title required')
-    tid = _persist_task(title, body)
+    tid = await _persist_task(title, body)
     # enqueue for local runner (if present)
     try:
         from ops_runner import enqueue_task
@@ -161,11 +239,35 @@ async def create_task(request: Request, payload: Dict[str, Any], x_admin_token:
     return {'id': tid}
 
 
+@router.get('/workers')
+async def get_workers(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Ops runner pool: queue depth, and per worker its state, queue wait and run times."""
+    if not await _is_admin(request, x_admin_token):
+        return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
+    import ops_runner
+    return ops_runner.stats()
+
+
+@router.post('/workers')
+async def set_workers(request: Request, payload: Dict[str, Any] = Body(...), x_admin_token: Optional[str] = Header(None)):
+    """Resize the Ops runner pool at runtime: {"count": n}. Removed workers finish their current task first."""
+    if not await _is_admin(request, x_admin_token):
+        return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
+    try:
+        count = int(payload.get('count'))
+    except Exception:
+        raise HTTPException(400, 'count required')
+    if not 0 <= count <= 64:
+        raise HTTPException(400, 'count must be between 0 and 64')
+    import ops_runner
+    return {'ok': True, 'count': ops_runner.resize(count)}
+
+
 @router.post('/stream_tokens')
 async def create_stream_token(request: Request, payload: Dict[str, Any] = Body(...), x_admin_token: Optional[str] = Header(None)):
     """Admin-gated: issue a short-lived token for a given task_id used for SSE streams."""
     # allow in dev local mode for easier testing
-    if not _is_admin(request, x_admin_token) and os.getenv('DEV_LOCAL_LLM', '').lower() not in ('1', 'true', 'yes'):
+    if not await _is_admin(request, x_admin_token) and os.getenv('DEV_LOCAL_LLM', '').lower() not in ('1', 'true', 'yes'):
         return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
     try:
         task_id = int(payload.get('task_id'))
@@ -181,7 +283,7 @@ async def get_stream_token(request: Request, task_id: Optional[int] = None, x_ad
     This mirrors `create_stream_token` but uses query param. Allowed in DEV_LOCAL_LLM for local testing.
     """
     # allow in dev local mode for easier testing
-    if not _is_admin(request, x_admin_token) and os.getenv('DEV_LOCAL_LLM', '').lower() not in ('1', 'true', 'yes'):
+    if not await _is_admin(request, x_admin_token) and os.getenv('DEV_LOCAL_LLM', '').lower() not in ('1', 'true', 'yes'):
         return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
     try:
         tid = int(task_id)
@@ -194,18 +296,11 @@ async def get_stream_token(request: Request, task_id: Optional[int] = None, x_ad
 @router.get('/tasks')
 async def list_tasks(limit: int = 20, x_admin_token: Optional[str] = Header(None), request: Request = None):
     # admin-gated read; allow in DEV_LOCAL_LLM for local/testing
-    if not _is_admin(request, x_admin_token) and os.getenv('DEV_LOCAL_LLM', '').lower() not in ('1', 'true', 'yes'):
+    if not await _is_admin(request, x_admin_token) and os.getenv('DEV_LOCAL_LLM', '').lower() not in ('1', 'true', 'yes'):
         return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
-    try:
-        sb = _sbmod._client()
-    except Exception:
-        sb = None
-    if sb:
-        try:
-            res = sb.table('va_tasks').select('*').order('created_at', desc=True).limit(limit).execute()
-            return res.data or []
-        except Exception:
-            pass
+    rows = await _asb.list_tasks(limit)
+    if rows is not None:
+        return rows
     # fallback to in-proc
     items = sorted((_tasks_store or {}).values(), key=lambda x: x.get('created_at', 0), reverse=True)[:limit]
     return items
@@ -213,40 +308,23 @@ async def list_tasks(limit: int = 20, x_admin_token: Optional[str] = Header(None
 
 @router.get('/tasks/{task_id}')
 async def get_task(task_id: int, x_admin_token: Optional[str] = Header(None), request: Request = None):
-    if not _is_admin(request, x_admin_token):
+    if not await _is_admin(request, x_admin_token):
         return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
-    try:
-        sb = _sbmod._client()
-    except Exception:
-        sb = None
-    if sb:
-        try:
-            res = sb.table('va_tasks').select('*').eq('id', int(task_id)).limit(1).execute()
-            rows = res.data or []
-            if rows:
-                return rows[0]
-        except Exception:
-            pass
+    row = await _asb.get_task(task_id)
+    if row:
+        return row
     return _tasks_store.get(task_id) or {'id': task_id, 'status': 'unknown'}
 
 
 @router.post('/tasks/{task_id}/cancel')
 async def cancel_task(task_id: int, x_admin_token: Optional[str] = Header(None), request: Request = None):
-    if not _is_admin(request, x_admin_token):
+    if not await _is_admin(request, x_admin_token):
         return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
     # mark cancelled
-    try:
-        sb = _sbmod._client()
-    except Exception:
-        sb = None
-    if sb:
-        try:
-            sb.table('va_tasks').update({'status': 'cancelled'}).eq('id', int(task_id)).execute()
-        except Exception:
-            pass
+    await _asb.update_task_status(task_id, 'cancelled')
     if task_id in _tasks_store:
         _tasks_store[task_id]['status'] = 'cancelled'
-    _append_event(task_id, 'log', {'msg': 'cancelled'})
+    await _aappend_event(task_id, 'log', {'msg': 'cancelled'})
     return {'ok': True}
 
 
@@ -265,48 +343,69 @@ async def task_stream(request: Request, task_id: int, x_admin_token: Optional[st
         if int(payload.get('task_id', -1)) != int(task_id):
             return JSONResponse({'ok': False, 'error': 'token task_id mismatch'}, status_code=403)
     else:
-        if not _is_admin(request, x_admin_token):
+        if not await _is_admin(request, x_admin_token):
             return JSONResponse({'ok': False, 'error': 'admin token required'}, status_code=403)
 
-    # simple SSE generator subscribing to in-proc events or querying Supabase every second
+    # SSE: each event carries its id and a reconnect resumes after Last-Event-ID.
+    # Events already stored are read once from the cursor on; after that they
+    # arrive from task_bus as they are published, with no polling.
     async def gen():
+        cursor = _stream_cursor(request)
         # If DEV_LOCAL_LLM fake mode, emit deterministic ticks then done
         if os.getenv('DEV_LOCAL_LLM', '').lower() in ('1', 'true', 'yes'):
-            for i in range(4):
+            for i in range(cursor, 4):
                 payload = {'kind': 'tick', 'seq': i+1, 'msg': f'tick {i+1}'}
-                yield f"data: {json.dumps(payload)}\n\n"
-                await __import__('asyncio').sleep(0.1)
-            payload = {'kind': 'done'}
-            yield f"data: {json.dumps(payload)}\n\n"
+                yield _sse(payload, i + 1)
+                await asyncio.sleep(0.1)
+            if cursor < 5:
+                yield _sse({'kind': 'done'}, 5)
             return
 
-        last_idx = 0
-        # first, if in-proc buffer exists, yield anything present
-        dq = _task_events.get(task_id)
-        if dq:
-            for ev in list(dq):
-                yield f"data: {json.dumps(ev)}\n\n"
-        # then poll Supabase for new events
-        while True:
-            if await request.is_disconnected():
-                return
+        def fresh(ev) -> bool:
+            nonlocal cursor
             try:
-                sb = _sbmod._client()
+                eid = int(ev.get('id'))
             except Exception:
-                sb = None
-            if sb:
-                try:
-                    res = sb.table('va_task_events').select('*').eq('task_id', int(task_id)).order('id', asc=True).execute()
-                    rows = res.data or []
-                    for r in rows:
-                        yield f"data: {json.dumps(r)}\n\n"
-                except Exception:
-                    pass
-            else:
-                dq = _task_events.get(task_id)
-                if dq:
-                    for ev in list(dq):
-                        yield f"data: {json.dumps(ev)}\n\n"
-            await __import__('asyncio').sleep(0.5)
+                return True  # no id (the store didn't return the row): can't be a duplicate we know of
+            if eid <= cursor:
+                return False
+            cursor = eid
+            return True
+
+        # subscribe before reading storage so nothing published in between is missed;
+        # anything seen both ways is dropped by id
+        with task_bus.subscribe(int(task_id)) as sub:
+            catch_up = True
+            missed = task_events.missed()
+            while True:
+                if catch_up or sub.overflowed:
+                    # backfill on connect and after falling behind; also on idle
+                    # ticks when other replicas' events may not reach this bus
+                    sub.overflowed = False
+                    while True:
+                        rows = await _events_after(task_id, cursor)
+                        for ev in rows:
+                            if fresh(ev):
+                                yield _sse(ev)
+                                if ev.get('kind') in _TERMINAL_KINDS:
+                                    return
+                        if len(rows) < _STREAM_BATCH:
+                            break
+                    catch_up = False
+                ev = await sub.get(timeout=_STREAM_HEARTBEAT_S)
+                if ev is None:
+                    if sub.overflowed:
+                        continue
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    now_missed = task_events.missed()
+                    if not task_events.running() or now_missed != missed:
+                        missed, catch_up = now_missed, True
+                    continue
+                if fresh(ev):
+                    yield _sse(ev)
+                    if ev.get('kind') in _TERMINAL_KINDS:
+                        return
 
     return StreamingResponse(gen(), media_type='text/event-stream')
\ No newline at end of file
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import List, Dict, Optional
 import time
 from vme_lib import supabase_client as _sb
+from vme_lib import pagination as _pg
+from vme_lib import history_cache as _history
 
 router = APIRouter(prefix="/api/threads", tags=["threads"])
 
@@ -25,40 +27,60 @@ def update_title(id: int, title: str):
         return {"ok": False, "id": str(id), "title": title}
 
 
+def _cursors(before: Optional[str], after: Optional[str]):
+    try:
+        return _pg.decode_cursor(before), _pg.decode_cursor(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("")
-def recent_threads(limit: int = Query(20, ge=1, le=200)):
-    """Return recent named threads (label not null/empty) ordered by created_at desc."""
+def recent_threads(limit: int = Query(20, ge=1, le=200), before: Optional[str] = None, after: Optional[str] = None):
+    """Return recent named threads (label not null/empty), newest first,
+    with their maintained message_count / last_message_at.
+
+    `next_cursor` (pass as `before`) pages to older threads, `prev_cursor`
+    (pass as `after`) to newer ones.
+    """
+    b, a = _cursors(before, after)
     sb = _sb._client()
     if not sb:
-        return {"items": []}
+        return {"items": [], "next_cursor": None, "prev_cursor": None}
+    def page_for(cols: str):
+        q = (sb.table("va_sessions")
+             .select(cols)
+             .not_("label", "is", None)
+             .neq("label", ""))
+        return _pg.fetch_page(q, limit, before=b, after=a)
     try:
-        res = (sb.table("va_sessions")
-               .select("id,label,created_at")
-               .not_("label", "is", None)
-               .neq("label", "")
-               .order("created_at", desc=True)
-               .limit(limit)
-               .execute())
-        rows = res.data or []
-        items = [{"id": str(r.get("id")), "title": r.get("label"), "created_at": r.get("created_at")} for r in rows]
-        return {"items": items}
+        try:
+            page = page_for("id,label,created_at,message_count,last_message_at")
+        except Exception:
+            # counters not migrated yet
+            page = page_for("id,label,created_at")
+        items = [{"id": str(r.get("id")), "title": r.get("label"), "created_at": r.get("created_at"),
+                  "message_count": r.get("message_count"), "last_message_at": r.get("last_message_at")}
+                 for r in page["rows"]]
+        return {"items": items, "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
     except Exception:
-        return {"items": []}
+        return {"items": [], "next_cursor": None, "prev_cursor": None}
 
 
 @router.get("/{id}/messages")
-def thread_messages(id: int, limit: int = Query(200, ge=1, le=5000)):
+def thread_messages(id: int, limit: int = Query(200, ge=1, le=5000), before: Optional[str] = None, after: Optional[str] = None):
+    """Return the latest `limit` messages of a thread in chronological order.
+
+    Scroll back with `before=next_cursor`; fetch newer messages with
+    `after=prev_cursor` (or the cursor of the newest message held).
+    """
+    b, a = _cursors(before, after)
     sb = _sb._client()
     if not sb:
-        return {"items": []}
+        return {"items": [], "next_cursor": None, "prev_cursor": None}
     try:
-        res = (sb.table("va_messages")
-               .select("id,role,content,created_at")
-               .eq("session_id", int(id))
-               .order("created_at", desc=False)
-               .limit(limit)
-               .execute())
-        rows = res.data or []
+        page = _history.history_page(sb, int(id), limit, before=b, after=a)
+        rows = page["rows"]
+        rows.reverse()
         items = []
         for r in rows:
             items.append({
@@ -67,6 +89,6 @@ def thread_messages(id: int, limit: int = Query(200, ge=1, le=5000)):
                 "content": r.get("content"),
                 "created_at": r.get("created_at"),
             })
-        return {"items": items}
+        return {"items": items, "next_cursor": page["next_cursor"], "prev_cursor": page["prev_cursor"]}
     except Exception:
-        return {"items": []}
+        return {"items": [], "next_cursor": None, "prev_cursor": None}
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from graph import memory as memmod
+from graph import spans as spansmod
+from main import app
+
+
+def test_trace_compact_roundtrip_and_percentiles():
+    t = spansmod.Trace()
+    with t.span("tool", "ls", bytes_in=3):
+        pass
+    t.start("k", "tool", "git_diff")  # never ends, e.g. timed out
+    spans = t.finish("gpt-4o-mini")
+    assert [(s["kind"], s["name"]) for s in spans] == [("tool", "ls"), ("tool", "git_diff"), ("run", "gpt-4o-mini")]
+    assert spans[1]["error"] == "unfinished"
+    assert spansmod.expand(spansmod.compact(spans)) == spans
+
+    st = spansmod.SpanStats(window=100)
+    st.observe([{"kind": "tool", "name": "ls", "ms": float(i)} for i in range(1, 101)])
+    ls = st.stats("tool")["tool"]["ls"]
+    assert ls["count"] == 100 and ls["p50_ms"] == 51.0 and ls["p95_ms"] == 96.0 and ls["max_ms"] == 100.0
+
+
+def _agent():
+    fake = pytest.importorskip("langchain_core.language_models.fake_chat_models")
+    prebuilt = pytest.importorskip("langgraph.prebuilt")
+    from langchain_core.messages import AIMessage
+    from langchain_core.tools import tool
+
+    class ToolFake(fake.GenericFakeChatModel):
+        def bind_tools(self, tools, **kw):
+            return self
+
+    @tool("ls")
+    def ls(path: str) -> str:
+        """List."""
+        return "a.py\nb.py"
+
+    llm = ToolFake(disable_streaming=True, messages=iter([
+        AIMessage(content="", tool_calls=[{"name": "ls", "args": {"path": "."}, "id": "c1", "type": "tool_call"}]),
+        AIMessage(content="two files"),
+    ]))
+    return prebuilt.create_react_agent(llm, [ls])
+
+
+@pytest.mark.parametrize("mode", ["invoke", "ainvoke"])
+def test_wrapper_attaches_llm_tool_and_run_spans(monkeypatch, mode):
+    from graph.va_graph import _Wrapper
+
+    monkeypatch.setattr(spansmod, "span_stats", spansmod.SpanStats())
+    w = _Wrapper.__new__(_Wrapper)
+    w._graph = _agent()
+    state = {"session_id": "1", "messages": [{"role": "user", "content": "what's here?"}]}
+    res = w.invoke(state) if mode == "invoke" else asyncio.run(w.ainvoke(state))
+    assert res["last_text"] == "two files"
+    kinds = [(s["kind"], s["name"]) for s in res["spans"]]
+    assert kinds[-1] == ("run", "agent") and res["spans"][-1]["model"] == "agent"
+    assert [k for k in kinds if k[0] == "tool"] == [("tool", "ls")]
+    assert len([k for k in kinds if k[0] == "llm"]) == 2
+    tool_span = next(s for s in res["spans"] if s["kind"] == "tool")
+    assert tool_span["bytes_out"] == len("a.py\nb.py")
+    assert res["spans"][-1]["ms"] >= max(s["start_ms"] + s["ms"] for s in res["spans"][:-1]) - 1
+    assert spansmod.stats("tool")["tool"]["ls"]["count"] == 1
+
+
+def test_chat_persists_compact_trace_and_admin_endpoint(monkeypatch):
+    import routes.agent as agent_mod
+    from vme_lib import supabase_client as sbmod
+
+    logged = []
+
+    class FakeGraph:
+        async def ainvoke(self, state_in, config=None):
+            assert state_in["endpoint"] == "chat"
+            return {"last_text": "ok", "tool_events": [],
+                    "spans": [{"kind": "llm", "name": "m", "start_ms": 0.0, "ms": 5.0, "tokens_in": 3},
+                              {"kind": "run", "name": "chat", "start_ms": 0.0, "ms": 6.0, "model": "m"}]}
+
+    monkeypatch.delenv("DEV_LOCAL_LLM", raising=False)
+    monkeypatch.setenv("SETTINGS_ADMIN_TOKEN", "adm")
+    monkeypatch.setattr(spansmod, "span_stats", spansmod.SpanStats())
+    monkeypatch.setattr(agent_mod, "get_graph", lambda: FakeGraph())
+    monkeypatch.setattr(agent_mod, "safe_log_message", lambda **kw: None)
+    monkeypatch.setattr(agent_mod, "safe_log_tool_event", lambda **kw: logged.append(kw))
+    monkeypatch.setattr(memmod, "memory", memmod.ConversationMemory(loader=lambda sid, n: []))
+
+    c = TestClient(app)
+    assert c.post("/agent/chat", json={"message": "hi", "session_id": "5"}).status_code == 200
+    trace = next(kw for kw in logged if kw["tool_name"] == "trace")
+    assert trace["input_json"] == {"endpoint": "chat", "model": "m", "total_ms": 6.0}
+    spans = spansmod.expand(trace["output_json"])
+    assert [s["kind"] for s in spans] == ["llm", "run", "log"]
+    assert spans[0]["tokens_in"] == 3 and spans[1]["model"] == "m"
+
+    assert c.get("/api/metrics/spans").status_code == 403
+    monkeypatch.setattr(sbmod, "select_tool_events",
+                        lambda session_id, limit=10, tool_name=None: [{"tool_name": tool_name, "created_at": "t",
+                                                                       "input_json": trace["input_json"],
+                                                                       "output_json": trace["output_json"]}])
+    r = c.get("/api/metrics/spans", params={"session_id": "5"}, headers={"X-Admin-Token": "adm"})
+    body = r.json()
+    assert body["stats"]["log"]["chat"]["count"] == 1
+    assert body["traces"][0]["spans"] == spans
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from graph import memory as memmod
+from main import app
+
+
+def _events(body: str):
+    out = []
+    for block in body.split("\n\n"):
+        lines = [l for l in block.splitlines() if not l.startswith(":")]
+        if not lines:
+            continue
+        name = lines[0].split(": ", 1)[1]
+        data = json.loads(lines[1].split(": ", 1)[1])
+        out.append((name, data))
+    return out
+
+
+def test_stream_runs_graph_once_and_emits_named_events(monkeypatch):
+    import routes.agent as agent_mod
+    runs, logged, tools = [], [], []
+
+    class FakeGraph:
+        def invoke(self, *a, **k):
+            raise AssertionError("stream must not call invoke")
+
+        async def astream(self, state_in, config=None):
+            runs.append(state_in["messages"][-1]["content"])
+            yield {"type": "token", "text": "Hel"}
+            yield {"type": "tool_start", "name": "ls", "input": {"path": "."}, "id": "r1"}
+            yield {"type": "tool_end", "name": "ls", "output": "a.py", "id": "r1"}
+            yield {"type": "token", "text": "lo"}
+            yield {"type": "done", "text": "Hello", "tool_events": [{"tool_name": "ls", "input_json": {"path": "."}, "output_json": "a.py"}]}
+
+    monkeypatch.delenv("DEV_LOCAL_LLM", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(agent_mod, "get_graph", lambda: FakeGraph())
+    monkeypatch.setattr(agent_mod, "safe_log_message", lambda session_id, role, content: logged.append((role, content)))
+    monkeypatch.setattr(agent_mod, "safe_log_tool_event", lambda **kw: tools.append(kw["tool_name"]))
+    monkeypatch.setattr(memmod, "memory", memmod.ConversationMemory(loader=lambda sid, n: []))
+
+    c = TestClient(app)
+    r = c.get("/agent/stream", params={"session_id": "7", "message": "hi there"})
+    assert r.status_code == 200
+    evs = _events(r.text)
+    assert [n for n, _ in evs] == ["chunk", "tool_start", "tool_end", "chunk", "done"]
+    assert "".join(d["text"] for n, d in evs if n == "chunk") == "Hello"
+    assert evs[-1][1] == {"type": "done", "text": "Hello", "session_id": "7"}
+    assert runs == ["hi there"]
+    assert logged == [("user", "hi there"), ("assistant", "Hello")]
+    assert tools == ["ls"]
+
+
+def test_stream_requires_message_outside_fake_mode(monkeypatch):
+    monkeypatch.delenv("DEV_LOCAL_LLM", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    r = TestClient(app).get("/agent/stream", params={"session_id": "7"})
+    assert r.status_code == 400
+
+
+def test_stream_fake_mode_uses_named_tick_events(monkeypatch):
+    monkeypatch.setenv("DEV_LOCAL_LLM", "1")
+    r = TestClient(app).get("/agent/stream", params={"session_id": "9", "message": "x"})
+    evs = _events(r.text)
+    assert [n for n, _ in evs] == ["tick"] * 4 + ["done"]
+    assert evs[-1][1]["session_id"] == "9"
+
+
+def test_wrapper_astream_yields_tokens_and_final_from_one_run():
+    fake = pytest.importorskip("langchain_core.language_models.fake_chat_models")
+    prebuilt = pytest.importorskip("langgraph.prebuilt")
+    from langchain_core.messages import AIMessage
+    from graph.va_graph import _Wrapper
+
+    w = _Wrapper.__new__(_Wrapper)
+    w._graph = prebuilt.create_react_agent(fake.GenericFakeChatModel(messages=iter([AIMessage(content="hello there")])), [])
+
+    async def collect():
+        return [ev async for ev in w.astream({"session_id": "1", "messages": [{"role": "user", "content": "hi"}]})]
+
+    evs = asyncio.run(collect())
+    assert "".join(e["text"] for e in evs if e["type"] == "token") == "hello there"
+    assert evs[-1]["type"] == "done" and evs[-1]["text"] == "hello there" and evs[-1]["tool_events"] == []
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from vme_lib.governor import Governor, Overloaded
+
+
+def test_governor_queues_then_times_out():
+    async def main():
+        g = Governor("t", limit=1, max_wait=0.05, max_queue=4)
+        order = []
+
+        async def job(i, hold):
+            async with g.slot():
+                order.append(i)
+                await asyncio.sleep(hold)
+
+        first = asyncio.create_task(job(1, 0.02))
+        await asyncio.sleep(0)
+        await job(2, 0)  # waits for the first slot, then runs
+        await first
+        assert order == [1, 2]
+
+        blocker = asyncio.create_task(job(3, 0.2))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as ei:
+            await job(4, 0)
+        assert ei.value.retry_after >= 1
+        await blocker
+        st = g.stats()
+        assert st["admitted"] == 3 and st["rejected_timeout"] == 1
+        assert st["in_flight"] == 0 and st["waiting"] == 0
+        assert st["wait_ms_max"] > 0
+
+    asyncio.run(main())
+
+
+def test_governor_rejects_when_queue_full():
+    async def main():
+        g = Governor("t", limit=1, max_wait=1, max_queue=0)
+        await g.acquire()
+        with pytest.raises(Overloaded):
+            await g.acquire()
+        g.release()
+        assert g.stats()["rejected_full"] == 1
+
+    asyncio.run(main())
+
+
+def test_chat_returns_503_with_retry_after_when_saturated(monkeypatch):
+    import routes.agent as agent_mod
+
+    class FakeGraph:
+        async def ainvoke(self, state_in, config=None):
+            return {"last_text": "ok", "tool_events": []}
+
+    monkeypatch.delenv("DEV_LOCAL_LLM", raising=False)
+    monkeypatch.setattr(agent_mod, "get_graph", lambda: FakeGraph())
+    logged = []
+    monkeypatch.setattr(agent_mod, "safe_log_message", lambda **kw: logged.append(kw["role"]))
+    gov = Governor("agent_chat", limit=1, max_wait=0.01, max_queue=0)
+    monkeypatch.setattr(agent_mod, "chat_governor", gov)
+
+    c = TestClient(app)
+    assert c.post("/agent/chat", json={"message": "hi", "session_id": "5"}).json()["text"] == "ok"
+
+    gov._in_flight = 1  # another request holds the only slot
+    r = c.post("/agent/chat", json={"message": "hi", "session_id": "5"})
+    assert r.status_code == 503
+    assert int(r.headers["Retry-After"]) >= 1
+    assert logged == ["user", "assistant"]  # the rejected turn left no user message behind
+    assert c.get("/api/metrics/agent_chat").json()["rejected_full"] == 1
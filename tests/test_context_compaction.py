@@ -0,0 +1,93 @@
+from graph import compaction as cmod
+from graph import memory as memmod
+
+
+def _turns(n, start=0):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"} for i in range(start, start + n)]
+
+
+def _compactor(calls, saved, loader=lambda sid: None):
+    def summarize(prev, turns, max_tokens, model=None):
+        calls.append((prev, [t["content"] for t in turns]))
+        return (prev + "|" if prev else "") + ",".join(t["content"] for t in turns)
+    return cmod.Compactor(keep_turns=4, batch=3, summarize=summarize, loader=loader,
+                          persist=lambda sid, st: saved.append(dict(st)), background=False)
+
+
+def test_folds_incrementally_and_reuses_summary():
+    calls, saved = [], []
+    c = _compactor(calls, saved)
+    turns = _turns(20)
+    summary, recent = c.context(1, turns)
+    assert recent == 4 and len(calls) == 1
+    assert calls[0] == ("", [f"turn {i}" for i in range(16)])
+
+    # same window: no new summary
+    assert c.context(1, turns) == (summary, 4)
+    # window moves but fewer than keep + batch turns are pending
+    turns += _turns(2, 20)
+    assert c.context(1, turns) == (summary, 6) and len(calls) == 1
+    # one more turn: only the newly out-of-window turns are folded
+    turns += _turns(1, 22)
+    summary2, recent = c.context(1, turns)
+    assert recent == 4
+    assert calls[1] == (summary, ["turn 16", "turn 17", "turn 18"])
+    assert saved[-1]["summary"] == summary2 and saved[-1]["folded"] == 19
+
+    # another process picks the persisted summary up instead of regenerating it
+    calls2 = []
+    c2 = _compactor(calls2, [], loader=lambda sid: saved[-1])
+    assert c2.context(1, turns[-10:]) == (summary2, 4)
+    assert calls2 == []
+
+
+def test_strip_outputs_drops_long_blocks_only():
+    short = "see ```\nx = 1\n```"
+    assert cmod.strip_outputs(short) == short
+    long = "output:\n```text\n" + "line\n" * 200 + "```\ndone"
+    assert cmod.strip_outputs(long) == "output:\n[201 lines of output omitted]\ndone"
+
+
+def test_build_messages_sends_summary_then_recent_turns(monkeypatch):
+    persisted = _turns(20)
+    persisted[14]["content"] = "```\n" + "x" * 500 + "\n```"
+    monkeypatch.setattr(memmod, "memory", memmod.ConversationMemory(loader=lambda sid, n: list(persisted)))
+    monkeypatch.setattr(cmod, "_ENABLED", True)
+    monkeypatch.setattr(cmod, "compactor", cmod.Compactor(keep_turns=6, batch=2, summarize=cmod.extract_summary,
+                                                          loader=lambda sid: None, persist=lambda sid, st: None,
+                                                          background=False))
+    msgs = memmod.build_messages(3, "next")
+    assert msgs[0]["role"] == "system" and msgs[0]["content"].startswith(cmod.PREFIX)
+    assert "User: turn 0" in msgs[0]["content"] and "turn 13" in msgs[0]["content"]
+    assert [m["content"] for m in msgs[2:-1]] == [f"turn {i}" for i in range(15, 20)]
+    assert msgs[1]["content"] == "[2 lines of output omitted]"
+    assert msgs[-1] == {"role": "user", "content": "next"}
+    assert memmod.stats()["compaction"]["folds"] == 1
+
+
+def test_repeated_turn_pair_does_not_move_the_boundary():
+    calls, saved = [], []
+    c = _compactor(calls, saved)
+    turns = _turns(20)
+    turns[14]["content"], turns[15]["content"] = "status?", "all green"
+    summary, recent = c.context(1, turns)
+    assert recent == 4 and calls[0][1][-2:] == ["status?", "all green"]
+
+    # the same question and answer again: turns 16..21 are still unsummarized
+    turns += [{"role": "user", "content": "status?"}, {"role": "assistant", "content": "all green"}]
+    assert c.context(1, turns) == (summary, 6)
+    # the capped list scrolled by 5: the in-process position follows it
+    assert c.context(1, turns[5:], offset=5) == (summary, 6)
+
+    # cold start from the persisted fingerprint: oldest match wins
+    c2 = _compactor([], [], loader=lambda sid: saved[-1])
+    assert c2.context(1, turns) == (summary, 6)
+
+
+def test_memory_snapshot_offset_counts_trimmed_turns():
+    m = memmod.ConversationMemory(max_messages=3, loader=lambda sid, n: [])
+    assert m.snapshot(1) == (0, [])
+    for i in range(5):
+        m.append(1, "user", f"t{i}")
+    offset, turns = m.snapshot(1)
+    assert offset == 2 and [t["content"] for t in turns] == ["t2", "t3", "t4"]
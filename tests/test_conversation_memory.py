@@ -0,0 +1,47 @@
+from fastapi.testclient import TestClient
+
+from graph import memory as memmod
+from main import app
+
+
+def test_window_trims_to_token_budget():
+    m = memmod.ConversationMemory(loader=lambda sid, n: [
+        {"role": "user", "content": "a" * 400},
+        {"role": "assistant", "content": "b" * 40},
+        {"role": "tool", "content": "ignored"},
+        {"role": "user", "content": "c" * 40},
+    ])
+    full = m.window(1, "hi", budget=10_000)
+    assert [t["content"][0] for t in full] == ["a", "b", "c"]
+    # a budget too small for the long first turn keeps only the newest turns
+    small = m.window(1, "hi", budget=memmod.count_tokens("b" * 40) + memmod.count_tokens("c" * 40) + 20)
+    assert [t["content"][0] for t in small] == ["b", "c"]
+    assert m.stats()["trimmed"] >= 1
+
+
+def test_chat_sends_prior_turns_and_seeds_after_restart(monkeypatch):
+    import routes.agent as agent_mod
+    seen = []
+
+    class FakeGraph:
+        def invoke(self, state_in, config=None):
+            seen.append([(t["role"], t["content"]) for t in state_in["messages"]])
+            return {"last_text": f"re:{state_in['messages'][-1]['content']}", "tool_events": []}
+
+    persisted = []
+    monkeypatch.delenv("DEV_LOCAL_LLM", raising=False)
+    monkeypatch.setattr(agent_mod, "get_graph", lambda: FakeGraph())
+    monkeypatch.setattr(agent_mod, "safe_log_message", lambda session_id, role, content: persisted.append({"role": role, "content": content}))
+    monkeypatch.setattr(memmod, "memory", memmod.ConversationMemory(loader=lambda sid, n: list(persisted)))
+
+    c = TestClient(app)
+    c.post("/agent/chat", json={"message": "one", "session_id": "41"})
+    c.post("/agent/chat", json={"message": "two", "session_id": "41"})
+    assert seen[0] == [("user", "one")]
+    assert seen[1] == [("user", "one"), ("assistant", "re:one"), ("user", "two")]
+
+    # a fresh process rebuilds the window from the persisted log
+    monkeypatch.setattr(memmod, "memory", memmod.ConversationMemory(loader=lambda sid, n: list(persisted)))
+    c.post("/agent/chat", json={"message": "three", "session_id": "41"})
+    assert seen[2][-3:] == [("user", "two"), ("assistant", "re:two"), ("user", "three")]
+    assert len(seen[2]) == 5
@@ -0,0 +1,46 @@
+import threading
+
+import graph.va_graph as vg
+from graph import registry as regmod
+
+
+def test_reload_swaps_in_background_and_drains_old_version(monkeypatch):
+    keys = iter([("echo", "m1", "1", "none", "noenv")] * 2 + [("echo", "m2", "1", "none", "noenv")] * 10)
+    monkeypatch.setattr(regmod, "config_key", lambda: next(keys))
+    gate = threading.Event()
+    builds = []
+
+    def fake_build():
+        builds.append(1)
+        if len(builds) == 2:
+            gate.wait(2)  # the second build is slow
+        return None
+
+    monkeypatch.setattr(vg, "_build_graph", fake_build)
+    reg = regmod.GraphRegistry()
+    w1 = reg.current()
+
+    # unchanged configuration: nothing to build
+    assert reg.reload(wait=True) is False
+
+    with reg.using(w1):
+        assert reg.reload() is True
+        # still building: requests keep getting the old version, without waiting
+        assert reg.current() is w1
+        gate.set()
+        reg._builder.join(2)
+        w2 = reg.current()
+        assert w2 is not w1
+        st = reg.stats()
+        assert st["current"]["model"] == "m2"
+        assert [d["version"] for d in st["draining"]] == [1] and st["draining"][0]["active"] == 1
+    st = reg.stats()
+    assert st["draining"] == [] and st["retired"] == 1 and st["swaps"] == 1
+
+
+def test_using_unknown_wrapper_is_a_no_op():
+    reg = regmod.GraphRegistry()
+    sentinel = object()
+    with reg.using(sentinel) as g:
+        assert g is sentinel
+    assert reg.stats()["current"] is None
@@ -0,0 +1,67 @@
+from fastapi.testclient import TestClient
+
+import vme_lib.supabase_client as sbmod
+from vme_lib import history_cache, sqlite_store
+from main import app
+
+
+class CountingStore(sqlite_store.SqliteStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.message_reads = 0
+
+    def table(self, name):
+        if name == "va_messages":
+            self.message_reads += 1
+        return super().table(name)
+
+
+def _setup(monkeypatch, tmp_path):
+    sb = CountingStore(str(tmp_path / "h.sqlite3"))
+    monkeypatch.setattr(sbmod, "_client", lambda: sb)
+    monkeypatch.setattr(sbmod, "_LOG_WRITE_BEHIND", False)
+    history_cache.cache.clear()
+    sid = sb.table("va_sessions").insert({"label": "t"}).execute().data[0]["id"]
+    for i in range(5):
+        sbmod.safe_log_message(sid, "user", f"m{i}")
+    return sb, sid
+
+
+def test_repeat_reads_hit_cache_and_see_new_messages(monkeypatch, tmp_path):
+    sb, sid = _setup(monkeypatch, tmp_path)
+    c = TestClient(app)
+    before = history_cache.stats()
+    first = c.get("/agent/messages", params={"session_id": sid, "limit": 12}).json()
+    assert [m["content"] for m in first] == [f"m{i}" for i in range(5)]
+    reads = sb.message_reads
+
+    again = c.get(f"/api/threads/{sid}/messages", params={"limit": 12}).json()["items"]
+    assert [m["content"] for m in again] == [f"m{i}" for i in range(5)]
+    # write-through: the new message is served without another query
+    sbmod.safe_log_message(sid, "assistant", "reply")
+    latest = c.get("/agent/messages", params={"session_id": sid, "limit": 3}).json()
+    assert [m["content"] for m in latest] == ["m3", "m4", "reply"]
+    assert sb.message_reads == reads + 1  # only the logger's insert touched va_messages
+
+    st = history_cache.stats()
+    assert st["hits"] - before["hits"] == 2 and st["appends"] >= 1
+    history_cache.cache.clear()
+
+
+def test_title_change_invalidates_and_bounds_hold(monkeypatch, tmp_path):
+    sb, sid = _setup(monkeypatch, tmp_path)
+    history_cache.history_page(sb, sid, 10)
+    assert history_cache.cache.page(sid, 10) is not None
+    sbmod.update_session_title(sid, "renamed")
+    assert history_cache.cache.page(sid, 10) is None
+
+    small = history_cache.HistoryCache(max_entries=3, max_bytes=10**6, per_session=10)
+    small.fill(1, [{"id": 2, "session_id": 1, "content": "b"}, {"id": 1, "session_id": 1, "content": "a"}], True, 0)
+    small.fill(2, [{"id": 3, "session_id": 2, "content": "c"}, {"id": 4, "session_id": 2, "content": "d"}], True, 0)
+    assert small.stats()["entries"] <= 3 and small.stats()["evictions"] == 1
+    # a write racing a fill wins: the stale fill is dropped
+    v = small.version(5)
+    small.on_written("va_messages", [{"id": 9, "session_id": 5, "content": "x"}])
+    small.fill(5, [], True, v)
+    assert small.page(5, 1) is None
+    history_cache.cache.clear()
@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from graph import model_router as mr
+
+
+def test_routes_by_size_tools_and_latency():
+    r = mr.ModelRouter(["mini", "mid", "big"], large_tokens=50, p95_budget_ms=1000)
+    assert r.route([{"role": "user", "content": "hi"}])["model"] == "mini"
+    d = r.route([{"role": "user", "content": "please refactor routes/agent.py"}])
+    assert d["model"] == "big" and d["reason"] == "hard:tools"
+    assert r.route([{"role": "user", "content": "x " * 400}])["reason"] == "hard:tokens"
+
+    # the light tier is slow right now: light turns spill over to the next tier
+    for _ in range(10):
+        r.observe("mini", 3.0)
+    d = r.route([{"role": "user", "content": "hi"}])
+    assert d["model"] == "mid" and d["reason"] == "light+latency"
+
+    r.set_override("s1", "big")
+    assert r.route([{"role": "user", "content": "hi"}], session_id="s1")["reason"] == "session_override"
+    r.set_override("s1", None)
+    assert r.route([{"role": "user", "content": "hi"}], session_id="s1")["model"] == "mid"
+
+
+class _FakeOpenAI(BaseHTTPRequestHandler):
+    models = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.models.append(body["model"])
+        out = {
+            "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"from {body['model']}"}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+        data = json.dumps(out).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *a):
+        pass
+
+
+@pytest.fixture
+def fake_openai():
+    pytest.importorskip("langchain_openai")
+    pytest.importorskip("langgraph.prebuilt")
+    srv = HTTPServer(("127.0.0.1", 0), _FakeOpenAI)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    _FakeOpenAI.models = []
+    yield f"http://127.0.0.1:{srv.server_address[1]}/v1"
+    srv.shutdown()
+
+
+def test_wrapper_routes_turns_to_tier_models(monkeypatch, fake_openai):
+    import graph.va_graph as vg
+
+    monkeypatch.setenv("AGENT_USE_LANGGRAPH", "1")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_openai)
+    monkeypatch.setenv("AGENT_TOOLS_ENABLED", "0")
+    monkeypatch.setenv("OPENAI_MODEL", "small-model")
+    monkeypatch.setenv("AGENT_MODEL_TIERS", "small-model,big-model")
+    monkeypatch.setattr(mr, "router", mr.ModelRouter(["small-model"]))
+
+    w = vg._Wrapper()
+    res = w.invoke({"session_id": "1", "messages": [{"role": "user", "content": "hi"}]})
+    assert res["last_text"] == "from small-model"
+    assert res["route"]["model"] == "small-model" and res["route"]["reason"] == "light"
+
+    res = w.invoke({"session_id": "1", "messages": [{"role": "user", "content": "list the files in routes"}]})
+    assert res["last_text"] == "from big-model" and res["route"]["reason"] == "hard:tools"
+
+    mr.router.set_override("1", "big-model")
+    assert w.invoke({"session_id": "1", "messages": [{"role": "user", "content": "hi"}]})["route"]["model"] == "big-model"
+    assert _FakeOpenAI.models == ["small-model", "big-model", "big-model"]
+    assert set(mr.stats()["p95_ms"]) == {"small-model", "big-model"}
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import lib.supabase_client as libsb
+import ops_runner
+import vme_lib.supabase_client as sbmod
+
+
+def _use_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "vme.sqlite3"))
+    monkeypatch.setattr(sbmod, "_sb", None)
+    monkeypatch.setattr(libsb, "_sb", None)
+    monkeypatch.setattr(sbmod, "_client", lambda: libsb._client())
+    # tasks still running on the module pool (from other tests) must not write into this store
+    monkeypatch.setattr(ops_runner, "_emit_event", lambda tid, kind, data: None)
+    monkeypatch.setattr(ops_runner, "_set_status", lambda tid, status, error=None: None)
+    return libsb._client()
+
+
+def _wait(cond, timeout=5.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_each_task_runs_once_across_replicas(monkeypatch, tmp_path):
+    _use_sqlite(monkeypatch, tmp_path)
+    ids = [sbmod.insert_task(f"t{i}", "b") for i in range(12)]
+    runs, lock = [], threading.Lock()
+
+    def run(title, body, emit):
+        with lock:
+            runs.append(title)
+        time.sleep(0.01)
+        return True
+
+    queue = ops_runner.DbQueue(lease_s=5, poll_s=0.05)
+    pools = [ops_runner.WorkerPool(workers=3, task_timeout=5, run=run, queue=queue) for _ in range(2)]
+    for p in pools:
+        p.start()
+    assert _wait(lambda: all(sbmod.get_task(i)["status"] == "success" for i in ids))
+    for p in pools:
+        p.stop()
+    assert sorted(runs) == sorted(f"t{i}" for i in range(12))
+    assert sum(p.stats()["claims"] for p in pools) == 12
+    assert all(sbmod.get_task(i)["attempts"] == 1 for i in ids)
+
+
+def test_expired_lease_is_requeued_and_fenced(monkeypatch, tmp_path):
+    _use_sqlite(monkeypatch, tmp_path)
+    tid = sbmod.insert_task("t", "b")
+    assert sbmod.task_claim("dead-worker", 1)["id"] == tid
+    assert sbmod.task_claim("other", 1) is None  # held
+    time.sleep(1.1)
+    assert sbmod.task_requeue_expired(3) == 1
+    assert sbmod.get_task(tid)["status"] == "queued"
+    row = sbmod.task_claim("other", 30)
+    assert row["id"] == tid and row["attempts"] == 2
+    assert sbmod.task_heartbeat(tid, "dead-worker", 30) is False
+    assert sbmod.task_finish(tid, "dead-worker", "success") is False
+    assert sbmod.task_finish(tid, "other", "success") is True
+    assert sbmod.get_task(tid)["status"] == "success"
+
+
+def test_cancelled_task_loses_its_lease(monkeypatch, tmp_path):
+    _use_sqlite(monkeypatch, tmp_path)
+    tid = sbmod.insert_task("slow", "b")
+    release = threading.Event()
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=5, run=lambda title, body, emit: release.wait(3),
+                                 queue=ops_runner.DbQueue(lease_s=1, poll_s=0.05))
+    pool.start()
+    assert _wait(lambda: sbmod.get_task(tid)["status"] == "running")
+    sbmod.update_task_status(tid, "cancelled")
+    assert _wait(lambda: pool.stats()["lost_leases"] == 1)
+    release.set()
+    pool.stop()
+    assert sbmod.get_task(tid)["status"] == "cancelled"
+
+
+def test_falls_back_to_memory_until_claims_work(monkeypatch):
+    monkeypatch.setattr(ops_runner, "_emit_event", lambda tid, kind, data: None)
+    monkeypatch.setattr(ops_runner, "_set_status", lambda tid, status, error=None: None)
+    broken, ran = [True], []
+
+    class Queue(ops_runner.DbQueue):
+        def claim(self, owner):
+            if broken[0]:
+                raise RuntimeError("function va_task_claim does not exist")
+            return None
+
+        def requeue_expired(self):
+            return 0
+
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=5, run=lambda title, body, emit: ran.append(title) or True,
+                                 queue=Queue(poll_s=0.05, retry_s=0.2))
+    pool.submit({"id": 1, "title": "a", "body": ""}, durable=True)
+    assert _wait(lambda: ran == ["a"])
+    st = pool.stats()
+    assert st["queue"] == "memory" and st["claim_errors"] >= 1 and "va_task_claim" in st["db_error"]
+    pool.submit({"id": 2, "title": "b", "body": ""}, durable=True)
+    assert _wait(lambda: ran == ["a", "b"])
+    broken[0] = False  # schema applied: the next retry switches back to the table
+    assert _wait(lambda: pool.stats()["queue"] == "db")
+    pool.submit({"id": 3, "title": "c", "body": ""}, durable=True)
+    time.sleep(0.2)
+    assert ran == ["a", "b"]  # left for a claim
+    pool.stop()
+
+
+def test_failed_finish_write_counts_as_lost(monkeypatch):
+    monkeypatch.setattr(ops_runner, "_emit_event", lambda tid, kind, data: None)
+    rows = [{"id": 9, "title": "x", "body": ""}]
+
+    class Queue(ops_runner.DbQueue):
+        def claim(self, owner):
+            return rows.pop() if rows else None
+
+        def heartbeat(self, task_id, owner):
+            return True
+
+        def finish(self, task_id, owner, status, error=None):
+            return None  # RPC error
+
+        def requeue_expired(self):
+            return 0
+
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=5, run=lambda title, body, emit: True,
+                                 queue=Queue(poll_s=0.05))
+    pool.start()
+    assert _wait(lambda: pool.stats()["finish_errors"] == 1)
+    st = pool.stats()
+    assert st["lost_leases"] == 1 and st["workers"][0]["lost"] == 1
+    pool.stop()
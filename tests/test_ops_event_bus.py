@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import routes.ops as ops
+from main import app
+from vme_lib.event_bus import EventBus
+
+client = TestClient(app)
+HEADERS = {'X-Admin-Token': 'adm'}
+
+
+def test_publish_from_a_thread_and_slow_consumer_overflow():
+    bus = EventBus('t', buffer=2)
+
+    async def main():
+        with bus.subscribe(7) as sub:
+            t0 = time.perf_counter()
+            threading.Thread(target=bus.publish, args=(7, {'id': 1})).start()
+            assert await sub.get(timeout=1) == {'id': 1}
+            assert time.perf_counter() - t0 < 0.1
+            for i in range(2, 6):
+                bus.publish(7, {'id': i})  # nobody reading: 2 fit, 2 dropped
+            assert sub.overflowed and sub.dropped == 2
+            assert await sub.get(timeout=1) is None  # caller must catch up
+            assert [e['id'] for e in sub.drain()] == [2, 3]
+        assert not bus.has_subscribers(7)
+
+    asyncio.run(main())
+    st = bus.stats()
+    assert st['delivered'] == 3 and st['dropped'] == 2 and st['overflows'] == 1 and st['subscribers'] == 0
+
+
+def test_stream_gets_backfill_then_live_events_without_polling(monkeypatch):
+    monkeypatch.setenv('SETTINGS_ADMIN_TOKEN', 'adm')
+    monkeypatch.delenv('DEV_LOCAL_LLM', raising=False)
+    monkeypatch.setattr(ops._sbmod, '_client', lambda: None)
+    tid = ops._inproc_task('t', None)
+    ops._append_event(tid, 'log', {'n': 0})  # before anyone watches: backfill
+    reads = []
+    real = ops._events_after
+
+    async def spy(task_id, cursor):
+        reads.append(cursor)
+        return await real(task_id, cursor)
+
+    monkeypatch.setattr(ops, '_events_after', spy)
+
+    def worker():
+        while not ops.task_bus.has_subscribers(tid):
+            time.sleep(0.005)
+        ops._append_event(tid, 'log', {'n': 1})
+        ops._append_event(tid, 'done', {})
+
+    threading.Thread(target=worker).start()
+    kinds = []
+    with client.stream('GET', f'/ops/tasks/{tid}/stream', headers=HEADERS) as resp:
+        for line in resp.iter_lines():
+            if line.startswith('data: '):
+                kinds.append(ops.json.loads(line[6:])['kind'])
+    assert kinds == ['log', 'log', 'done']
+    assert reads == [0]  # one storage read on connect, live events after that
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import queue
+import threading
+
+import pytest
+
+from vme_lib import event_fanout
+from vme_lib.event_bus import EventBus
+
+
+class FakeRedis:
+    """PUBLISH/SUBSCRIBE for clients sharing one `subscribers` dict."""
+
+    def __init__(self, subscribers):
+        self.subscribers = subscribers
+
+    def publish(self, channel, data):
+        for q in list(self.subscribers.get(channel, ())):
+            q.put({"type": "message", "channel": channel, "data": data.encode("utf-8")})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.subscribers)
+
+
+class FakePubSub:
+    def __init__(self, subscribers):
+        self.subscribers = subscribers
+        self.q = queue.Queue()
+
+    def subscribe(self, channel):
+        self.subscribers.setdefault(channel, []).append(self.q)
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        for qs in self.subscribers.values():
+            if self.q in qs:
+                qs.remove(self.q)
+
+
+def _two_nodes(make):
+    a = event_fanout.Fanout(EventBus("a"), make(), node="a")
+    b = event_fanout.Fanout(EventBus("b"), make(), node="b")
+    for n in (a, b):
+        n.start()
+    return a, b
+
+
+def _check_cross_node_delivery(a, b):
+    async def main():
+        with a.bus.subscribe(1) as sub_a, b.bus.subscribe(1) as sub_b:
+            await asyncio.sleep(0.05)  # receivers subscribed
+            threading.Thread(target=a.publish, args=(1, {"id": 5, "kind": "log"})).start()
+            assert await sub_b.get(timeout=2) == {"id": 5, "kind": "log"}
+            assert await sub_a.get(timeout=1) == {"id": 5, "kind": "log"}
+            assert await sub_a.get(timeout=0.2) is None  # no echo of our own message
+
+    try:
+        asyncio.run(main())
+        assert b.stats()["received"] == 1 and a.stats()["received"] == 0 and a.stats()["sent"] == 1
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_memory_transport_reaches_other_nodes():
+    peers = []
+    _check_cross_node_delivery(*_two_nodes(lambda: event_fanout.MemoryTransport(peers)))
+
+
+def test_redis_transport_with_fake_server():
+    subscribers = {}
+    a, b = _two_nodes(lambda: event_fanout.RedisTransport(client=FakeRedis(subscribers), channel="t"))
+    _check_cross_node_delivery(a, b)
+    assert b.stats()["transport"] == "redis" and b.stats()["lag_ms_p95"] is not None
+
+
+@pytest.mark.skipif(not os.getenv("REDIS_URL"), reason="set REDIS_URL to run against a local Redis server")
+def test_redis_transport_with_local_server():
+    url = os.environ["REDIS_URL"]
+    _check_cross_node_delivery(*_two_nodes(lambda: event_fanout.RedisTransport(url, channel="vme2:test:events")))
+
+
+def test_without_transport_events_stay_local(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.delenv("OPS_EVENTS_REDIS_URL", raising=False)
+    assert event_fanout.make_transport("auto") is None
+    f = event_fanout.Fanout(EventBus("solo"))
+    assert f.publish(1, {"id": 1}) == 0 and not f.stats()["running"]
+
+
+def test_transport_only_used_between_start_and_stop():
+    peers = []
+    a = event_fanout.Fanout(EventBus("a"), event_fanout.MemoryTransport(peers), node="a")
+    a.publish(1, {"id": 1})
+    assert a.stats()["pending"] == 0 and not a.stats()["running"]
+    a.start()
+    a.stop()
+    a.publish(1, {"id": 2})
+    assert a.stats()["pending"] == 0 and not a.stats()["running"]
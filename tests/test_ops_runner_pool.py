@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+import ops_runner
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    statuses, events = [], []
+    monkeypatch.setattr(ops_runner, "_set_status", lambda tid, status, error=None: statuses.append((tid, status, error)))
+    monkeypatch.setattr(ops_runner, "_emit_event", lambda tid, kind, data: events.append((tid, kind)))
+    return statuses, events
+
+
+def _wait(cond, timeout=3.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_long_task_does_not_block_the_queue(recorded):
+    statuses, _ = recorded
+    release = threading.Event()
+
+    def run(title, body, emit):
+        if title == "slow":
+            release.wait(2)
+        emit("done", {})
+        return True
+
+    pool = ops_runner.WorkerPool(workers=2, task_timeout=5, run=run)
+    pool.submit({"id": 1, "title": "slow"})
+    t0 = time.monotonic()
+    pool.submit({"id": 2, "title": "fast"})
+    assert _wait(lambda: (2, "success", None) in statuses)
+    assert time.monotonic() - t0 < 0.5  # picked up by the idle worker, no polling delay
+    release.set()
+    assert _wait(lambda: (1, "success", None) in statuses)
+    st = pool.stats()
+    assert st["queue_depth"] == 0 and sum(w["done"] for w in st["workers"]) == 2
+    assert all(w["run_ms_max"] is not None for w in st["workers"])
+    pool.stop()
+
+
+def test_task_timeout_frees_the_worker(recorded):
+    statuses, events = recorded
+    hang = threading.Event()
+
+    def run(title, body, emit):
+        if title == "hang":
+            hang.wait(2)
+            emit("late", {})
+        return True
+
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=0.1, run=run)
+    pool.submit({"id": 1, "title": "hang"})
+    pool.submit({"id": 2, "title": "ok"})
+    assert _wait(lambda: (2, "success", None) in statuses)
+    assert (1, "failed", "timeout") in statuses and (1, "error") in events
+    hang.set()
+    time.sleep(0.05)
+    assert (1, "late") not in events  # the abandoned run is muted
+    assert pool.stats()["workers"][0]["timeouts"] == 1
+    pool.stop()
+
+
+def test_resize_adds_and_retires_workers(recorded):
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=5, run=lambda title, body, emit: True)
+    pool.start()
+    assert len(pool.stats()["workers"]) == 1
+    pool.resize(3)
+    assert len(pool.stats()["workers"]) == 3
+    pool.resize(1)
+    assert _wait(lambda: len(pool.stats()["workers"]) == 1)
+    pool.submit({"id": 5, "title": "x"})
+    assert _wait(lambda: (5, "success", None) in recorded[0])
+    pool.stop()
+
+
+def test_abandoned_run_is_cancelled_at_its_next_emit(recorded):
+    ticks = []
+
+    def run(title, body, emit):
+        for i in range(100):
+            emit("tick", {})
+            ticks.append(i)
+            time.sleep(0.01)
+        return True
+
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=0.1, run=run)
+    pool.submit({"id": 7, "title": "ticker"})
+    assert _wait(lambda: pool.stats()["abandoned"] == 1)
+    assert _wait(lambda: pool.stats()["task_threads"] == 0, timeout=1.0)
+    assert len(ticks) < 100
+    pool.stop()
+
+
+def test_rerun_waits_for_the_abandoned_thread(recorded):
+    statuses, _ = recorded
+    release, starts = threading.Event(), []
+
+    def run(title, body, emit):
+        starts.append(title)
+        if title == "stuck":
+            release.wait(3)  # never emits, so it can't be cancelled
+        return True
+
+    pool = ops_runner.WorkerPool(workers=1, task_timeout=0.1, run=run)
+    pool.submit({"id": 8, "title": "stuck"})
+    assert _wait(lambda: pool.stats()["abandoned"] == 1)
+    pool.task_timeout = 5
+    pool.submit({"id": 8, "title": "again"})
+    time.sleep(0.2)
+    assert starts == ["stuck"]
+    release.set()
+    assert _wait(lambda: starts == ["stuck", "again"] and (8, "success", None) in statuses)
+    pool.stop()
@@ -0,0 +1,103 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+import routes.ops as ops
+from main import app
+
+client = TestClient(app)
+HEADERS = {'X-Admin-Token': 'adm'}
+
+
+def _inproc(monkeypatch):
+    monkeypatch.setenv('SETTINGS_ADMIN_TOKEN', 'adm')
+    monkeypatch.delenv('DEV_LOCAL_LLM', raising=False)
+    monkeypatch.setattr(ops._sbmod, '_client', lambda: None)
+    return ops._inproc_task('t', None)
+
+
+def _read(resp):
+    ids, kinds, other = [], [], []
+    for line in resp.iter_lines():
+        if line.startswith('id: '):
+            ids.append(int(line[4:]))
+        elif line.startswith('data: '):
+            kinds.append(ops.json.loads(line[6:])['kind'])
+        elif line:
+            other.append(line)
+    return ids, kinds, other
+
+
+def test_stream_sends_ids_ends_on_done_and_resumes(monkeypatch):
+    tid = _inproc(monkeypatch)
+    for kind in ('log', 'log', 'done'):
+        ops._append_inproc_event(tid, kind, {})
+    with client.stream('GET', f'/ops/tasks/{tid}/stream', headers=HEADERS) as resp:
+        ids, kinds, _ = _read(resp)  # returns because the stream ends at 'done'
+    assert kinds == ['log', 'log', 'done'] and ids == sorted(ids) and len(set(ids)) == 3
+
+    with client.stream('GET', f'/ops/tasks/{tid}/stream', headers=dict(HEADERS, **{'Last-Event-ID': str(ids[0])})) as resp:
+        ids2, kinds2, _ = _read(resp)
+    assert ids2 == ids[1:] and kinds2 == ['log', 'done']
+
+
+def test_idle_stream_sends_heartbeats_and_reads_past_cursor(monkeypatch):
+    tid = _inproc(monkeypatch)
+    monkeypatch.setattr(ops, '_STREAM_HEARTBEAT_S', 0.02)
+    cursors = []
+    real = ops._events_after
+
+    async def spy(task_id, cursor):
+        cursors.append(cursor)
+        return await real(task_id, cursor)
+
+    monkeypatch.setattr(ops, '_events_after', spy)
+    ops._append_inproc_event(tid, 'log', {})
+    # stored without being published (as by another process): found by the idle catch-up
+    timer = threading.Timer(0.2, lambda: ops._append_inproc_event(tid, 'error', {'msg': 'x'}))
+    timer.start()
+    with client.stream('GET', f'/ops/tasks/{tid}/stream', headers=HEADERS) as resp:
+        ids, kinds, other = _read(resp)
+    timer.join()
+    assert kinds == ['log', 'error']
+    assert ': keepalive' in other
+    assert cursors[0] == 0 and set(cursors[1:]) <= {ids[0], ids[1]} and ids[0] in cursors
+
+
+def test_idle_stream_does_not_poll_while_fanout_runs(monkeypatch):
+    tid = _inproc(monkeypatch)
+    monkeypatch.setattr(ops, '_STREAM_HEARTBEAT_S', 0.02)
+    errors = [0]
+
+    class Running:
+        def running(self):
+            return True
+
+        def missed(self):
+            return errors[0]
+
+        def publish(self, topic, event):
+            return ops.task_bus.publish(topic, event)
+
+    monkeypatch.setattr(ops, 'task_events', Running())
+    cursors = []
+    real = ops._events_after
+
+    async def spy(task_id, cursor):
+        cursors.append(cursor)
+        return await real(task_id, cursor)
+
+    monkeypatch.setattr(ops, '_events_after', spy)
+    ops._append_inproc_event(tid, 'log', {})
+
+    def later():
+        ops._append_inproc_event(tid, 'done', {})  # stored, never published
+        errors[0] = 1  # receiver hiccup: the next keepalive reads storage once
+
+    timer = threading.Timer(0.2, later)
+    timer.start()
+    with client.stream('GET', f'/ops/tasks/{tid}/stream', headers=HEADERS) as resp:
+        ids, kinds, other = _read(resp)
+    timer.join()
+    assert kinds == ['log', 'done'] and other.count(': keepalive') >= 5
+    assert cursors == [0, ids[0]]  # on subscribe and after the miss, not on every keepalive
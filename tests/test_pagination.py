@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+
+import vme_lib.supabase_client as sbmod
+from vme_lib import pagination, sqlite_store
+from main import app
+
+
+def _seed(monkeypatch, tmp_path, n_msgs=25):
+    sb = sqlite_store.SqliteStore(str(tmp_path / "p.sqlite3"))
+    monkeypatch.setattr(sbmod, "_client", lambda: sb)
+    sid = sb.table("va_sessions").insert({"label": "s"}).execute().data[0]["id"]
+    sb.table("va_sessions").insert([{"label": f"t{i}"} for i in range(4)]).execute()
+    sb.table("va_messages").insert([{"session_id": sid, "role": "user", "content": f"m{i}"} for i in range(n_msgs)]).execute()
+    return sb, sid
+
+
+def test_cursor_roundtrip_and_rejects_garbage():
+    assert pagination.decode_cursor(pagination.encode_cursor(42)) == 42
+    assert pagination.decode_cursor(None) is None
+    try:
+        pagination.decode_cursor("not-a-cursor")
+        assert False
+    except ValueError:
+        pass
+
+
+def test_thread_messages_scroll_both_directions(monkeypatch, tmp_path):
+    _, sid = _seed(monkeypatch, tmp_path)
+    c = TestClient(app)
+    latest = c.get(f"/api/threads/{sid}/messages", params={"limit": 10}).json()
+    assert [m["content"] for m in latest["items"]] == [f"m{i}" for i in range(15, 25)]
+    assert latest["prev_cursor"] is None
+
+    older = c.get(f"/api/threads/{sid}/messages", params={"limit": 10, "before": latest["next_cursor"]}).json()
+    assert [m["content"] for m in older["items"]] == [f"m{i}" for i in range(5, 15)]
+    oldest = c.get(f"/api/threads/{sid}/messages", params={"limit": 10, "before": older["next_cursor"]}).json()
+    assert [m["content"] for m in oldest["items"]] == [f"m{i}" for i in range(5)]
+    assert oldest["next_cursor"] is None
+
+    newer = c.get(f"/api/threads/{sid}/messages", params={"limit": 10, "after": oldest["prev_cursor"]}).json()
+    assert [m["content"] for m in newer["items"]] == [f"m{i}" for i in range(5, 15)]
+
+    assert c.get(f"/api/threads/{sid}/messages", params={"before": "garbage"}).status_code == 400
+
+
+def test_list_routes_use_headers_and_optional_counts(monkeypatch, tmp_path):
+    _, sid = _seed(monkeypatch, tmp_path)
+    c = TestClient(app)
+    r = c.get("/agent/messages", params={"session_id": sid, "limit": 12})
+    assert [m["content"] for m in r.json()] == [f"m{i}" for i in range(13, 25)]
+    r2 = c.get("/agent/messages", params={"session_id": sid, "limit": 12, "before": r.headers["x-next-cursor"]})
+    assert r2.json()[-1]["content"] == "m12"
+
+    s = c.get("/agent/sessions", params={"limit": 2})
+    assert [x["label"] for x in s.json()] == ["t3", "t2"]
+    s2 = c.get("/agent/sessions", params={"limit": 2, "before": s.headers["x-next-cursor"]})
+    assert [x["label"] for x in s2.json()] == ["t1", "t0"]
+
+    stats = c.get("/agent/api/sessions", params={"page_size": 3}).json()
+    assert stats["total_sessions"] == 5 and stats["total_messages"] == 25
+    assert stats["next_cursor"] and len(stats["recent"]) == 3
+    nocount = c.get("/agent/api/sessions", params={"page_size": 3, "count": "none", "before": stats["next_cursor"]}).json()
+    assert nocount["total_sessions"] is None and [x["label"] for x in nocount["recent"]] == ["t0", "s"]
@@ -0,0 +1,62 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import graph.va_graph as vg
+from graph import readiness as rmod
+from graph import registry as regmod
+from main import app
+
+
+class FakeCompiled:
+    vme_ident = ("gpt-4o-mini", ["ls"])
+
+
+def test_echo_mode_is_ready_and_installs_graph(monkeypatch):
+    monkeypatch.setattr(vg, "_build_graph", lambda: None)
+    monkeypatch.setattr(regmod, "registry", regmod.GraphRegistry())
+    r = rmod.Readiness()
+    st = r.check()
+    assert st["ready"] is True and st["mode"] == "echo"
+    assert regmod.registry.stats()["current"] is not None
+
+
+def test_failed_probe_reports_not_ready(monkeypatch):
+    monkeypatch.setattr(vg, "_build_graph", lambda: FakeCompiled())
+    monkeypatch.setattr(regmod, "registry", regmod.GraphRegistry())
+
+    def bad_probe(model, timeout):
+        raise RuntimeError("401 invalid api key")
+
+    monkeypatch.setattr(rmod, "probe_credentials", bad_probe)
+    monkeypatch.setattr(rmod, "readiness", rmod.Readiness())
+    st = rmod.readiness.check()
+    assert st["ready"] is False and st["status"] == "credentials_failed"
+    # the graph is installed regardless, so chat doesn't rebuild it
+    assert vg.get_graph()._graph.__class__ is FakeCompiled
+
+    c = TestClient(app)
+    r = c.get("/health/ready")
+    assert r.status_code == 503 and "invalid api key" in r.json()["error"]
+    assert c.get("/health").status_code == 200
+
+    monkeypatch.setattr(rmod, "probe_credentials", lambda model, timeout: None)
+    rmod.readiness.check()
+    r = c.get("/health/ready")
+    assert r.status_code == 200 and r.json()["credentials"] == "ok"
+    assert r.json()["checks"] == 2
+
+
+def test_background_thread_checks_and_stops(monkeypatch):
+    monkeypatch.setattr(vg, "_build_graph", lambda: None)
+    monkeypatch.setattr(regmod, "registry", regmod.GraphRegistry())
+    r = rmod.Readiness(interval=60)
+    r.start()
+    try:
+        for _ in range(100):
+            if r.snapshot().get("checks"):
+                break
+            time.sleep(0.02)
+        assert r.snapshot()["ready"] is True
+    finally:
+        r.stop()
@@ -0,0 +1,87 @@
+from graph import response_cache as rc
+from graph import va_graph
+
+
+class FakeCompiled:
+    vme_ident = ("gpt-4o-mini", ["ls", "write_file"])
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def invoke(self, graph_in, config=None):
+        self.calls += 1
+        return self.replies.pop(0)
+
+
+def _wrapper(compiled):
+    w = va_graph._Wrapper.__new__(va_graph._Wrapper)
+    w._graph = compiled
+    return w
+
+
+def test_repeat_turn_is_served_from_cache(monkeypatch):
+    monkeypatch.setattr(rc, "_ENABLED", True)
+    monkeypatch.setattr(rc, "cache", rc.ResponseCache(max_entries=8, ttl=60))
+    monkeypatch.setattr(va_graph._Wrapper, "_result", lambda self, res, state: res)
+    g = FakeCompiled([{"last_text": "all good", "tool_events": []}])
+    w = _wrapper(g)
+    state = {"session_id": "1", "messages": [{"role": "user", "content": "what's the status"}]}
+
+    assert w.invoke(state)["last_text"] == "all good"
+    again = w.invoke(dict(state, session_id="2"))
+    assert {k: v for k, v in again.items() if k != "spans"} == {"last_text": "all good", "session_id": "2", "tool_events": [], "cached": True}
+    assert again["spans"][-1]["cached"] is True
+    assert g.calls == 1
+    st = rc.stats()
+    assert st["hits"] == 1 and st["stores"] == 1 and st["saved_ms"] >= 0
+
+    # different history -> different key
+    longer = {"session_id": "1", "messages": [{"role": "assistant", "content": "hi"}] + state["messages"]}
+    assert rc.make_key("m", ["ls"], longer["messages"]) != rc.make_key("m", ["ls"], state["messages"])
+
+
+def test_mutating_turns_are_not_cached(monkeypatch):
+    monkeypatch.setattr(rc, "_ENABLED", True)
+    monkeypatch.setattr(rc, "cache", rc.ResponseCache(max_entries=8, ttl=60))
+    monkeypatch.setattr(va_graph._Wrapper, "_result", lambda self, res, state: res)
+    wrote = {"last_text": "saved", "tool_events": [{"tool_name": "write_file", "input_json": {}, "output_json": "ok"}]}
+    g = FakeCompiled([wrote, dict(wrote)])
+    w = _wrapper(g)
+    state = {"session_id": "1", "messages": [{"role": "user", "content": "save it"}]}
+    w.invoke(state)
+    w.invoke(state)
+    assert g.calls == 2
+    assert rc.stats()["skipped_mutating"] == 2
+
+
+def test_mutating_turn_invalidates_cached_reads(monkeypatch):
+    monkeypatch.setattr(rc, "_ENABLED", True)
+    monkeypatch.setattr(rc, "cache", rc.ResponseCache(max_entries=8, ttl=60))
+    monkeypatch.setattr(va_graph._Wrapper, "_result", lambda self, res, state: res)
+    wrote = {"last_text": "saved", "tool_events": [{"tool_name": "write_file", "input_json": {}, "output_json": "ok"}]}
+    g = FakeCompiled([{"last_text": "a.py", "tool_events": []}, wrote, {"last_text": "a.py b.py", "tool_events": []}])
+    w = _wrapper(g)
+    ls = {"session_id": "1", "messages": [{"role": "user", "content": "list files in routes"}]}
+    assert w.invoke(ls)["last_text"] == "a.py"
+    w.invoke({"session_id": "1", "messages": [{"role": "user", "content": "add b.py"}]})
+    assert w.invoke(ls)["last_text"] == "a.py b.py"  # not the cached listing
+    assert g.calls == 3 and rc.stats()["invalidations"] == 1
+
+
+def test_turn_started_before_a_write_is_not_stored():
+    c = rc.ResponseCache(max_entries=8, ttl=60)
+    gen = c.generation
+    c.put("w", {"last_text": "saved", "tool_events": [{"tool_name": "git_commit"}]}, 0.1)
+    c.put("r", {"last_text": "old"}, 0.1, generation=gen)
+    assert c.get("r") is None and c.stats()["skipped_stale"] == 1
+
+
+def test_lru_and_ttl_bounds():
+    c = rc.ResponseCache(max_entries=2, ttl=60)
+    for k in ("a", "b", "c"):
+        c.put(k, {"last_text": k}, 0.1)
+    assert c.get("a") is None and c.get("c") == "c"
+    assert c.stats()["evictions"] == 1
+    c.ttl = -1
+    assert c.get("c") is None and c.stats()["expired"] == 1
@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+
+from graph import memory as memmod
+from main import app
+from vme_lib.session_lanes import SessionLanes
+
+
+def test_turns_of_a_session_run_in_order_other_sessions_dont_wait():
+    async def main():
+        lanes = SessionLanes("t")
+        log = []
+
+        async def turn(name, hold):
+            log.append(("start", name))
+            await asyncio.sleep(hold)
+            log.append(("end", name))
+            return name
+
+        out = await asyncio.gather(
+            lanes.run("1", "a", lambda: turn("1a", 0.05)),
+            lanes.run("1", "b", lambda: turn("1b", 0)),
+            lanes.run("2", "a", lambda: turn("2a", 0)),
+        )
+        assert out == ["1a", "1b", "2a"]
+        assert log.index(("end", "1a")) < log.index(("start", "1b"))
+        assert log.index(("end", "2a")) < log.index(("end", "1a"))
+        st = lanes.stats()
+        assert st["turns"] == 3 and st["queued"] == 1 and st["active_sessions"] == 0
+
+    asyncio.run(main())
+
+
+def test_identical_submissions_share_one_execution():
+    async def main():
+        lanes = SessionLanes("t")
+        calls = []
+
+        async def turn():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "reply"
+
+        assert await asyncio.gather(*(lanes.run("1", "hi", turn) for _ in range(3))) == ["reply"] * 3
+        assert len(calls) == 1 and lanes.stats()["coalesced"] == 2
+        # once finished, the same message is a new turn
+        assert await lanes.run("1", "hi", turn) == "reply" and len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_followers_share_replayed_events_and_last_one_out_cancels():
+    async def main():
+        lanes = SessionLanes("t")
+        runs, cancelled = [], []
+
+        async def produce():
+            runs.append(1)
+            yield {"type": "token", "text": "a"}
+            await asyncio.sleep(0.02)
+            yield {"type": "done", "text": "a"}
+
+        async def drain(q):
+            out = []
+            while (ev := await q.get()) is not None:
+                out.append(ev["type"])
+            return out
+
+        async with lanes.follow("1", "m", produce) as q1:
+            await asyncio.sleep(0.01)  # the first event is out before the duplicate joins
+            async with lanes.follow("1", "m", produce) as q2:
+                assert await asyncio.gather(drain(q1), drain(q2)) == [["token", "done"]] * 2
+        assert len(runs) == 1
+
+        async def slow():
+            try:
+                yield {"type": "token", "text": "x"}
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        async with lanes.follow("1", "n", slow) as q:
+            await q.get()
+        await asyncio.sleep(0.01)
+        assert cancelled == [1] and lanes.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_double_submitted_chat_runs_once_and_session_turns_serialize(monkeypatch):
+    import routes.agent as agent_mod
+
+    runs, logged, active = [], [], []
+
+    class FakeGraph:
+        async def ainvoke(self, state_in, config=None):
+            msg = state_in["messages"][-1]["content"]
+            active.append(msg)
+            assert len(active) == 1, "turns of one session overlapped"
+            runs.append(msg)
+            await asyncio.sleep(0.05)
+            active.remove(msg)
+            return {"last_text": f"re:{msg}", "tool_events": []}
+
+    monkeypatch.delenv("DEV_LOCAL_LLM", raising=False)
+    monkeypatch.setattr(agent_mod, "session_lanes", SessionLanes("agent_sessions"))
+    monkeypatch.setattr(agent_mod, "get_graph", lambda: FakeGraph())
+    monkeypatch.setattr(agent_mod, "safe_log_message", lambda session_id, role, content: logged.append((role, content)))
+    monkeypatch.setattr(memmod, "memory", memmod.ConversationMemory(loader=lambda sid, n: []))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as c:
+            post = lambda m: c.post("/agent/chat", json={"message": m, "session_id": "77"})
+            return await asyncio.gather(post("go"), post("go"), post("next"))
+
+    r1, r2, r3 = asyncio.run(main())
+    assert r1.json()["text"] == r2.json()["text"] == "re:go"
+    assert r3.json()["text"] == "re:next"
+    assert runs == ["go", "next"]
+    assert logged == [("user", "go"), ("assistant", "re:go"), ("user", "next"), ("assistant", "re:next")]
@@ -0,0 +1,72 @@
+import time
+
+from cryptography.fernet import Fernet
+
+import vme_lib.supabase_client as sbmod
+
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.selects = 0
+
+    def table(self, name):
+        client = self
+
+        class Q:
+            def select(self, *_a, **_k):
+                return self
+
+            def execute(self):
+                client.selects += 1
+                class R: pass
+                r = R()
+                r.data = [dict(x) for x in client.rows]
+                return r
+        return Q()
+
+
+def test_one_query_serves_all_keys_including_absent(monkeypatch):
+    fake = FakeClient([{"key": "A", "value": "1"}, {"key": "B", "value": {"x": 2}}])
+    monkeypatch.setattr(sbmod, "_client", lambda: fake)
+    sbmod.settings_refresh()
+    assert sbmod.settings_get("A") == "1"
+    assert sbmod.settings_get("B") == {"x": 2}
+    assert sbmod.settings_get("MISSING", default="d") == "d"
+    assert sbmod.settings_get("MISSING") is None
+    assert fake.selects == 1
+
+
+def test_stale_snapshot_served_while_refreshing(monkeypatch):
+    fake = FakeClient([{"key": "A", "value": "old"}])
+    monkeypatch.setattr(sbmod, "_client", lambda: fake)
+    monkeypatch.setattr(sbmod, "_SETTINGS_CACHE_TTL", 0)
+    sbmod.settings_refresh()
+    assert sbmod.settings_get("A") == "old"
+    fake.rows = [{"key": "A", "value": "new"}]
+    time.sleep(0.01)
+    # expired: the old value comes back immediately, a background reload follows
+    assert sbmod.settings_get("A") == "old"
+    deadline = time.time() + 2
+    while fake.selects < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    while sbmod._settings_refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    monkeypatch.setattr(sbmod, "_SETTINGS_CACHE_TTL", 30)
+    assert sbmod.settings_get("A") == "new"
+    assert sbmod.settings_stats()["stale_hits"] >= 1
+
+
+def test_decrypted_secret_is_memoised(monkeypatch):
+    monkeypatch.setenv("APP_ENCRYPTION_KEY", Fernet.generate_key().decode())
+    enc = sbmod._encode_setting("OPENAI_API_KEY", "sk-1")
+    assert enc.startswith("enc:v1:")
+    fake = FakeClient([{"key": "OPENAI_API_KEY", "value": enc}])
+    monkeypatch.setattr(sbmod, "_client", lambda: fake)
+    sbmod.settings_refresh()
+    before = sbmod.settings_stats()["decrypts"]
+    for _ in range(3):
+        assert sbmod.settings_get("OPENAI_API_KEY", decrypt=True) == "sk-1"
+    assert sbmod.settings_stats()["decrypts"] == before + 1
+    assert sbmod.settings_get("OPENAI_API_KEY", decrypt=False) == enc
+    sbmod.settings_refresh()
@@ -0,0 +1,146 @@
+import time
+
+import vme_lib.supabase_client as sbmod
+from vme_lib import settings_sync
+
+
+class FakeClient:
+    def __init__(self, rows, version=0):
+        self.rows = rows
+        self.version = version
+
+    def table(self, name):
+        client = self
+
+        class Q:
+            def select(self, *_a, **_k):
+                return self
+
+            def eq(self, *_a):
+                return self
+
+            def limit(self, *_a):
+                return self
+
+            def execute(self):
+                class R: pass
+                r = R()
+                if name == "va_settings_version":
+                    r.data = [{"version": client.version}]
+                else:
+                    r.data = [dict(x) for x in client.rows]
+                return r
+        return Q()
+
+
+def _wait_for(pred, timeout=1.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return pred()
+
+
+def test_other_replica_write_converges_quickly(monkeypatch):
+    fake = FakeClient([{"key": "MODEL", "value": "a"}])
+    monkeypatch.setattr(sbmod, "_client", lambda: fake)
+    sbmod.settings_refresh()
+    src = settings_sync.MemoryVersionSource()
+    w = settings_sync.SettingsWatcher(src, interval=0.05)
+    seen = []
+    w.add_listener(seen.append)
+    w.start()
+    try:
+        assert _wait_for(lambda: sbmod._settings_watched)
+        assert sbmod.settings_stats()["ttl_s"] == sbmod._SETTINGS_CACHE_TTL_WATCHED
+        assert sbmod.settings_get("MODEL") == "a"
+        # "another replica" writes and bumps the shared counter
+        fake.rows = [{"key": "MODEL", "value": "b"}]
+        src.bump()
+        assert _wait_for(lambda: sbmod.settings_get("MODEL") == "b")
+        assert seen == [1] and w.stats()["changes"] == 1
+    finally:
+        w.stop()
+        sbmod.settings_refresh()
+    assert sbmod._settings_watched is False
+
+
+def test_poll_source_and_error_fallback(monkeypatch):
+    fake = FakeClient([], version=7)
+    src = settings_sync.PostgrestVersionSource(lambda: fake)
+    assert src.current() == 7
+
+    broken = settings_sync.PostgrestVersionSource(lambda: None)
+    w = settings_sync.SettingsWatcher(broken, interval=0.01)
+    w.start()
+    try:
+        assert _wait_for(lambda: w.errors > 0)
+        assert sbmod._settings_watched is False
+        assert sbmod._settings_ttl() == sbmod._SETTINGS_CACHE_TTL
+    finally:
+        w.stop()
+
+
+def test_make_source_off_and_unconfigured(monkeypatch):
+    monkeypatch.setattr(sbmod, "_client", lambda: None)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    assert settings_sync.make_source("off") is None
+    assert settings_sync.make_source("auto") is None
+    assert settings_sync.bump() is None
+
+
+def test_pg_notify_source_listens_on_its_own_connection(monkeypatch):
+    import socket
+    import threading as _t
+
+    conns = []
+
+    class Conn:
+        def __init__(self):
+            self.sql = []
+            self.notifies = ["n"]
+            self.a, self.b = socket.socketpair()
+            conns.append(self)
+
+        def set_session(self, **_k):
+            pass
+
+        def cursor(self):
+            conn = self
+
+            class Cur:
+                def execute(self, sql):
+                    conn.sql.append(sql)
+
+                def fetchone(self):
+                    return (7,)
+            return Cur()
+
+        def fileno(self):
+            return self.a.fileno()
+
+        def poll(self):
+            pass
+
+        def close(self):
+            self.a.close()
+            self.b.close()
+
+    class FakePg:
+        @staticmethod
+        def connect(dsn):
+            return Conn()
+
+    monkeypatch.setattr(settings_sync, "_pg", FakePg)
+    monkeypatch.setattr(settings_sync, "_PG3", False)
+    src = settings_sync.PgNotifyVersionSource("postgres://x")
+    waiter = _t.Thread(target=src.wait, args=(0, 0.2))
+    waiter.start()
+    for _ in range(20):
+        assert src.bump() == 7  # request threads while the watcher sits in wait()
+    waiter.join()
+    listen, query = (conns[0], conns[1]) if conns[0].sql[0].startswith("LISTEN") else (conns[1], conns[0])
+    assert listen.sql == ["LISTEN va_settings"] and listen.notifies == []
+    assert "LISTEN va_settings" not in query.sql and query.sql.count("select va_settings_bump()") == 20
+    src.close()
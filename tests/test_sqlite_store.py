@@ -0,0 +1,78 @@
+import lib.supabase_client as libsb
+import vme_lib.supabase_client as sbmod
+from vme_lib import sqlite_store
+
+
+def _use_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "vme.sqlite3"))
+    monkeypatch.setattr(sbmod, "_sb", None)
+    monkeypatch.setattr(libsb, "_sb", None)
+    # test_supabase_mock replaces vme_lib's _client at import time; route it
+    # through lib's (identical) selection logic instead
+    monkeypatch.setattr(sbmod, "_client", lambda: libsb._client())
+    sbmod.settings_refresh()
+
+
+def test_helpers_persist_to_sqlite(monkeypatch, tmp_path):
+    _use_sqlite(monkeypatch, tmp_path)
+    sb = libsb._client()
+    assert isinstance(sb, sqlite_store.SqliteStore)
+    assert sbmod._client() is sb
+    assert sb._conn().execute("pragma journal_mode").fetchone()[0] == "wal"
+
+    sid = sbmod.create_session("first")
+    monkeypatch.setattr(sbmod, "_LOG_WRITE_BEHIND", True)
+    for i in range(3):
+        sbmod.safe_log_message(sid, "user", f"m{i}")
+    sbmod.safe_log_tool_event(sid, "ls", {"path": "."}, {"ok": True})
+    assert sbmod.log_writer_flush(timeout=2.0)
+    msgs = sb.table("va_messages").select("id,content").eq("session_id", sid).order("id").execute().data
+    assert [m["content"] for m in msgs] == ["m0", "m1", "m2"]
+    ev = sbmod.select_tool_events(sid)
+    assert ev[0]["input_json"] == {"path": "."} and ev[0]["output_json"] == {"ok": True}
+
+    tid = sbmod.insert_task("t", "b")
+    assert sbmod.update_task_status(tid, "running")
+    sbmod.insert_task_event(tid, "log", {"n": 1})
+    assert sbmod.get_task(tid)["status"] == "running"
+    assert sbmod.select_task_events(tid)[0]["data"] == {"n": 1}
+
+    mid = libsb.insert_meeting("m")
+    assert libsb.insert_segment(mid, "hello", ts=1.5)
+    assert libsb.finalize_meeting(mid, "s", ["a"], 1)
+    assert sb.table("va_meetings").select("*").eq("id", mid).single().execute().data["bullets"] == ["a"]
+
+    sbmod.settings_put({"tts_speed": 1.25})
+    sbmod.settings_put({"tts_speed": 1.5})
+    sbmod.settings_refresh()
+    assert sbmod.settings_get("tts_speed") == 1.5
+    assert sb.rpc("va_settings_bump", {}).execute().data >= 3
+    sbmod.settings_refresh()
+
+
+def test_query_builder_filters_and_counts(monkeypatch, tmp_path):
+    sb = sqlite_store.SqliteStore(str(tmp_path / "q.sqlite3"))
+    sb.table("va_sessions").insert([{"label": "a"}, {"label": ""}, {"label": None}, {"label": "b"}]).execute()
+    named = (sb.table("va_sessions").select("id,label")
+             .not_("label", "is", None).neq("label", "")
+             .order("id", desc=True).execute().data)
+    assert [r["label"] for r in named] == ["b", "a"]
+    res = sb.table("va_sessions").select("*", count="exact").range(1, 2).order("id").execute()
+    assert res.count == 4 and len(res.data) == 2
+    assert len(sb.table("va_sessions").select("id").in_("label", ["a", "b"]).execute().data) == 2
+    assert sb.table("va_sessions").delete().eq("label", "").execute().data[0]["label"] == ""
+    try:
+        sb.table("va_sessions").select("nope").execute()
+        assert False, "unknown column must raise"
+    except sqlite_store.APIError:
+        pass
+    sb.close()
+
+
+def test_auto_backend_only_without_credentials(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "auto")
+    assert sqlite_store.selected(False) is True
+    assert sqlite_store.selected(True) is False
+    monkeypatch.delenv("STORAGE_BACKEND")
+    assert sqlite_store.selected(False) is False
@@ -0,0 +1,38 @@
+from fastapi.testclient import TestClient
+
+import vme_lib.supabase_client as sbmod
+from vme_lib import sqlite_store
+from main import app
+
+
+def test_counters_follow_writes_and_reconcile(monkeypatch, tmp_path):
+    sb = sqlite_store.SqliteStore(str(tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(sbmod, "_client", lambda: sb)
+    a = sb.table("va_sessions").insert({"label": "a"}).execute().data[0]["id"]
+    b = sb.table("va_sessions").insert({"label": "b"}).execute().data[0]["id"]
+    sb.table("va_messages").insert([{"session_id": a, "role": "user", "content": str(i)} for i in range(3)]).execute()
+    sb.table("va_messages").insert({"session_id": b, "role": "user", "content": "x"}).execute()
+    assert sbmod.stats_get() == {"va_sessions": 2, "va_messages": 4}
+    row = sb.table("va_sessions").select("message_count,last_message_at").eq("id", a).single().execute().data
+    assert row["message_count"] == 3 and row["last_message_at"]
+
+    sb.table("va_messages").delete().eq("session_id", b).execute()
+    assert sbmod.stats_get()["va_messages"] == 3
+
+    # drift (e.g. rows written with triggers disabled) is repaired by reconcile
+    sb.table("va_stats").update({"value": 99}).eq("key", "va_messages").execute()
+    assert sbmod.stats_reconcile() == {"va_sessions": 2, "va_messages": 3}
+    assert sbmod.stats_get()["va_messages"] == 3
+
+    c = TestClient(app)
+    j = c.get("/api/sessions").json()
+    assert j["counts"] == {"va_sessions": 2, "va_messages": 3} and j["source"] == "stats"
+    items = c.get("/api/threads").json()["items"]
+    assert {i["title"]: i["message_count"] for i in items} == {"a": 3, "b": 0}
+
+
+def test_stats_unavailable_without_client(monkeypatch):
+    monkeypatch.setattr(sbmod, "_client", lambda: None)
+    assert sbmod.stats_get() is None
+    assert sbmod.stats_reconcile() is None
+    assert sbmod.start_stats_reconciler(0) is False
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+
+import vme_lib.supabase_client as sbmod
+from vme_lib import supabase_async as asb
+
+
+def test_async_helpers_without_client(monkeypatch):
+    monkeypatch.setattr(sbmod, "_client", lambda: None)
+    assert asyncio.run(asb.create_session("x")) is None
+    assert asyncio.run(asb.select_tool_events(1)) == []
+    assert asyncio.run(asb.settings_get("NOPE", default="d")) == "d"
+    assert asyncio.run(asb.list_tasks()) is None
+
+
+def test_async_helpers_use_sync_fake_in_thread(monkeypatch):
+    class Exec:
+        def __init__(self, data):
+            self.data = data
+        def execute(self):
+            return self
+
+    class Table:
+        def insert(self, payload):
+            return Exec([{"id": 42}])
+
+    class Fake:
+        def table(self, name):
+            return Table()
+
+    monkeypatch.setattr(sbmod, "_client", lambda: Fake())
+    # a fake isn't a supabase Client, so no async PostgREST client is built
+    async def run():
+        assert asb._aclient() is None
+        return await asb.create_session("label")
+    assert asyncio.run(run()) == 42
+    assert asyncio.run(asb.insert_task("t", "b")) == 42
+
+
+def test_pooled_client_built_per_loop(monkeypatch):
+    pytest.importorskip("postgrest")
+
+    class LooksLikeSupabase:
+        postgrest = object()
+
+    monkeypatch.setattr(sbmod, "_client", lambda: LooksLikeSupabase())
+    monkeypatch.setenv("SUPABASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "k")
+
+    async def run():
+        a = asb._aclient()
+        b = asb._aclient()
+        await asb.aclose()
+        return a, b
+    a, b = asyncio.run(run())
+    assert a is not None and a is b
+
+
+def test_execute_times_out():
+    class Slow:
+        async def execute(self):
+            await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asb.execute(Slow(), timeout=0.01))
+
+
+def test_clients_of_closed_loops_are_closed(monkeypatch):
+    pytest.importorskip("postgrest")
+
+    class LooksLikeSupabase:
+        postgrest = object()
+
+    monkeypatch.setattr(sbmod, "_client", lambda: LooksLikeSupabase())
+    monkeypatch.setenv("SUPABASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "k")
+    monkeypatch.setattr(asb, "_clients", {})
+    closed = []
+
+    async def fake_close(ac):
+        closed.append(ac)
+
+    monkeypatch.setattr(asb, "_close_quietly", fake_close)
+
+    async def build():
+        return asb._aclient()
+
+    first = asyncio.run(build())  # its loop is closed once run() returns
+
+    async def second():
+        ac = asb._aclient()
+        await asyncio.sleep(0)
+        return ac
+
+    other = asyncio.run(second())
+    assert closed == [first] and other is not first and len(asb._clients) == 1
+
+
+def test_cold_settings_load_is_single_flight(monkeypatch):
+    calls = []
+
+    async def rows():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [{"key": "A", "value": "1"}]
+
+    monkeypatch.setattr(asb, "_aclient", lambda: object())
+    monkeypatch.setattr(asb, "settings_rows", rows)
+    monkeypatch.setattr(sbmod, "_settings_peek", lambda: None)
+    monkeypatch.setattr(sbmod, "_settings_install", lambda r: None)
+    monkeypatch.setattr(sbmod, "_SETTINGS_CACHE", {"A": "1"}, raising=False)
+
+    async def burst():
+        return await asyncio.gather(*(asb.settings_get("A", decrypt=False) for _ in range(20)))
+
+    assert asyncio.run(burst()) == ["1"] * 20
+    assert len(calls) == 1
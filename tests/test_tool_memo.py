@@ -0,0 +1,75 @@
+import pytest
+
+from tools import codespace
+from tools import memo as memomod
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(codespace, "PROJECT_ROOT", tmp_path)
+    monkeypatch.setattr(memomod, "memo", memomod.ToolMemo(ttl=60))
+    monkeypatch.setattr(memomod, "_ENABLED", True)
+    (tmp_path / "a.txt").write_text("hello")
+    return tmp_path
+
+
+def test_read_file_is_memoized_until_the_file_changes(sandbox):
+    read = codespace.read_file_tool
+    with memomod.scope("s1"):
+        assert read.invoke({"path": "a.txt"}) == "hello"
+        assert read.invoke({"path": "a.txt"}) == "hello"
+        (sandbox / "a.txt").write_text("hello, world")
+        assert read.invoke({"path": "a.txt"}) == "hello, world"
+        recs = memomod.take_records()
+    assert [r["hit"] for r in recs] == [False, True, False]
+    assert recs[1]["saved_bytes"] == 5
+    st = memomod.stats()
+    assert st["hits"] == 1 and st["misses"] == 2
+
+
+def test_writes_invalidate_and_no_scope_means_no_memo(sandbox):
+    with memomod.scope("s1"):
+        codespace.ls_tool.invoke({"path": "."})
+        codespace.write_file_tool.invoke({"path": "b.txt", "content": "x", "confirm": True})
+        out = codespace.ls_tool.invoke({"path": "."})
+        assert "b.txt" in out
+        assert [r["hit"] for r in memomod.take_records()] == [False, False]
+    assert memomod.stats()["invalidations"] == 1
+    # outside any agent run every call goes to disk
+    codespace.read_file_tool.invoke({"path": "a.txt"})
+    assert memomod.stats()["uncached"] == 1
+
+
+def test_wrapper_attaches_memo_hits_to_tool_events(sandbox, monkeypatch):
+    fake = pytest.importorskip("langchain_core.language_models.fake_chat_models")
+    prebuilt = pytest.importorskip("langgraph.prebuilt")
+    from langchain_core.messages import AIMessage
+    from graph import va_graph
+
+    class Model(fake.GenericFakeChatModel):
+        def bind_tools(self, tools, **kw):
+            return self
+
+    call = lambda i: AIMessage(content="", tool_calls=[{"name": "read_file", "args": {"path": "a.txt"}, "id": f"c{i}"}])
+    model = Model(disable_streaming=True, messages=iter([call(1), call(2), AIMessage(content="done")]))
+    w = va_graph._Wrapper.__new__(va_graph._Wrapper)
+    w._graph = prebuilt.create_react_agent(model, [codespace.read_file_tool])
+
+    res = w.invoke({"session_id": "9", "messages": [{"role": "user", "content": "read a.txt twice"}]})
+    assert res["last_text"] == "done"
+    assert [e["memo"]["hit"] for e in res["tool_events"]] == [False, True]
+    assert res["tool_events"][1]["memo"]["saved_bytes"] == 5
+
+
+def test_git_tools_are_only_memoized_within_a_run(sandbox, monkeypatch):
+    (sandbox / ".git" / "refs" / "heads").mkdir(parents=True)
+    (sandbox / ".git" / "HEAD").write_text("ref: refs/heads/main\n")
+    (sandbox / ".git" / "refs" / "heads" / "main").write_text("abc\n")
+    calls = []
+    monkeypatch.setattr(codespace, "_run", lambda cmd: calls.append(cmd) or f"out {len(calls)}")
+    with memomod.scope("s1"):
+        first = codespace.git_status_tool.invoke({})
+        assert codespace.git_status_tool.invoke({}) == first
+    with memomod.scope("s1"):  # next turn of the same session: the tree may have changed meanwhile
+        assert codespace.git_status_tool.invoke({}) != first
+    assert len(calls) == 2
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from graph.tool_node import ScheduledToolNode, _batches, parse_timeouts
+
+_log = []
+_lock = threading.Lock()
+
+
+def _note(what):
+    with _lock:
+        _log.append(what)
+
+
+@tool("ls")
+def slow_ls(path: str) -> str:
+    """List."""
+    _note(("start", "ls", path))
+    time.sleep(0.2)
+    _note(("end", "ls", path))
+    return f"ls {path}"
+
+
+@tool("write_file")
+def fake_write(path: str) -> str:
+    """Write."""
+    _note(("start", "write_file", path))
+    time.sleep(0.05)
+    _note(("end", "write_file", path))
+    return f"wrote {path}"
+
+
+@tool("git_diff")
+def hung_diff() -> str:
+    """Diff."""
+    time.sleep(1.0)
+    return "diff"
+
+
+def _msg(*calls):
+    return {"messages": [AIMessage(content="", tool_calls=[
+        {"name": name, "args": args, "id": f"c{i}", "type": "tool_call"} for i, (name, args) in enumerate(calls)
+    ])]}
+
+
+def test_batches_split_on_mutating_calls():
+    calls = [{"name": n} for n in ("ls", "read_file", "write_file", "ls", "git_commit", "git_commit")]
+    assert _batches(calls) == [[0, 1], [2], [3], [4], [5]]
+    assert parse_timeouts("git_diff=10, read_file=5,bad=x") == {"git_diff": 10.0, "read_file": 5.0}
+
+
+def test_reads_run_concurrently_writes_are_barriers():
+    _log.clear()
+    node = ScheduledToolNode([slow_ls, fake_write], workers=4)
+    t0 = time.monotonic()
+    out = node.invoke(_msg(("ls", {"path": "a"}), ("ls", {"path": "b"}), ("ls", {"path": "c"}),
+                           ("write_file", {"path": "x"}), ("ls", {"path": "d"})))
+    elapsed = time.monotonic() - t0
+    msgs = out["messages"]
+    assert [m.tool_call_id for m in msgs] == ["c0", "c1", "c2", "c3", "c4"]
+    assert [m.content for m in msgs] == ["ls a", "ls b", "ls c", "wrote x", "ls d"]
+    # three reads together (~0.2s), then the write, then one more read
+    assert elapsed < 0.7
+    i_write = _log.index(("start", "write_file", "x"))
+    assert all(_log.index(("end", "ls", p)) < i_write for p in "abc")
+    assert _log.index(("end", "write_file", "x")) < _log.index(("start", "ls", "d"))
+
+
+def test_timeout_answers_with_error_message():
+    node = ScheduledToolNode([slow_ls, hung_diff], timeout=5, timeouts={"git_diff": 0.1})
+    t0 = time.monotonic()
+    out = node.invoke(_msg(("git_diff", {}), ("ls", {"path": "a"})))
+    assert time.monotonic() - t0 < 0.8
+    diff, ls = out["messages"]
+    assert diff.tool_call_id == "c0" and diff.status == "error" and "timed out" in diff.content
+    assert ls.content == "ls a"
+
+
+def test_async_path_keeps_order_and_times_out():
+    node = ScheduledToolNode([slow_ls, fake_write, hung_diff], workers=2, timeouts={"git_diff": 0.1})
+    out = asyncio.run(node.ainvoke(_msg(("ls", {"path": "a"}), ("git_diff", {}), ("write_file", {"path": "x"}))))
+    msgs = out["messages"]
+    assert [m.tool_call_id for m in msgs] == ["c0", "c1", "c2"]
+    assert msgs[0].content == "ls a" and "timed out" in msgs[1].content and msgs[2].content == "wrote x"
@@ -15,6 +15,7 @@ import subprocess
 import os
 
 from typing import Optional
+from tools import memo as _memo
 
 # Import the helper script if present; we will call it via subprocess for safety.
 GIT_PUSH_HELPER = Path(__file__).resolve().parents[1] / 'tools' / 'git_push.py'
@@ -41,11 +42,15 @@ def ls_tool(path: Optional[str] = ".") -> str:
             return f"Not found: {p}"
         if p.is_file():
             return f"FILE {p.relative_to(PROJECT_ROOT)} size={p.stat().st_size}"
-        items = []
-        for child in sorted(p.iterdir()):
-            kind = "DIR" if child.is_dir() else "FILE"
-            items.append(f"{kind}\t{child.relative_to(PROJECT_ROOT)}")
-        return "\n".join(items) or "(empty)"
+
+        def _list() -> str:
+            items = []
+            for child in sorted(p.iterdir()):
+                kind = "DIR" if child.is_dir() else "FILE"
+                items.append(f"{kind}\t{child.relative_to(PROJECT_ROOT)}")
+            return "\n".join(items) or "(empty)"
+        # a directory's mtime changes when entries are added or removed
+        return _memo.cached("ls", (str(p),), _memo.stat_token(p), _list)
     except Exception as e:
         return f"ls error: {e}"
 
@@ -62,8 +67,8 @@ def read_file_tool(path: str, start: int = 0, end: int = 200000) -> str:
         p = _safe_resolve(path)
         if not p.exists() or not p.is_file():
             return f"Not a file: {p}"
-        data = p.read_text(errors="replace")
-        return data[start:end]
+        return _memo.cached("read_file", (str(p), start, end), _memo.stat_token(p),
+                            lambda: p.read_text(errors="replace")[start:end])
     except Exception as e:
         return f"read_file error: {e}"
 
@@ -91,6 +96,7 @@ def write_file_tool(path: str, content: str, confirm: bool = False, create_dirs:
             # Dry-run preview (basic)
             return f"DRY_RUN: would write {len(content)} bytes to {p.relative_to(PROJECT_ROOT)}\nUse confirm=True to persist."
         p.write_text(content)
+        _memo.invalidate()
         return f"WROTE {len(content)} bytes to {p.relative_to(PROJECT_ROOT)}"
     except Exception as e:
         return f"write_file error: {e}"
@@ -110,13 +116,14 @@ def _run(cmd: str) -> str:
 @tool("git_status")
 def git_status_tool() -> str:
     """Show git status (porcelain + branch)."""
-    return _run("git status --porcelain=v1 -b")
+    return _memo.cached("git_status", (), _memo.git_token(PROJECT_ROOT),
+                        lambda: _run("git status --porcelain=v1 -b"), per_run=True)
 
 
 @tool("git_diff")
 def git_diff_tool() -> str:
     """Show git diff (unstaged)."""
-    return _run("git diff")
+    return _memo.cached("git_diff", (), _memo.git_token(PROJECT_ROOT), lambda: _run("git diff"), per_run=True)
 
 
 class CommitArgs(BaseModel):
@@ -136,6 +143,7 @@ def git_commit_tool(message: str, add_all: bool = True, confirm: bool = False) -
     out = []
     for c in cmds:
         out.append(_run(c))
+    _memo.invalidate()
     return "\n\n".join(out)
 
 
@@ -0,0 +1,207 @@
+"""Memoization for the read-only codespace tools.
+
+Within one agent run (or one session) the model often calls `ls`,
+`read_file`, `git_status` and `git_diff` on the same arguments several
+times; each call re-reads the file or forks git. Results are kept per scope
+(the session id by default) together with a validity token:
+
+  - `ls` / `read_file`: the path's mtime and size, so an edited file is
+    re-read;
+  - `git_status` / `git_diff`: HEAD and the current branch ref plus a
+    global write generation that `write_file` and `git_commit` bump via
+    `invalidate()`. These tokens can't see working-tree edits made outside
+    the agent (an editor, an ops task, another replica), so the git tools
+    are only memoized within one run (`per_run=True`), never across a
+    session's turns.
+
+Entries also expire after TOOL_MEMO_TTL seconds, which bounds staleness
+from edits made outside the agent. The agent wrapper opens a scope around
+each run (`scope()`), and `take_records()` returns per-call hit/miss records
+so they can be attached to the turn's tool events.
+
+Environment:
+  - TOOL_MEMO (default 1): set 0 to disable
+  - TOOL_MEMO_SCOPE (default session): session | run
+  - TOOL_MEMO_TTL (default 60): seconds an entry stays valid
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_MAX_SCOPES = 256
+_MAX_ENTRIES = 256
+
+_current: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("vme_tool_memo_scope", default=None)
+_run: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("vme_tool_memo_run", default=None)
+
+
+class _Scope:
+    __slots__ = ("entries", "records")
+
+    def __init__(self):
+        self.entries: "OrderedDict[Tuple, Tuple[Any, str, float]]" = OrderedDict()
+        self.records: List[Dict[str, Any]] = []
+
+
+class ToolMemo:
+    def __init__(self, ttl: float = 60.0, per_run: bool = False):
+        self.ttl = ttl
+        self.per_run = per_run
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._scopes: "OrderedDict[str, _Scope]" = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "uncached": 0, "saved_bytes": 0, "invalidations": 0}
+
+    @contextmanager
+    def scope(self, key: Any):
+        """Memoize tool calls made inside this block under `key`."""
+        run = f"run:{uuid.uuid4().hex}"
+        name = run if self.per_run or key in (None, "") else f"session:{key}"
+        token = _current.set(name)
+        run_token = _run.set(run)
+        try:
+            yield name
+        finally:
+            try:
+                _run.reset(run_token)
+                _current.reset(token)
+            except ValueError:
+                pass  # exited from another context (e.g. a closed async generator)
+            with self._lock:
+                self._scopes.pop(run, None)
+
+    def _scope(self, name: str) -> _Scope:
+        # caller holds self._lock
+        sc = self._scopes.get(name)
+        if sc is None:
+            sc = self._scopes[name] = _Scope()
+            while len(self._scopes) > _MAX_SCOPES:
+                self._scopes.popitem(last=False)
+        self._scopes.move_to_end(name)
+        return sc
+
+    def cached(self, tool: str, args: Tuple, token: Any, compute: Callable[[], str], per_run: bool = False) -> str:
+        """compute() once per (tool, args) while `token` is unchanged; per_run keeps it to the current run."""
+        name = _current.get()
+        store = _run.get() if per_run else name
+        if name is None or token is None:
+            if name is not None:
+                self._record(name, tool, False, 0)
+            with self._lock:
+                self._stats["uncached"] += 1
+            return compute()
+        key = (tool,) + tuple(args)
+        now = time.time()
+        with self._lock:
+            hit = self._scope(store).entries.get(key)
+        if hit is not None and hit[0] == token and now - hit[2] <= self.ttl:
+            with self._lock:
+                self._stats["hits"] += 1
+                self._stats["saved_bytes"] += len(hit[1])
+            self._record(name, tool, True, len(hit[1]))
+            return hit[1]
+        out = compute()
+        with self._lock:
+            entries = self._scope(store).entries
+            entries[key] = (token, out, now)
+            entries.move_to_end(key)
+            while len(entries) > _MAX_ENTRIES:
+                entries.popitem(last=False)
+            self._stats["misses"] += 1
+        self._record(name, tool, False, 0)
+        return out
+
+    def _record(self, name: str, tool: str, hit: bool, saved: int):
+        with self._lock:
+            self._scope(name).records.append({"tool": tool, "hit": hit, "saved_bytes": saved})
+
+    def take_records(self) -> List[Dict[str, Any]]:
+        """Hit/miss records of the current scope since the last call, in call order."""
+        name = _current.get()
+        if name is None:
+            return []
+        with self._lock:
+            sc = self._scopes.get(name)
+            if sc is None:
+                return []
+            out, sc.records = sc.records, []
+        return out
+
+    def invalidate(self):
+        """A write happened: drop memoized results everywhere."""
+        with self._lock:
+            self.generation += 1
+            for sc in self._scopes.values():
+                sc.entries.clear()
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(scopes=len(self._scopes), generation=self.generation, ttl=self.ttl,
+                       scope="run" if self.per_run else "session")
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / total, 4) if total else None
+        return out
+
+
+def stat_token(p: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = p.stat()
+        return (st.st_mtime_ns, st.st_size)
+    except Exception:
+        return None
+
+
+def git_token(root: Path) -> Optional[Tuple]:
+    # Not the index: `git status` itself rewrites it. The current branch ref
+    # moves on commits made outside the agent.
+    git = root / ".git"
+    try:
+        head = (git / "HEAD").read_text().strip()
+    except Exception:
+        return None
+    ref = stat_token(git / head[5:].strip()) if head.startswith("ref:") else head
+    return (memo.generation, head, ref)
+
+
+_ENABLED = os.getenv("TOOL_MEMO", "1").lower() not in ("0", "false", "no", "off")
+memo = ToolMemo(
+    ttl=float(os.getenv("TOOL_MEMO_TTL", "60")),
+    per_run=os.getenv("TOOL_MEMO_SCOPE", "session").lower() == "run",
+)
+
+
+@contextmanager
+def scope(key: Any):
+    if not _ENABLED:
+        yield None
+        return
+    with memo.scope(key) as name:
+        yield name
+
+
+def cached(tool: str, args: Tuple, token: Any, compute: Callable[[], str], per_run: bool = False) -> str:
+    return memo.cached(tool, args, token, compute, per_run=per_run)
+
+
+def invalidate():
+    memo.invalidate()
+
+
+def take_records() -> List[Dict[str, Any]]:
+    return memo.take_records()
+
+
+def stats() -> Dict[str, Any]:
+    out = memo.stats()
+    out["enabled"] = _ENABLED
+    return out
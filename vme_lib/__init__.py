@@ -4,4 +4,6 @@ This mirrors the original `lib/` package but uses a different top-level
 name to avoid packaging/ignore issues on some PaaS platforms.
 """
 
-__all__ = ["supabase_client"]
+__all__ = ["supabase_client", "supabase_async", "settings_sync", "sqlite_store", "pagination", "governor",
+           "session_lanes", "event_bus",
+           "event_fanout"]
@@ -0,0 +1,140 @@
+"""In-process publish/subscribe for live events (Ops task events).
+
+Producers (Ops worker threads, async handlers) call `publish(topic, event)`
+after the event has been stored. Each subscriber owns a bounded asyncio
+queue on its own event loop. Events are handed over with
+`call_soon_threadsafe`, or put directly when published on that loop, so
+delivery doesn't wait on a database round trip or a poll interval.
+
+A subscriber that falls more than `buffer` events behind is not allowed to
+hold events back or grow without bound. Further events for it are dropped
+and its `overflowed` flag is set. The consumer clears the flag and catches
+up from storage by event id (see `routes.ops.task_stream`), then continues
+with live events.
+
+Environment:
+  - OPS_BUS_BUFFER (default 256): per-subscriber queue size, see routes.ops
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, Optional, Set
+
+
+class Subscription:
+    __slots__ = ("topic", "queue", "loop", "overflowed", "dropped")
+
+    def __init__(self, topic: Hashable, buffer: int, loop: asyncio.AbstractEventLoop):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer))
+        self.loop = loop
+        self.overflowed = False
+        self.dropped = 0
+
+    def _put(self, event: Any) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.dropped += 1
+            return False
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """The next event, or None after `timeout` seconds (or on overflow, so the caller can catch up)."""
+        if self.overflowed:
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def drain(self) -> list:
+        out = []
+        while not self.queue.empty():
+            out.append(self.queue.get_nowait())
+        return out
+
+
+class EventBus:
+    def __init__(self, name: str, buffer: int = 256):
+        self.name = name
+        self.buffer = buffer
+        self._lock = threading.Lock()
+        self._subs: Dict[Hashable, Set[Subscription]] = {}
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0, "overflows": 0, "subscribed": 0}
+        self._lat_ms: list = []
+
+    @contextmanager
+    def subscribe(self, topic: Hashable, buffer: Optional[int] = None) -> Iterator[Subscription]:
+        """Receive events for `topic` on the running loop for the duration of the block."""
+        sub = Subscription(topic, buffer or self.buffer, asyncio.get_running_loop())
+        with self._lock:
+            self._subs.setdefault(topic, set()).add(sub)
+            self._stats["subscribed"] += 1
+        try:
+            yield sub
+        finally:
+            with self._lock:
+                subs = self._subs.get(topic)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[topic]
+
+    def has_subscribers(self, topic: Hashable) -> bool:
+        with self._lock:
+            return bool(self._subs.get(topic))
+
+    def publish(self, topic: Hashable, event: Any) -> int:
+        """Hand `event` to every subscriber of `topic`, from any thread. Returns the subscriber count."""
+        with self._lock:
+            subs = list(self._subs.get(topic) or ())
+            self._stats["published"] += 1
+        if not subs:
+            return 0
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        t0 = time.perf_counter()
+        for sub in subs:
+            if sub.loop is current:
+                self._deliver(sub, event, t0)
+            else:
+                try:
+                    sub.loop.call_soon_threadsafe(self._deliver, sub, event, t0)
+                except RuntimeError:
+                    pass  # loop closed; its subscription is going away
+        return len(subs)
+
+    def _deliver(self, sub: Subscription, event: Any, t0: float):
+        was_overflowed = sub.overflowed
+        if sub.overflowed:
+            sub.dropped += 1
+            ok = False
+        else:
+            ok = sub._put(event)
+        with self._lock:
+            if ok:
+                self._stats["delivered"] += 1
+                self._lat_ms.append((time.perf_counter() - t0) * 1000.0)
+                if len(self._lat_ms) > 512:
+                    del self._lat_ms[:256]
+            else:
+                self._stats["dropped"] += 1
+                if not was_overflowed:
+                    self._stats["overflows"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            lat = sorted(self._lat_ms)
+            out.update(name=self.name, buffer=self.buffer, topics=len(self._subs),
+                       subscribers=sum(len(s) for s in self._subs.values()),
+                       deliver_ms_p50=round(lat[len(lat) // 2], 3) if lat else None,
+                       deliver_ms_p95=round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 3) if lat else None)
+        return out
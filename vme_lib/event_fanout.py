@@ -0,0 +1,251 @@
+"""Cross-replica fan-out for event bus topics (Ops task events).
+
+`vme_lib.event_bus` only reaches subscribers in the same process. With
+several replicas, the worker running a task and the replica serving its
+`/ops/tasks/{id}/stream` can differ. A `Fanout` publishes each event to the
+local bus directly and also sends it to the other replicas over a broadcast
+transport. A receiver thread on every replica publishes incoming events to
+its own bus. Each replica skips its own messages, which it has already
+delivered.
+
+The threads run between `start()` and `stop()` (app startup/shutdown, see
+main.py); outside that window `publish` only reaches the local bus.
+Sending happens on a background thread with a bounded queue, so producers
+never wait on the network. A transport error drops the message rather than
+blocking. Events are stored before they are published. While fan-out is
+running, streams only read storage when they subscribe or fall behind. When
+it is not running, or the receiver has hit an error since the last check
+(`missed()`), they catch up from storage on their idle ticks.
+
+Transports:
+  - RedisTransport: Redis PUBLISH/SUBSCRIBE on one channel (redis-py).
+  - MemoryTransport: in-process stand-in for tests and single-node runs;
+    transports created with the same `peers` list reach each other.
+
+Environment:
+  - OPS_EVENTS_FANOUT (default auto): auto | redis | memory | off
+    (auto = redis when a Redis URL is set)
+  - OPS_EVENTS_REDIS_URL, else REDIS_URL
+  - OPS_EVENTS_CHANNEL (default vme2:ops:events)
+"""
+from __future__ import annotations
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+try:
+    import redis as _redis
+except Exception:
+    _redis = None
+
+CHANNEL = "vme2:ops:events"
+
+
+class MemoryTransport:
+    """Broadcast between transports sharing one `peers` list."""
+
+    name = "memory"
+
+    def __init__(self, peers: Optional[List["MemoryTransport"]] = None):
+        self._peers = peers if peers is not None else []
+        self._peers.append(self)
+        self._inbox: "queue.Queue[str]" = queue.Queue()
+
+    def send(self, data: str):
+        for p in list(self._peers):
+            p._inbox.put(data)
+
+    def receive(self, timeout: float) -> Optional[str]:
+        try:
+            return self._inbox.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        try:
+            self._peers.remove(self)
+        except ValueError:
+            pass
+
+
+class RedisTransport:
+    """PUBLISH / SUBSCRIBE on one Redis channel."""
+
+    name = "redis"
+
+    def __init__(self, url: str = "", channel: str = CHANNEL, client: Any = None):
+        if client is None:
+            if _redis is None:
+                raise RuntimeError("redis not installed")
+            client = _redis.Redis.from_url(url, socket_connect_timeout=5, health_check_interval=30)
+        self._client = client
+        self.channel = channel
+        self._pubsub = None
+
+    def send(self, data: str):
+        self._client.publish(self.channel, data)
+
+    def receive(self, timeout: float) -> Optional[str]:
+        try:
+            if self._pubsub is None:
+                ps = self._client.pubsub(ignore_subscribe_messages=True)
+                ps.subscribe(self.channel)
+                self._pubsub = ps
+            msg = self._pubsub.get_message(timeout=timeout)
+        except Exception:
+            self._reset()
+            raise
+        if not msg or msg.get("type") != "message":
+            return None
+        data = msg.get("data")
+        return data.decode("utf-8") if isinstance(data, bytes) else data
+
+    def _reset(self):
+        ps, self._pubsub = self._pubsub, None
+        if ps is not None:
+            try:
+                ps.close()
+            except Exception:
+                pass
+
+    def close(self):
+        self._reset()
+
+
+def make_transport(mode: str | None = None, channel: str | None = None):
+    """Pick a transport from OPS_EVENTS_FANOUT, or None for local delivery only."""
+    mode = (mode or os.getenv("OPS_EVENTS_FANOUT", "auto")).strip().lower()
+    if mode in ("off", "0", "false", "no"):
+        return None
+    if mode == "memory":
+        return MemoryTransport()
+    url = os.getenv("OPS_EVENTS_REDIS_URL") or os.getenv("REDIS_URL")
+    if mode in ("auto", "redis") and url and _redis is not None:
+        try:
+            return RedisTransport(url, channel or os.getenv("OPS_EVENTS_CHANNEL", CHANNEL))
+        except Exception:
+            return None
+    return None
+
+
+class Fanout:
+    def __init__(self, bus, transport=None, node: Optional[str] = None, max_pending: int = 10000):
+        self.bus = bus
+        self.transport = transport
+        self.node = node or uuid.uuid4().hex[:12]
+        self._out: "queue.Queue[str]" = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._lag_ms: Deque[float] = deque(maxlen=512)
+        self._stats = {"sent": 0, "received": 0, "dropped": 0, "send_errors": 0, "receive_errors": 0}
+        self.last_error: Optional[str] = None
+
+    def publish(self, topic: Hashable, event: Any) -> int:
+        """Deliver to this process's subscribers now and queue the event for the other replicas."""
+        n = self.bus.publish(topic, event)
+        if self.transport is not None and self._threads and not self._stop.is_set():
+            data = json.dumps({"n": self.node, "t": topic, "ts": time.time(), "e": event}, default=str)
+            try:
+                self._out.put_nowait(data)
+            except queue.Full:
+                with self._lock:
+                    self._stats["dropped"] += 1
+        return n
+
+    def start(self):
+        """Start the send/receive threads (app startup). Until then, and after `stop()`, events stay local."""
+        if self.transport is None or self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._send_loop, name="vme-fanout-send", daemon=True),
+                             threading.Thread(target=self._receive_loop, name="vme-fanout-recv", daemon=True)]
+            for t in self._threads:
+                t.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self.transport is not None:
+            try:
+                self.transport.close()
+            except Exception:
+                pass
+        threads, self._threads = self._threads, []
+        for t in threads:
+            t.join(timeout)
+
+    def running(self) -> bool:
+        """Whether events from other replicas are being received."""
+        return (self.transport is not None and not self._stop.is_set()
+                and any(t.is_alive() for t in self._threads))
+
+    def missed(self) -> int:
+        """Receive errors so far; a change means events from other replicas may have been missed."""
+        with self._lock:
+            return self._stats["receive_errors"]
+
+    def _error(self, key: str, e: Exception):
+        with self._lock:
+            self._stats[key] += 1
+            self.last_error = str(e)[:200]
+
+    def _send_loop(self):
+        while not self._stop.is_set():
+            try:
+                data = self._out.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.transport.send(data)
+                with self._lock:
+                    self._stats["sent"] += 1
+            except Exception as e:
+                self._error("send_errors", e)
+
+    def _receive_loop(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                data = self.transport.receive(1.0)
+                failures = 0
+            except Exception as e:
+                self._error("receive_errors", e)
+                failures += 1
+                self._stop.wait(min(30.0, 0.5 * (2 ** min(failures, 6))))
+                continue
+            if data is None:
+                continue
+            try:
+                msg = json.loads(data)
+            except Exception:
+                continue
+            if not isinstance(msg, dict) or msg.get("n") == self.node:
+                continue  # our own message, already delivered locally
+            with self._lock:
+                self._stats["received"] += 1
+                if isinstance(msg.get("ts"), (int, float)):
+                    self._lag_ms.append(max(0.0, (time.time() - msg["ts"]) * 1000.0))
+            try:
+                self.bus.publish(msg.get("t"), msg.get("e"))
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            lag = sorted(self._lag_ms)
+            out.update(transport=getattr(self.transport, "name", None), node=self.node,
+                       running=any(t.is_alive() for t in self._threads), pending=self._out.qsize(),
+                       last_error=self.last_error,
+                       lag_ms_p50=round(lag[len(lag) // 2], 2) if lag else None,
+                       lag_ms_p95=round(lag[min(len(lag) - 1, int(len(lag) * 0.95))], 2) if lag else None)
+        return out
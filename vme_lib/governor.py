@@ -0,0 +1,115 @@
+"""Bounded concurrency with a wait-queue deadline for async routes.
+
+A `Governor` admits at most `limit` requests at once. Further requests wait
+in FIFO order for up to `max_wait` seconds (and at most `max_queue` of them
+wait at all); past that they are rejected with `Overloaded`, which routes
+turn into 503 + Retry-After rather than letting work pile up behind a slow
+upstream. Retry-After is estimated from the recent hold time of a slot.
+
+All bookkeeping happens on the event loop, so no locks are needed; a
+governor is meant to be used from one loop (one per worker process).
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"overloaded; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Governor:
+    def __init__(self, name: str, limit: int = 8, max_wait: float = 10.0, max_queue: int = 64):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._waits_ms: Deque[float] = deque(maxlen=512)
+        self._hold_s = 1.0  # EWMA of slot hold time, seeds the Retry-After estimate
+        self._stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def retry_after(self) -> int:
+        est = self._hold_s * (len(self._waiters) + 1) / self.limit
+        return max(1, min(60, math.ceil(est)))
+
+    async def acquire(self) -> float:
+        """Take a slot, waiting up to max_wait. Returns seconds spent waiting."""
+        t0 = time.monotonic()
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            self._admitted(0.0)
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self._stats["rejected_full"] += 1
+            raise Overloaded(self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                fut.cancel()
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._stats["rejected_timeout"] += 1
+            raise Overloaded(self.retry_after()) from None
+        waited = time.monotonic() - t0
+        self._admitted(waited)
+        return waited
+
+    def release(self):
+        # hand the slot straight to the oldest live waiter, keeping in_flight as is
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._in_flight = max(0, self._in_flight - 1)
+
+    def _admitted(self, waited: float):
+        self._stats["admitted"] += 1
+        self._waits_ms.append(waited * 1000.0)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_s = 0.8 * self._hold_s + 0.2 * (time.monotonic() - t0)
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        out: Dict[str, Any] = dict(self._stats)
+        out.update(
+            name=self.name,
+            limit=self.limit,
+            max_wait_s=self.max_wait,
+            max_queue=self.max_queue,
+            in_flight=self._in_flight,
+            waiting=len(self._waiters),
+            hold_s_avg=round(self._hold_s, 3),
+            wait_ms_avg=round(sum(waits) / len(waits), 2) if waits else None,
+            wait_ms_p95=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+            wait_ms_max=round(waits[-1], 2) if waits else None,
+        )
+        return out
@@ -0,0 +1,232 @@
+"""In-process LRU cache of each session's most recent messages.
+
+`/agent/messages`, `/api/threads/{id}/messages` and the Show Me window's
+polling read the same short history over and over. The cache keeps the latest
+window of messages per session, filled on the first read and then kept
+current write-through: every row the message logger stores (see
+`supabase_client.add_write_listener`) is appended to its session's window, so
+repeat reads are answered without a query. Pages inside the window, older or
+newer, are served from it too; anything else falls through to the database.
+
+A window always holds a contiguous run of the newest messages. Rows written
+by another process don't pass through this one, so entries also expire after
+HISTORY_CACHE_TTL seconds. Title changes invalidate the session's entry.
+
+Environment:
+  - HISTORY_CACHE (default 1): set 0 to disable
+  - HISTORY_CACHE_MAX_ENTRIES (default 20000): messages held across sessions
+  - HISTORY_CACHE_MAX_BYTES (default 16 MiB): approximate payload bytes held
+  - HISTORY_CACHE_PER_SESSION (default 500): window size per session
+  - HISTORY_CACHE_TTL (default 300): seconds before an entry is refetched
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from vme_lib import pagination as _pg
+from vme_lib import supabase_client as _sb
+
+_ROW_OVERHEAD = 96  # rough per-row cost of the dict and its small fields
+
+
+def _row_bytes(row: Dict[str, Any]) -> int:
+    return _ROW_OVERHEAD + len((row.get("content") or "").encode("utf-8", "ignore"))
+
+
+class _Entry:
+    __slots__ = ("rows", "complete", "bytes", "loaded_at")
+
+    def __init__(self, rows: List[Dict[str, Any]], complete: bool):
+        self.rows = rows              # ascending by id
+        self.complete = complete      # window holds the session's whole history
+        self.bytes = sum(_row_bytes(r) for r in rows)
+        self.loaded_at = time.time()
+
+
+class HistoryCache:
+    def __init__(self, max_entries: int = 20000, max_bytes: int = 16 << 20,
+                 per_session: int = 500, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.per_session = per_session
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[int, _Entry]" = OrderedDict()
+        # per-session write counter, so a fill that raced a write is dropped
+        self._versions: "OrderedDict[int, int]" = OrderedDict()
+        self._entries = 0
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "fills": 0, "appends": 0,
+                       "evictions": 0, "invalidations": 0, "expired": 0}
+
+    # ---- reads ----
+    def page(self, session_id: int, limit: int, before: Optional[int] = None,
+             after: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Serve a keyset page (same shape as `pagination.fetch_page`) or None on a miss."""
+        with self._lock:
+            e = self._data.get(session_id)
+            if e is not None and time.time() - e.loaded_at > self.ttl:
+                self._drop(session_id)
+                self._stats["expired"] += 1
+                e = None
+            out = self._page(e, limit, before, after) if e is not None else None
+            if out is None:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(session_id)
+            self._stats["hits"] += 1
+        return out
+
+    @staticmethod
+    def _page(e: _Entry, limit: int, before: Optional[int], after: Optional[int]) -> Optional[Dict[str, Any]]:
+        rows = e.rows
+        if after is not None:
+            # every row newer than `after` must be inside the window
+            if not e.complete and (not rows or after < rows[0]["id"]):
+                return None
+            newer = [r for r in rows if r["id"] > after]
+            page = newer[:limit]
+            has_newer = len(newer) > limit
+            has_older = bool(page)
+        else:
+            older = rows if before is None else [r for r in rows if r["id"] < before]
+            if len(older) < limit and not e.complete:
+                return None
+            page = older[-limit:]
+            has_older = len(older) > limit or not e.complete
+            has_newer = before is not None and bool(page)
+        page = [dict(r) for r in reversed(page)]
+        return {
+            "rows": page,
+            "next_cursor": _pg.encode_cursor(page[-1]["id"]) if has_older and page else None,
+            "prev_cursor": _pg.encode_cursor(page[0]["id"]) if has_newer and page else None,
+        }
+
+    # ---- writes ----
+    def version(self, session_id: int) -> int:
+        with self._lock:
+            return self._versions.get(session_id, 0)
+
+    def fill(self, session_id: int, rows_desc: List[Dict[str, Any]], complete: bool, version: int):
+        """Install the newest page read from the database (rows newest first)."""
+        rows = [dict(r) for r in reversed(rows_desc)][-self.per_session:]
+        with self._lock:
+            if self._versions.get(session_id, 0) != version:
+                return  # a message was written while we were reading
+            self._drop(session_id)
+            e = _Entry(rows, complete)
+            self._data[session_id] = e
+            self._entries += len(rows)
+            self._bytes += e.bytes
+            self._stats["fills"] += 1
+            self._evict()
+
+    def on_written(self, table: str, rows: List[Dict[str, Any]]):
+        """Write-through hook for rows stored by the message logger."""
+        if table != "va_messages":
+            return
+        with self._lock:
+            for r in rows:
+                sid = r.get("session_id") if isinstance(r, dict) else None
+                if sid is None or r.get("id") is None:
+                    continue
+                self._versions[sid] = self._versions.get(sid, 0) + 1
+                self._versions.move_to_end(sid)
+                e = self._data.get(sid)
+                if e is None:
+                    continue
+                if e.rows and r["id"] <= e.rows[-1]["id"]:
+                    self._drop(sid)  # out of order; refetch rather than guess
+                    continue
+                e.rows.append(dict(r))
+                b = _row_bytes(r)
+                e.bytes += b
+                self._entries += 1
+                self._bytes += b
+                self._stats["appends"] += 1
+                while len(e.rows) > self.per_session:
+                    old = e.rows.pop(0)
+                    ob = _row_bytes(old)
+                    e.bytes -= ob
+                    self._entries -= 1
+                    self._bytes -= ob
+                    e.complete = False
+            while len(self._versions) > 4 * max(1, len(self._data)) + 1024:
+                self._versions.popitem(last=False)
+            self._evict()
+
+    def invalidate(self, session_id: int):
+        with self._lock:
+            if self._drop(session_id):
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+            self._entries = 0
+            self._bytes = 0
+
+    def _drop(self, session_id: int) -> bool:
+        e = self._data.pop(session_id, None)
+        if e is None:
+            return False
+        self._entries -= len(e.rows)
+        self._bytes -= e.bytes
+        return True
+
+    def _evict(self):
+        while self._data and (self._entries > self.max_entries or self._bytes > self.max_bytes):
+            sid, _ = next(iter(self._data.items()))
+            self._drop(sid)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats)
+            out.update(sessions=len(self._data), entries=self._entries, bytes=self._bytes,
+                       max_entries=self.max_entries, max_bytes=self.max_bytes)
+        total = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / total, 4) if total else None
+        return out
+
+
+_ENABLED = os.getenv("HISTORY_CACHE", "1").lower() not in ("0", "false", "no", "off")
+cache = HistoryCache(
+    max_entries=int(os.getenv("HISTORY_CACHE_MAX_ENTRIES", "20000")),
+    max_bytes=int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(16 << 20))),
+    per_session=int(os.getenv("HISTORY_CACHE_PER_SESSION", "500")),
+    ttl=float(os.getenv("HISTORY_CACHE_TTL", "300")),
+)
+_sb.add_write_listener(cache.on_written)
+_sb.add_session_listener(cache.invalidate)
+
+
+def history_page(sb, session_id: int, limit: int, before: Optional[int] = None,
+                 after: Optional[int] = None) -> Dict[str, Any]:
+    """A keyset page of a session's messages (newest first), from the cache when possible."""
+    sid = int(session_id)
+    if _ENABLED and limit <= cache.per_session:
+        hit = cache.page(sid, limit, before, after)
+        if hit is not None:
+            return hit
+        version = cache.version(sid)
+    page = _pg.fetch_page(sb.table("va_messages").select("*").eq("session_id", sid), limit,
+                          before=before, after=after)
+    if _ENABLED and limit <= cache.per_session and before is None and after is None:
+        cache.fill(sid, page["rows"], complete=page["next_cursor"] is None, version=version)
+    return page
+
+
+def invalidate(session_id: int):
+    cache.invalidate(int(session_id))
+
+
+def stats() -> Dict[str, Any]:
+    out = cache.stats()
+    out["enabled"] = _ENABLED
+    return out
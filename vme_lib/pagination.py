@@ -0,0 +1,76 @@
+"""Keyset (cursor) pagination on bigint `id` columns.
+
+Offset paging (`.range((page-1)*size, ...)`) makes the database walk and
+discard every earlier row, so deep pages get slower as tables grow. A keyset
+page instead filters on the last id seen (`id < cursor` / `id > cursor`) and
+is served from the primary-key index in O(page) time wherever it starts.
+
+Cursors are opaque to clients. Every paged route uses the same convention:
+  - `next_cursor` walks towards older rows; send it back as `before=`
+  - `prev_cursor` walks towards newer rows; send it back as `after=`
+Either is None when there is nothing further in that direction.
+"""
+from __future__ import annotations
+
+import base64
+from typing import Any, Dict, List, Optional
+
+# PostgREST count methods; "estimated" is exact for small tables and a
+# planner estimate for large ones, "none" skips counting entirely.
+COUNT_MODES = ("exact", "planned", "estimated", "none")
+
+
+def encode_cursor(value: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{int(value)}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Decode a cursor from `encode_cursor`. Raises ValueError if it is malformed."""
+    if cursor is None or cursor == "":
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        kind, _, value = raw.partition(":")
+        if kind != "id":
+            raise ValueError(cursor)
+        return int(value)
+    except Exception:
+        raise ValueError(f"invalid cursor: {cursor!r}")
+
+
+def fetch_page(query, limit: int, before: Optional[int] = None, after: Optional[int] = None,
+               key: str = "id") -> Dict[str, Any]:
+    """Run `query` (a filtered, unordered select) for one keyset page.
+
+    Returns {"rows", "next_cursor", "prev_cursor"} with rows newest first.
+    One extra row is fetched to learn whether another page exists.
+    """
+    limit = max(1, int(limit))
+    if after is not None:
+        rows: List[Dict[str, Any]] = query.gt(key, after).order(key).limit(limit + 1).execute().data or []
+        has_newer = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        has_older = bool(rows)
+    else:
+        if before is not None:
+            query = query.lt(key, before)
+        rows = query.order(key, desc=True).limit(limit + 1).execute().data or []
+        has_older = len(rows) > limit
+        rows = rows[:limit]
+        has_newer = before is not None and bool(rows)
+    return {
+        "rows": rows,
+        "next_cursor": encode_cursor(rows[-1][key]) if has_older and rows else None,
+        "prev_cursor": encode_cursor(rows[0][key]) if has_newer and rows else None,
+    }
+
+
+def count_rows(sb, table: str, mode: str = "estimated", **eq: Any) -> Optional[int]:
+    """Row count for `table` (optionally filtered by equality), or None for mode "none"."""
+    if not mode or mode == "none":
+        return None
+    q = sb.table(table).select("id", count=mode)
+    for col, val in eq.items():
+        q = q.eq(col, val)
+    return getattr(q.limit(1).execute(), "count", None)
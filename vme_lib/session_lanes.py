@@ -0,0 +1,200 @@
+"""Per-session ordering and de-duplication of agent turns.
+
+The coding panel can fire overlapping `/agent/chat` or `/agent/stream`
+requests for one session (double-click, reconnect). Each used to run a full
+agent turn and log its messages interleaved with the other's. A
+`SessionLanes` instance gives every session a lane:
+
+  - turns of one session run one at a time, in arrival order (FIFO
+    hand-off, as in `vme_lib.governor`); turns of different sessions don't
+    wait for each other;
+  - an identical submission (same session, kind and message) arriving while
+    the first is queued or running doesn't start another turn. `run()`
+    callers share the first call's result. `follow()` callers share its
+    event stream, replayed from the start.
+
+The shared execution runs in its own task, so one caller going away
+doesn't cancel it for the others. A shared stream is cancelled once its
+last follower has gone. A turn that waits longer than `max_wait` for its
+lane raises `Overloaded`.
+
+Like the governor, everything runs on the event loop and needs no locks.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from vme_lib.governor import Overloaded
+
+
+class _Lane:
+    __slots__ = ("busy", "waiters")
+
+    def __init__(self):
+        self.busy = False
+        self.waiters: Deque[asyncio.Future] = deque()
+
+
+class _Flight:
+    """One shared execution: a task plus, for streams, its events so far."""
+
+    __slots__ = ("task", "events", "queues", "done")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Future] = None
+        self.events: list = []
+        self.queues: Set[asyncio.Queue] = set()
+        self.done = False
+
+    def publish(self, ev: Any):
+        self.events.append(ev)
+        for q in self.queues:
+            q.put_nowait(ev)
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue()
+        for ev in self.events:
+            q.put_nowait(ev)
+        self.queues.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        self.queues.discard(q)
+        if not self.queues and not self.done and self.task is not None:
+            self.task.cancel()  # nobody is listening any more
+
+
+class SessionLanes:
+    def __init__(self, name: str, max_wait: float = 120.0):
+        self.name = name
+        self.max_wait = max_wait
+        self._lanes: Dict[str, _Lane] = {}
+        self._flights: Dict[Tuple[str, str, str], _Flight] = {}
+        self._waits_ms: Deque[float] = deque(maxlen=512)
+        self._stats = {"turns": 0, "queued": 0, "coalesced": 0, "rejected_timeout": 0}
+
+    # ---- ordering ----
+    async def _enter(self, sid: str):
+        lane = self._lanes.setdefault(sid, _Lane())
+        t0 = time.monotonic()
+        if not lane.busy and not lane.waiters:
+            lane.busy = True
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            lane.waiters.append(fut)
+            self._stats["queued"] += 1
+            try:
+                await asyncio.wait_for(asyncio.shield(fut), self.max_wait)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if fut.done() and not fut.cancelled():
+                    self._leave(sid)  # handed over just as we gave up; pass it on
+                else:
+                    fut.cancel()
+                    try:
+                        lane.waiters.remove(fut)
+                    except ValueError:
+                        pass
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self._stats["rejected_timeout"] += 1
+                raise Overloaded(max(1, int(self.max_wait))) from None
+        self._stats["turns"] += 1
+        self._waits_ms.append((time.monotonic() - t0) * 1000.0)
+
+    def _leave(self, sid: str):
+        lane = self._lanes.get(sid)
+        if lane is None:
+            return
+        while lane.waiters:
+            fut = lane.waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        lane.busy = False
+        del self._lanes[sid]
+
+    @asynccontextmanager
+    async def lane(self, session_id: Any):
+        """Hold the session's lane for the block (no-op without a session id)."""
+        sid = str(session_id or "")
+        if not sid:
+            yield
+            return
+        await self._enter(sid)
+        try:
+            yield
+        finally:
+            self._leave(sid)
+
+    # ---- shared executions ----
+    def _flight(self, session_id: Any, kind: str, message: str, start: Callable[[_Flight], Awaitable[Any]]) -> _Flight:
+        key = (str(session_id or ""), kind, message or "")
+        fl = self._flights.get(key) if key[0] else None
+        if fl is not None:
+            self._stats["coalesced"] += 1
+            return fl
+        fl = _Flight()
+        if key[0]:
+            self._flights[key] = fl
+
+        def _done(_):
+            fl.done = True
+            if self._flights.get(key) is fl:
+                del self._flights[key]
+
+        fl.task = asyncio.ensure_future(start(fl))
+        fl.task.add_done_callback(_done)
+        return fl
+
+    async def run(self, session_id: Any, message: str, fn: Callable[[], Awaitable[Any]], kind: str = "chat") -> Any:
+        """fn() in the session's lane; identical concurrent calls share one fn() result."""
+        async def start(fl: _Flight):
+            async with self.lane(session_id):
+                return await fn()
+
+        fl = self._flight(session_id, kind, message, start)
+        return await asyncio.shield(fl.task)
+
+    @asynccontextmanager
+    async def follow(self, session_id: Any, message: str, produce: Callable[[], AsyncIterator[Any]],
+                     kind: str = "stream"):
+        """A queue of produce()'s events (then None), produced once per identical concurrent call."""
+        async def start(fl: _Flight):
+            try:
+                async with self.lane(session_id):
+                    async for ev in produce():
+                        fl.publish(ev)
+            except asyncio.CancelledError:
+                raise
+            except Overloaded as e:
+                fl.publish({"type": "error", "detail": "session busy, retry shortly", "retry_after": e.retry_after})
+            except Exception as e:
+                fl.publish({"type": "error", "detail": f"agent error: {e}"})
+            finally:
+                fl.done = True
+                fl.publish(None)
+
+        fl = self._flight(session_id, kind, message, start)
+        q = fl.subscribe()
+        try:
+            yield q
+        finally:
+            fl.unsubscribe(q)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits_ms)
+        out: Dict[str, Any] = dict(self._stats)
+        out.update(
+            name=self.name,
+            max_wait_s=self.max_wait,
+            active_sessions=len(self._lanes),
+            waiting=sum(len(l.waiters) for l in self._lanes.values()),
+            in_flight=len(self._flights),
+            wait_ms_p95=round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+            wait_ms_max=round(waits[-1], 2) if waits else None,
+        )
+        return out
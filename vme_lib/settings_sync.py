@@ -0,0 +1,333 @@
+"""Cross-replica invalidation for the settings snapshot.
+
+Each replica keeps its own snapshot of va_settings (see
+`vme_lib.supabase_client.settings_get`). A write on one replica has to reach
+the others, so a statement trigger on va_settings bumps a single-row counter
+(`va_settings_version`, see db/schema.sql) and sends `NOTIFY va_settings`.
+A watcher thread per process follows that counter and reloads the snapshot
+as soon as it moves. While the watcher is healthy the snapshot TTL is raised
+to SETTINGS_CACHE_TTL_WATCHED; if it stops or errors, the normal
+SETTINGS_CACHE_TTL applies again.
+
+Version sources:
+  - PgNotifyVersionSource: LISTEN on a direct Postgres connection
+    (DATABASE_URL + psycopg or psycopg2). Wakes up on NOTIFY and re-reads the
+    counter at least every poll interval in case a notification was lost.
+  - PostgrestVersionSource: polls the counter row through the Supabase client.
+  - MemoryVersionSource: in-process stand-in for tests and single-node runs.
+
+Environment:
+  - SETTINGS_SYNC (default auto): auto | notify | poll | off
+  - SETTINGS_VERSION_POLL_MS (default 1000): poll / re-check interval
+"""
+from __future__ import annotations
+
+import os
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from vme_lib import supabase_client as _sb
+
+try:
+    import psycopg as _pg  # psycopg 3
+    _PG3 = True
+except Exception:
+    _PG3 = False
+    try:
+        import psycopg2 as _pg
+    except Exception:
+        _pg = None
+
+CHANNEL = "va_settings"
+_POLL_MS = int(os.getenv("SETTINGS_VERSION_POLL_MS", "1000"))
+
+
+class MemoryVersionSource:
+    """Version counter shared by everything in this process."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._version = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def current(self) -> int:
+        return self._version
+
+    def bump(self) -> int:
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+            return self._version
+
+    def wait(self, last: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != last or self._closed, timeout)
+            return self._version
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class PostgrestVersionSource:
+    """Polls `va_settings_version` through the Supabase client."""
+
+    name = "poll"
+
+    def __init__(self, client_fn: Callable[[], Any] | None = None):
+        self._client_fn = client_fn or (lambda: _sb._client())
+        self._closed = threading.Event()
+
+    def _sb(self):
+        sb = self._client_fn()
+        if not sb:
+            raise RuntimeError("supabase not configured")
+        return sb
+
+    def current(self) -> int:
+        rows = self._sb().table("va_settings_version").select("version").eq("id", 1).limit(1).execute().data or []
+        return int(rows[0]["version"]) if rows else 0
+
+    def bump(self) -> int:
+        res = self._sb().rpc("va_settings_bump", {}).execute()
+        return int(res.data) if isinstance(res.data, (int, str)) else self.current()
+
+    def wait(self, last: int, timeout: float) -> int:
+        self._closed.wait(timeout)
+        return self.current()
+
+    def close(self):
+        self._closed.set()
+
+
+class PgNotifyVersionSource:
+    """LISTEN/NOTIFY on a direct Postgres connection.
+
+    The watcher thread LISTENs on a connection of its own; counter reads and
+    bumps (which request threads make) share a second one under a lock.
+    """
+
+    name = "notify"
+
+    def __init__(self, dsn: str):
+        if _pg is None:
+            raise RuntimeError("psycopg not installed")
+        self._dsn = dsn
+        self._conn = None
+        self._lock = threading.Lock()
+        self._listen_conn = None
+        self._listen_lock = threading.Lock()
+
+    def _connect(self):
+        if _PG3:
+            return _pg.connect(self._dsn, autocommit=True)
+        conn = _pg.connect(self._dsn)
+        conn.set_session(autocommit=True)
+        return conn
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _listener(self):
+        if self._listen_conn is None:
+            conn = self._connect()
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+            self._listen_conn = conn
+        return self._listen_conn
+
+    def _query(self, sql: str) -> int:
+        with self._lock:
+            try:
+                cur = self._connection().cursor()
+                cur.execute(sql)
+                row = cur.fetchone()
+                return int(row[0]) if row and row[0] is not None else 0
+            except Exception:
+                self._conn = self._close(self._conn)
+                raise
+
+    def current(self) -> int:
+        return self._query("select version from va_settings_version where id = 1")
+
+    def bump(self) -> int:
+        return self._query("select va_settings_bump()")
+
+    def wait(self, last: int, timeout: float) -> int:
+        with self._listen_lock:
+            try:
+                conn = self._listener()
+                select.select([conn], [], [], timeout)
+                # consume the notifications; we only need the wake-up
+                if _PG3:
+                    conn.execute("select 1")
+                else:
+                    conn.poll()
+                    del conn.notifies[:]
+            except Exception:
+                self._listen_conn = self._close(self._listen_conn)
+                raise
+        # a notification is only a hint; the counter row is the source of truth
+        return self.current()
+
+    @staticmethod
+    def _close(conn) -> None:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return None
+
+    def close(self):
+        with self._lock:
+            self._conn = self._close(self._conn)
+        # the watcher may be inside wait(); closing its connection under it ends the select
+        conn, self._listen_conn = self._listen_conn, None
+        self._close(conn)
+
+
+def make_source(mode: str | None = None):
+    """Pick a version source from SETTINGS_SYNC, or None when sync is off/unavailable."""
+    mode = (mode or os.getenv("SETTINGS_SYNC", "auto")).strip().lower()
+    if mode in ("off", "0", "false", "no"):
+        return None
+    dsn = os.getenv("DATABASE_URL")
+    if mode in ("auto", "notify") and dsn and _pg is not None:
+        return PgNotifyVersionSource(dsn)
+    if mode in ("auto", "poll", "notify") and _sb._client() is not None:
+        return PostgrestVersionSource()
+    return None
+
+
+class SettingsWatcher:
+    """Follows a version source and reloads the settings snapshot when it moves."""
+
+    def __init__(self, source, interval: float | None = None):
+        self.source = source
+        self.interval = interval if interval is not None else _POLL_MS / 1000.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[int], None]] = []
+        self.version: Optional[int] = None
+        self.changes = 0
+        self.errors = 0
+        self.last_ok: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def add_listener(self, fn: Callable[[int], None]):
+        """Call `fn(version)` after each reload (e.g. to rebuild the agent graph)."""
+        self._listeners.append(fn)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vme-settings-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        try:
+            self.source.close()
+        except Exception:
+            pass
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        _sb._settings_watched = False
+
+    def _apply(self, version: int):
+        # reload in this thread so readers never wait on it
+        if not _sb._settings_load():
+            _sb.settings_refresh()
+        self.changes += 1
+        for fn in list(self._listeners):
+            try:
+                fn(version)
+            except Exception:
+                pass
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                if self.version is None:
+                    v = self.source.current()
+                else:
+                    v = self.source.wait(self.version, self.interval)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)[:200]
+                _sb._settings_watched = False
+                failures += 1
+                self._stop.wait(min(30.0, self.interval * (2 ** min(failures, 5))))
+                continue
+            if self._stop.is_set():
+                break
+            failures = 0
+            self.last_ok = time.time()
+            if self.version is not None and v != self.version:
+                self._apply(v)
+            elif self.version is None and not _sb._settings_watched:
+                # we may have missed writes while unwatched; start from a fresh load
+                _sb.settings_refresh()
+            self.version = v
+            _sb._settings_watched = True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": getattr(self.source, "name", type(self.source).__name__),
+            "running": bool(self._thread and self._thread.is_alive()),
+            "version": self.version,
+            "changes": self.changes,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "last_ok_age_s": round(time.time() - self.last_ok, 3) if self.last_ok else None,
+        }
+
+
+_watcher: Optional[SettingsWatcher] = None
+
+
+def start(source=None, interval: float | None = None) -> Optional[SettingsWatcher]:
+    """Start the process-wide watcher. Returns None when no source is available."""
+    global _watcher
+    if _watcher is not None:
+        return _watcher
+    src = source if source is not None else make_source()
+    if src is None:
+        return None
+    _watcher = SettingsWatcher(src, interval)
+    _watcher.start()
+    return _watcher
+
+
+def stop(timeout: float = 2.0):
+    global _watcher
+    w, _watcher = _watcher, None
+    if w is not None:
+        w.stop(timeout)
+
+
+def bump() -> Optional[int]:
+    """Announce a settings change to every replica (best-effort)."""
+    try:
+        src = _watcher.source if _watcher is not None else make_source()
+        if src is None:
+            return None
+        return src.bump()
+    except Exception:
+        return None
+
+
+def stats() -> Dict[str, Any]:
+    if _watcher is None:
+        return {"running": False, "source": None}
+    return _watcher.stats()
@@ -0,0 +1,658 @@
+"""Embedded SQLite storage backend.
+
+`SqliteStore` answers the part of the supabase-py query builder that the
+`supabase_client` helpers (vme_lib and lib) use: `table(...)` with
+`select/insert/update/upsert/delete`, the usual filters, `order`, `limit`,
+`range` and `rpc`. Selecting it makes every helper persist locally with no
+other code changes. Tables mirror db/schema.sql; jsonb columns are stored as
+JSON text and decoded on read.
+
+The database runs in WAL mode with synchronous=NORMAL, so readers never
+block the writer and commits don't wait for an fsync. Each thread gets its
+own connection; queries are built from fixed templates with `?` placeholders
+so sqlite3's per-connection statement cache reuses the prepared statements.
+Writes are serialised by one lock and a multi-row insert (e.g. a write-behind
+batch) is a single transaction.
+
+Environment:
+  - STORAGE_BACKEND (default supabase): supabase | sqlite | auto
+    (auto = sqlite when Supabase credentials are missing)
+  - SQLITE_PATH (default <project>/.vme2.sqlite3; `:memory:` for a private DB)
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_NOW = "(strftime('%Y-%m-%dT%H:%M:%fZ','now'))"
+
+SCHEMA = f"""
+create table if not exists va_sessions (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  label text,
+  message_count integer not null default 0,
+  last_message_at text
+);
+create index if not exists idx_va_sessions_created_at on va_sessions(created_at);
+
+create table if not exists va_messages (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  session_id integer references va_sessions(id) on delete cascade,
+  role text check (role in ('user','assistant','system','tool')),
+  content text
+);
+create index if not exists idx_va_messages_session_id on va_messages(session_id, id);
+
+create table if not exists va_tool_events (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  session_id integer references va_sessions(id) on delete cascade,
+  tool_name text,
+  input_json text,
+  output_json text
+);
+create index if not exists idx_va_tool_events_session_id on va_tool_events(session_id, created_at);
+
+create table if not exists va_stats (
+  key text primary key,
+  value integer not null default 0,
+  updated_at text default {_NOW}
+);
+insert or ignore into va_stats(key, value)
+  select 'va_sessions', count(*) from va_sessions union all select 'va_messages', count(*) from va_messages;
+create trigger if not exists va_stats_sessions_ins after insert on va_sessions begin
+  update va_stats set value = value + 1, updated_at = {_NOW} where key = 'va_sessions';
+end;
+create trigger if not exists va_stats_sessions_del after delete on va_sessions begin
+  update va_stats set value = value - 1, updated_at = {_NOW} where key = 'va_sessions';
+end;
+create trigger if not exists va_stats_messages_ins after insert on va_messages begin
+  update va_stats set value = value + 1, updated_at = {_NOW} where key = 'va_messages';
+  update va_sessions set message_count = message_count + 1, last_message_at = new.created_at
+    where id = new.session_id;
+end;
+create trigger if not exists va_stats_messages_del after delete on va_messages begin
+  update va_stats set value = value - 1, updated_at = {_NOW} where key = 'va_messages';
+  update va_sessions set message_count = max(0, message_count - 1) where id = old.session_id;
+end;
+
+create table if not exists va_settings (
+  id integer primary key autoincrement,
+  key text unique,
+  value text,
+  updated_at text default {_NOW}
+);
+
+create table if not exists va_settings_version (
+  id integer primary key check (id = 1),
+  version integer not null default 0,
+  updated_at text default {_NOW}
+);
+insert or ignore into va_settings_version(id, version) values (1, 0);
+create trigger if not exists va_settings_bump_ins after insert on va_settings begin
+  update va_settings_version set version = version + 1, updated_at = {_NOW} where id = 1;
+end;
+create trigger if not exists va_settings_bump_upd after update on va_settings begin
+  update va_settings_version set version = version + 1, updated_at = {_NOW} where id = 1;
+end;
+create trigger if not exists va_settings_bump_del after delete on va_settings begin
+  update va_settings_version set version = version + 1, updated_at = {_NOW} where id = 1;
+end;
+
+create table if not exists va_meetings (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  label text,
+  summary text,
+  bullets text,
+  segment_count integer default 0
+);
+
+create table if not exists va_tasks (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  title text not null,
+  body text,
+  status text check (status in ('queued','running','success','failed','cancelled')) default 'queued',
+  branch text,
+  pr_number integer,
+  error text,
+  lease_owner text,
+  lease_until text,
+  heartbeat_at text,
+  attempts integer not null default 0,
+  started_at text,
+  finished_at text
+);
+create index if not exists idx_va_tasks_status on va_tasks(status);
+create index if not exists idx_va_tasks_created_at on va_tasks(created_at);
+
+create table if not exists va_task_events (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  task_id integer references va_tasks(id) on delete cascade,
+  kind text,
+  data text
+);
+create index if not exists idx_va_task_events_task on va_task_events(task_id, id);
+
+create table if not exists va_meeting_segments (
+  id integer primary key autoincrement,
+  created_at text default {_NOW},
+  meeting_id integer references va_meetings(id) on delete cascade,
+  ts real,
+  idx integer,
+  text text
+);
+create index if not exists idx_va_meeting_segments_meeting_id on va_meeting_segments(meeting_id);
+"""
+
+# columns added to tables after their first release: (table, column, ddl)
+MIGRATIONS: List[Tuple[str, str, str]] = [
+    ("va_sessions", "message_count", "integer not null default 0"),
+    ("va_sessions", "last_message_at", "text"),
+    ("va_tasks", "lease_owner", "text"),
+    ("va_tasks", "lease_until", "text"),
+    ("va_tasks", "heartbeat_at", "text"),
+    ("va_tasks", "attempts", "integer not null default 0"),
+    ("va_tasks", "started_at", "text"),
+    ("va_tasks", "finished_at", "text"),
+]
+
+# jsonb columns in db/schema.sql
+JSON_COLUMNS: Dict[str, set] = {
+    "va_tool_events": {"input_json", "output_json"},
+    "va_settings": {"value"},
+    "va_meetings": {"bullets"},
+    "va_task_events": {"data"},
+}
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _ident(name: str) -> str:
+    if not isinstance(name, str) or not _IDENT.match(name):
+        raise ValueError(f"invalid identifier: {name!r}")
+    return name
+
+
+class APIError(Exception):
+    """Raised for requests PostgREST would reject (unknown column, unfiltered update...)."""
+
+
+class _Result:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+# stored procedures reachable through store.rpc(name, params); fn(conn, params)
+RPCS: Dict[str, Callable[[sqlite3.Connection, Dict[str, Any]], Any]] = {}
+
+
+def _rpc_settings_bump(conn: sqlite3.Connection, params: Dict[str, Any]) -> int:
+    conn.execute(f"update va_settings_version set version = version + 1, updated_at = {_NOW} where id = 1")
+    return conn.execute("select version from va_settings_version where id = 1").fetchone()[0]
+
+
+RPCS["va_settings_bump"] = _rpc_settings_bump
+
+
+def _rpc_stats_reconcile(conn: sqlite3.Connection, params: Dict[str, Any]) -> Dict[str, int]:
+    s = conn.execute("select count(*) from va_sessions").fetchone()[0]
+    m = conn.execute("select count(*) from va_messages").fetchone()[0]
+    conn.execute(f"update va_stats set value = ?, updated_at = {_NOW} where key = 'va_sessions'", [s])
+    conn.execute(f"update va_stats set value = ?, updated_at = {_NOW} where key = 'va_messages'", [m])
+    conn.execute("""
+        update va_sessions set
+          message_count = (select count(*) from va_messages m where m.session_id = va_sessions.id),
+          last_message_at = (select max(created_at) from va_messages m where m.session_id = va_sessions.id)
+    """)
+    return {"va_sessions": s, "va_messages": m}
+
+
+RPCS["va_stats_reconcile"] = _rpc_stats_reconcile
+
+
+# Task queue (see va_task_claim & co. in db/schema.sql). Writes run under
+# `begin immediate`, which holds the database write lock, so a claim is
+# atomic across threads and across processes sharing the file.
+def _lease(params: Dict[str, Any]) -> str:
+    return f"strftime('%Y-%m-%dT%H:%M:%fZ','now','+{int(params.get('p_lease_s') or 60)} seconds')"
+
+
+def _rpc_task_claim(conn: sqlite3.Connection, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    cur = conn.execute(f"""
+        update va_tasks
+          set status = 'running', lease_owner = ?, lease_until = {_lease(params)}, heartbeat_at = {_NOW},
+              attempts = attempts + 1, started_at = coalesce(started_at, {_NOW}), error = null
+          where id = (select id from va_tasks where status = 'queued' order by id limit 1)
+          returning *
+    """, [params.get("p_worker")])
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _rpc_task_heartbeat(conn: sqlite3.Connection, params: Dict[str, Any]) -> bool:
+    cur = conn.execute(f"""
+        update va_tasks set lease_until = {_lease(params)}, heartbeat_at = {_NOW}
+          where id = ? and status = 'running' and lease_owner = ?
+    """, [params.get("p_id"), params.get("p_worker")])
+    return cur.rowcount > 0
+
+
+def _rpc_task_finish(conn: sqlite3.Connection, params: Dict[str, Any]) -> bool:
+    cur = conn.execute(f"""
+        update va_tasks set status = ?, error = ?, finished_at = {_NOW}, lease_owner = null, lease_until = null
+          where id = ? and status = 'running' and lease_owner = ?
+    """, [params.get("p_status"), params.get("p_error"), params.get("p_id"), params.get("p_worker")])
+    return cur.rowcount > 0
+
+
+def _rpc_task_requeue_expired(conn: sqlite3.Connection, params: Dict[str, Any]) -> int:
+    cur = conn.execute(f"""
+        update va_tasks
+          set status = case when attempts >= :m then 'failed' else 'queued' end,
+              error = case when attempts >= :m then 'lease expired' else error end,
+              finished_at = case when attempts >= :m then {_NOW} else null end,
+              lease_owner = null, lease_until = null
+          where status = 'running' and lease_until < {_NOW}
+    """, {"m": int(params.get("p_max_attempts") or 3)})
+    return cur.rowcount
+
+
+RPCS["va_task_claim"] = _rpc_task_claim
+RPCS["va_task_heartbeat"] = _rpc_task_heartbeat
+RPCS["va_task_finish"] = _rpc_task_finish
+RPCS["va_task_requeue_expired"] = _rpc_task_requeue_expired
+
+
+class _Rpc:
+    def __init__(self, store: "SqliteStore", name: str, params: Dict[str, Any]):
+        self._store = store
+        self._name = name
+        self._params = params or {}
+
+    def execute(self) -> _Result:
+        fn = RPCS.get(self._name)
+        if fn is None:
+            raise APIError(f"unknown function: {self._name}")
+        return _Result(self._store._write(lambda conn: fn(conn, self._params)))
+
+
+class _Query:
+    """One PostgREST-style request against a table."""
+
+    def __init__(self, store: "SqliteStore", table: str):
+        self._store = store
+        self._table = _ident(table)
+        self._op = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._where: List[Tuple[str, List[Any]]] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+        self._single: Optional[str] = None
+
+    # ---- verbs ----
+    def select(self, *columns: str, count: Optional[str] = None, **_kw):
+        cols = [c.strip() for part in (columns or ("*",)) for c in part.split(",") if c.strip()]
+        if cols and cols != ["*"]:
+            self._columns = ",".join(self._store._column(self._table, c) for c in cols)
+        self._op = "select"
+        self._count = count
+        return self
+
+    def insert(self, json: Any, *, upsert: bool = False, **_kw):
+        self._op = "upsert" if upsert else "insert"
+        self._payload = json
+        return self
+
+    def upsert(self, json: Any, *, on_conflict: str = "", ignore_duplicates: bool = False, **_kw):
+        self._op = "upsert"
+        self._payload = json
+        self._on_conflict = on_conflict or None
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def on_conflict(self, columns: str):
+        self._on_conflict = columns
+        return self
+
+    def update(self, json: Dict[str, Any], **_kw):
+        self._op = "update"
+        self._payload = json
+        return self
+
+    def delete(self, **_kw):
+        self._op = "delete"
+        return self
+
+    # ---- filters ----
+    def _add(self, column: str, op: str, value: Any, negate: bool = False):
+        col = self._store._column(self._table, column)
+        if op in ("eq", "neq") and value is None:
+            op = "is"
+        if op == "is":
+            if value is None or (isinstance(value, str) and value.lower() == "null"):
+                sql, params = f"{col} is null", []
+            else:
+                truth = value if isinstance(value, bool) else str(value).lower() == "true"
+                sql, params = f"{col} = ?", [1 if truth else 0]
+        elif op == "in":
+            values = list(value or [])
+            if not values:
+                sql, params = "0", []
+            else:
+                sql = f"{col} in ({','.join('?' * len(values))})"
+                params = [self._store._encode(self._table, column, v) for v in values]
+        elif op in ("like", "ilike"):
+            pattern = str(value).replace("*", "%")
+            sql = f"{col} like ?" if op == "like" else f"lower({col}) like lower(?)"
+            params = [pattern]
+        else:
+            sym = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}.get(op)
+            if sym is None:
+                raise APIError(f"unsupported operator: {op}")
+            sql, params = f"{col} {sym} ?", [self._store._encode(self._table, column, value)]
+        if negate:
+            sql = f"not ({sql})"
+        self._where.append((sql, params))
+        return self
+
+    def eq(self, column: str, value: Any): return self._add(column, "eq", value)
+    def neq(self, column: str, value: Any): return self._add(column, "neq", value)
+    def gt(self, column: str, value: Any): return self._add(column, "gt", value)
+    def gte(self, column: str, value: Any): return self._add(column, "gte", value)
+    def lt(self, column: str, value: Any): return self._add(column, "lt", value)
+    def lte(self, column: str, value: Any): return self._add(column, "lte", value)
+    def like(self, column: str, pattern: str): return self._add(column, "like", pattern)
+    def ilike(self, column: str, pattern: str): return self._add(column, "ilike", pattern)
+    def is_(self, column: str, value: Any): return self._add(column, "is", value)
+    def in_(self, column: str, values: List[Any]): return self._add(column, "in", values)
+
+    def not_(self, column: str, op: str, value: Any):
+        return self._add(column, op, value, negate=True)
+
+    def filter(self, column: str, op: str, value: Any):
+        return self._add(column, op, value)
+
+    def match(self, query: Dict[str, Any]):
+        for k, v in query.items():
+            self.eq(k, v)
+        return self
+
+    # ---- modifiers ----
+    def order(self, column: str, *, desc: bool = False, nullsfirst: bool = False, **_kw):
+        col = self._store._column(self._table, column)
+        self._order.append(f"{col} {'desc' if desc else 'asc'}{' nulls first' if nullsfirst else ''}")
+        return self
+
+    def limit(self, size: int, **_kw):
+        self._limit = int(size)
+        return self
+
+    def range(self, start: int, end: int, **_kw):
+        self._offset = int(start)
+        self._limit = max(0, int(end) - int(start) + 1)
+        return self
+
+    def single(self):
+        self._single = "single"
+        self._limit = 1 if self._limit is None else self._limit
+        return self
+
+    def maybe_single(self):
+        self._single = "maybe"
+        self._limit = 1 if self._limit is None else self._limit
+        return self
+
+    # ---- execution ----
+    def _where_sql(self) -> Tuple[str, List[Any]]:
+        if not self._where:
+            return "", []
+        params: List[Any] = []
+        for _, p in self._where:
+            params.extend(p)
+        return " where " + " and ".join(s for s, _ in self._where), params
+
+    def execute(self) -> _Result:
+        if self._op == "select":
+            return self._select()
+        if self._op in ("insert", "upsert"):
+            return self._insert()
+        if self._op == "update":
+            return self._update()
+        return self._delete()
+
+    def _select(self) -> _Result:
+        where, params = self._where_sql()
+        sql = f"select {self._columns} from {self._table}{where}"
+        if self._order:
+            sql += " order by " + ", ".join(self._order)
+        qparams = list(params)
+        if self._limit is not None or self._offset is not None:
+            sql += " limit ? offset ?"
+            qparams += [self._limit if self._limit is not None else -1, self._offset or 0]
+        rows = self._store._read(sql, qparams, self._table)
+        count = None
+        if self._count:
+            count = self._store._read(f"select count(*) as n from {self._table}{where}", params, None)[0]["n"]
+        if self._single == "single":
+            if len(rows) != 1:
+                raise APIError("JSON object requested, multiple (or no) rows returned")
+            return _Result(rows[0], count)
+        if self._single == "maybe":
+            return _Result(rows[0] if rows else None, count)
+        return _Result(rows, count)
+
+    def _insert(self) -> _Result:
+        rows = self._payload if isinstance(self._payload, list) else [self._payload]
+        t = self._table
+        conflict = None
+        if self._op == "upsert":
+            conflict = [self._store._column(t, c.strip()) for c in (self._on_conflict or "id").split(",") if c.strip()]
+
+        def run(conn: sqlite3.Connection):
+            out = []
+            for row in rows:
+                cols = [self._store._column(t, c) for c in row.keys()]
+                vals = [self._store._encode(t, c, row[c]) for c in row.keys()]
+                if cols:
+                    sql = f"insert into {t} ({','.join(cols)}) values ({','.join('?' * len(cols))})"
+                else:
+                    sql = f"insert into {t} default values"
+                if conflict:
+                    upd = [c for c in cols if c not in conflict]
+                    if upd and not self._ignore_duplicates:
+                        sql += f" on conflict({','.join(conflict)}) do update set " + ",".join(f"{c}=excluded.{c}" for c in upd)
+                    else:
+                        sql += f" on conflict({','.join(conflict)}) do nothing"
+                cur = conn.execute(sql + " returning *", vals)
+                out.extend(self._store._decode(t, r) for r in cur.fetchall())
+            return out
+        return _Result(self._store._write(run))
+
+    def _update(self) -> _Result:
+        if not self._where:
+            raise APIError("UPDATE requires a WHERE clause")
+        t = self._table
+        items = list((self._payload or {}).items())
+        if not items:
+            return _Result([])
+        sets = ",".join(f"{self._store._column(t, k)} = ?" for k, _ in items)
+        where, params = self._where_sql()
+        vals = [self._store._encode(t, k, v) for k, v in items] + params
+        sql = f"update {t} set {sets}{where} returning *"
+        return _Result(self._store._write(lambda conn: [self._store._decode(t, r) for r in conn.execute(sql, vals).fetchall()]))
+
+    def _delete(self) -> _Result:
+        if not self._where:
+            raise APIError("DELETE requires a WHERE clause")
+        t = self._table
+        where, params = self._where_sql()
+        sql = f"delete from {t}{where} returning *"
+        return _Result(self._store._write(lambda conn: [self._store._decode(t, r) for r in conn.execute(sql, params).fetchall()]))
+
+
+class SqliteStore:
+    """Supabase-client look-alike over a local SQLite database."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        # ":memory:" databases are per-connection, so share one (reads lock too)
+        self._shared: Optional[sqlite3.Connection] = None
+        self._columns: Dict[str, set] = {}
+        if path == ":memory:":
+            self._shared = self._open()
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._write_lock:
+            conn = self._conn()
+            # add columns missing from databases created by older versions
+            # before the schema script, whose triggers reference them
+            migrated = False
+            for table, column, ddl in MIGRATIONS:
+                have = {r[1] for r in conn.execute(f"pragma table_info({table})").fetchall()}
+                if have and column not in have:
+                    conn.execute(f"alter table {table} add column {column} {ddl}")
+                    migrated = True
+            conn.executescript(SCHEMA)
+            if migrated:
+                # new counters start at zero; fill them from the existing rows
+                self._write(lambda c: _rpc_stats_reconcile(c, {}))
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("pragma journal_mode=WAL")
+        conn.execute("pragma synchronous=NORMAL")
+        conn.execute("pragma foreign_keys=ON")
+        conn.execute("pragma temp_store=MEMORY")
+        with self._conns_lock:
+            self._conns.append(conn)
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._shared is not None:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+        return conn
+
+    def _column(self, table: str, column: str) -> str:
+        cols = self._columns.get(table)
+        if cols is None:
+            rows = self._read(f"pragma table_info({_ident(table)})", [], None)
+            if not rows:
+                raise APIError(f"relation {table} does not exist")
+            cols = {r["name"] for r in rows}
+            self._columns[table] = cols
+        if column not in cols:
+            raise APIError(f"column {table}.{column} does not exist")
+        return column
+
+    def _encode(self, table: str, column: str, value: Any) -> Any:
+        if value is None:
+            return None
+        if column in JSON_COLUMNS.get(table, ()):
+            return json.dumps(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, bool):
+            return 1 if value else 0
+        return value
+
+    def _decode(self, table: Optional[str], row: sqlite3.Row) -> Dict[str, Any]:
+        d = dict(row)
+        for c in JSON_COLUMNS.get(table or "", ()):
+            v = d.get(c)
+            if isinstance(v, str):
+                try:
+                    d[c] = json.loads(v)
+                except Exception:
+                    pass
+        return d
+
+    def _read(self, sql: str, params: List[Any], table: Optional[str]) -> List[Dict[str, Any]]:
+        if self._shared is not None:
+            with self._write_lock:
+                rows = self._shared.execute(sql, params).fetchall()
+        else:
+            rows = self._conn().execute(sql, params).fetchall()
+        return [self._decode(table, r) for r in rows]
+
+    def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("begin immediate")
+            try:
+                out = fn(conn)
+            except BaseException:
+                conn.execute("rollback")
+                raise
+            conn.execute("commit")
+            return out
+
+    # ---- supabase-py surface ----
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> _Rpc:
+        return _Rpc(self, name, params or {})
+
+    def close(self):
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for c in conns:
+            try:
+                c.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+        self._shared = None
+
+
+_stores: Dict[str, SqliteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def default_path() -> str:
+    return os.getenv("SQLITE_PATH") or str(Path(__file__).resolve().parents[1] / ".vme2.sqlite3")
+
+
+def get_store(path: Optional[str] = None) -> SqliteStore:
+    """Process-wide store for `path` (shared by vme_lib and lib helpers)."""
+    p = path or default_path()
+    with _stores_lock:
+        st = _stores.get(p)
+        if st is None:
+            st = SqliteStore(p)
+            _stores[p] = st
+        return st
+
+
+def selected(supabase_configured: bool) -> bool:
+    """True when STORAGE_BACKEND picks SQLite for this process."""
+    backend = os.getenv("STORAGE_BACKEND", "supabase").strip().lower()
+    return backend == "sqlite" or (backend == "auto" and not supabase_configured)
@@ -0,0 +1,372 @@
+"""Awaitable equivalents of the `vme_lib.supabase_client` helpers.
+
+Async route handlers must not call the synchronous Supabase client: each
+query blocks the event loop and stalls every other request and SSE stream in
+the worker. This module talks to PostgREST through `AsyncPostgrestClient`
+over one pooled `httpx.AsyncClient` per event loop (keep-alive, HTTP/2 when
+the `h2` package is installed) and bounds every call with a timeout.
+
+When Supabase credentials are missing every helper degrades exactly like its
+sync twin. When the sync `_client()` yields something that isn't Supabase
+(tests patch it with fakes) the sync helper runs in a worker thread instead,
+so behaviour stays identical and the loop is still never blocked.
+
+Environment:
+  - SUPABASE_POOL_SIZE (default 20): max connections per event loop
+  - SUPABASE_TIMEOUT (default 10): per-call timeout in seconds
+  - SUPABASE_HTTP2 (default 1): set 0 to force HTTP/1.1
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from vme_lib import supabase_client as _sb
+
+try:
+    import httpx
+    from postgrest import AsyncPostgrestClient
+    _ASYNC_OK = True
+except Exception:
+    _ASYNC_OK = False
+
+_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+# httpx connections belong to the loop that opened them, so keep one pooled
+# client per running loop (normally exactly one per worker process), next to
+# the loop it belongs to so clients of closed loops can be dropped.
+_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, Any]] = {}
+# in-flight cold settings load per loop, shared by concurrent settings_get calls
+_settings_loading: Dict[int, "asyncio.Task"] = {}
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("SUPABASE_HTTP2", "1").lower() in ("0", "false", "no", "off"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def _credentials() -> tuple[Optional[str], Optional[str]]:
+    url = os.getenv("SUPABASE_URL")
+    key = (os.getenv("SUPABASE_SERVICE_ROLE_KEY") or
+        os.getenv("SUPABASE_SERVICE_KEY") or
+        os.getenv("SUPABASE_ANON_KEY"))
+    return url, key
+
+
+def _aclient():
+    """Return the pooled async PostgREST client for the running loop, or None.
+
+    None means "use the sync helper in a thread": either credentials are
+    missing or the sync client has been replaced by something else.
+    """
+    if not _ASYNC_OK:
+        return None
+    try:
+        sync = _sb._client()
+    except Exception:
+        sync = None
+    if sync is None or not hasattr(sync, "postgrest"):
+        return None
+    url, key = _credentials()
+    if not url or not key:
+        return None
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    entry = _clients.get(id(loop))
+    if entry is not None and entry[0] is loop:
+        return entry[1]
+    _prune_clients()
+    headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+    base_url = url.rstrip("/") + "/rest/v1"
+    http = httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        timeout=_TIMEOUT,
+        http2=_http2_enabled(),
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=_POOL_SIZE, max_keepalive_connections=_POOL_SIZE),
+    )
+    try:
+        ac = AsyncPostgrestClient(base_url, headers=headers, http_client=http)
+    except TypeError:
+        # older postgrest-py without http_client support
+        ac = AsyncPostgrestClient(base_url, headers=headers)
+    _clients[id(loop)] = (loop, ac)
+    return ac
+
+
+def _prune_clients():
+    """Drop the clients of closed loops (tests, reloads) and release their connection pools."""
+    for key, (loop, ac) in list(_clients.items()):
+        if loop.is_closed():
+            del _clients[key]
+            asyncio.ensure_future(_close_quietly(ac))
+
+
+async def _close_quietly(ac):
+    try:
+        await ac.aclose()
+    except Exception:
+        pass
+
+
+async def aclose():
+    """Close the pooled client for the running loop (call on shutdown)."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    entry = _clients.pop(id(loop), None)
+    if entry is not None:
+        await _close_quietly(entry[1])
+
+
+async def execute(builder, timeout: float | None = None):
+    """Await a PostgREST request builder with a per-call timeout."""
+    return await asyncio.wait_for(builder.execute(), timeout or _TIMEOUT)
+
+
+async def _in_thread(fn, *args, **kwargs):
+    try:
+        configured = _sb._client() is not None
+    except Exception:
+        configured = False
+    if not configured:
+        # Without a client the sync helper returns immediately; skip the thread hop.
+        return fn(*args, **kwargs)
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+# ---------------- sessions / messages / tool events ----------------
+async def create_session(label: Optional[str] = None) -> Optional[int]:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.create_session, label)
+    try:
+        res = await execute(ac.table("va_sessions").insert({"label": label}))
+        return res.data[0]["id"] if res.data else None
+    except Exception:
+        return None
+
+
+async def update_session_title(session_id: int, title: str) -> bool:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.update_session_title, session_id, title)
+    try:
+        await execute(ac.table("va_sessions").update({"label": title}).eq("id", int(session_id)))
+        _sb._notify_session_changed(int(session_id))
+        return True
+    except Exception:
+        return False
+
+
+async def safe_log_message(session_id: Union[int, str, None], role: str, content: str):
+    # Enqueue-only when write-behind is on; otherwise an insert, so keep it off the loop.
+    if _sb._LOG_WRITE_BEHIND:
+        _sb.safe_log_message(session_id, role, content)
+    else:
+        await _in_thread(_sb.safe_log_message, session_id, role, content)
+
+
+async def safe_log_tool_event(session_id: Union[int, str, None], tool_name: str, input_json: dict | None, output_json: dict | str | None):
+    if _sb._LOG_WRITE_BEHIND:
+        _sb.safe_log_tool_event(session_id, tool_name, input_json, output_json)
+    else:
+        await _in_thread(_sb.safe_log_tool_event, session_id, tool_name, input_json, output_json)
+
+
+async def select_tool_events(session_id: Union[int, str], limit: int = 10, tool_name: Optional[str] = None):
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.select_tool_events, session_id, limit, tool_name)
+    try:
+        sid = int(session_id) if isinstance(session_id, str) else session_id
+        q = ac.table("va_tool_events").select("*").eq("session_id", sid)
+        if tool_name:
+            q = q.eq("tool_name", tool_name)
+        res = await execute(q.order("created_at", desc=True).limit(limit))
+        return res.data or []
+    except Exception:
+        return []
+
+
+async def count_rows(table: str) -> Optional[int]:
+    """Exact row count for `table`, or None when unavailable."""
+    ac = _aclient()
+    if ac is None:
+        sb = _sb._client()
+        if not sb:
+            return None
+        res = await _in_thread(lambda: sb.table(table).select("*", count="exact").limit(1).execute())
+        return getattr(res, "count", None)
+    res = await execute(ac.table(table).select("*", count="exact").limit(1))
+    return getattr(res, "count", None)
+
+
+async def stats_get() -> Optional[Dict[str, int]]:
+    """Trigger-maintained row counts from va_stats, or None when unavailable."""
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.stats_get)
+    try:
+        rows = (await execute(ac.table("va_stats").select("key,value"))).data or []
+    except Exception:
+        return None
+    return {r["key"]: int(r["value"]) for r in rows} if rows else None
+
+
+# ---------------- settings ----------------
+async def settings_get(key: str, default: Any = None, decrypt: bool = True) -> Any:
+    """Read from the shared settings snapshot; a cold snapshot is loaded without blocking the loop."""
+    snap = _sb._settings_peek()
+    if snap is None:
+        ac = _aclient()
+        if ac is None:
+            return await _in_thread(_sb.settings_get, key, default, decrypt)
+        try:
+            snap = await _settings_cold_load()
+        except Exception:
+            return default
+    if key not in snap or snap[key] is None:
+        return default
+    return _sb._decode_setting(snap[key], default, decrypt)
+
+
+async def _settings_cold_load() -> Dict[str, Any]:
+    """Load the snapshot once per burst: concurrent callers await the same query."""
+    loop = asyncio.get_running_loop()
+    task = _settings_loading.get(id(loop))
+    if task is None or task.get_loop() is not loop:
+        async def load():
+            rows = await settings_rows()
+            _sb._settings_install(rows or [])
+            return _sb._SETTINGS_CACHE
+
+        task = loop.create_task(load())
+        _settings_loading[id(loop)] = task
+        task.add_done_callback(lambda t, k=id(loop): _settings_loading.pop(k, None) if _settings_loading.get(k) is t else None)
+    return await asyncio.shield(task)
+
+
+async def settings_rows() -> Optional[List[Dict[str, Any]]]:
+    """Raw `key,value` rows from va_settings, or None when Supabase isn't configured."""
+    ac = _aclient()
+    if ac is None:
+        sb = _sb._client()
+        if not sb:
+            return None
+        res = await _in_thread(lambda: sb.table("va_settings").select("key,value").execute())
+        return res.data or []
+    res = await execute(ac.table("va_settings").select("key,value"))
+    return res.data or []
+
+
+async def settings_put(mapping: Dict[str, Any]):
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.settings_put, mapping)
+    for k, v in mapping.items():
+        store_v = _sb._encode_setting(k, v)
+        await execute(ac.table("va_settings").upsert({"key": k, "value": store_v}, on_conflict="key"))
+        _sb._settings_write_through(k, store_v)
+
+
+async def settings_list() -> Dict[str, Any]:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.settings_list)
+    res = await execute(ac.table("va_settings").select("*"))
+    return _sb._mask_settings(res.data or [])
+
+
+def settings_refresh():
+    _sb.settings_refresh()
+
+
+# ---------------- tasks ----------------
+async def insert_task(title: str, body: str | None = None) -> int | None:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.insert_task, title, body)
+    try:
+        res = await execute(ac.table("va_tasks").insert({"title": title, "body": body}))
+        return res.data[0]["id"] if res.data else None
+    except Exception:
+        return None
+
+
+async def update_task_status(id: int, status: str, branch: str | None = None, pr_number: int | None = None, error: str | None = None) -> bool:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.update_task_status, id, status, branch, pr_number, error)
+    try:
+        upd: Dict[str, Any] = {"status": status}
+        if branch is not None: upd["branch"] = branch
+        if pr_number is not None: upd["pr_number"] = pr_number
+        if error is not None: upd["error"] = error
+        await execute(ac.table("va_tasks").update(upd).eq("id", int(id)))
+        return True
+    except Exception:
+        return False
+
+
+async def insert_task_event(task_id: int, kind: str, data_dict: dict | None = None) -> Optional[Dict[str, Any]]:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.insert_task_event, task_id, kind, data_dict)
+    try:
+        res = await execute(ac.table("va_task_events").insert({"task_id": int(task_id), "kind": kind, "data": data_dict or {}}))
+        row = res.data[0] if isinstance(res.data, list) and res.data else None
+        return row if isinstance(row, dict) else None
+    except Exception:
+        return None
+
+
+async def get_task(task_id: int) -> Optional[Dict[str, Any]]:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.get_task, task_id)
+    try:
+        res = await execute(ac.table("va_tasks").select("*").eq("id", int(task_id)).limit(1))
+        rows = res.data or []
+        return rows[0] if rows else None
+    except Exception:
+        return None
+
+
+async def list_tasks(limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.list_tasks, limit)
+    try:
+        res = await execute(ac.table("va_tasks").select("*").order("created_at", desc=True).limit(limit))
+        return res.data or []
+    except Exception:
+        return None
+
+
+async def select_task_events(task_id: int, after_id: int | None = None, limit: int | None = None) -> List[Dict[str, Any]]:
+    ac = _aclient()
+    if ac is None:
+        return await _in_thread(_sb.select_task_events, task_id, after_id, limit)
+    try:
+        q = ac.table("va_task_events").select("*").eq("task_id", int(task_id))
+        if after_id is not None:
+            q = q.gt("id", int(after_id))
+        q = q.order("id")
+        if limit is not None:
+            q = q.limit(int(limit))
+        res = await execute(q)
+        return res.data or []
+    except Exception:
+        return []
@@ -1,10 +1,19 @@
-import os, time, json, base64
-from typing import Optional, Union, Dict, Any
+import os, time, json, base64, threading, atexit
+from collections import deque
+from typing import Optional, Union, Dict, Any, List
 from supabase import create_client, Client
+from vme_lib import sqlite_store as _sqlite
 
 _sb: Optional[Client] = None
-_SETTINGS_CACHE: Dict[str, tuple[float, Any]] = {}
+# Whole-table settings snapshot: {key: stored value}. See settings_get().
+_SETTINGS_CACHE: Dict[str, Any] = {}
 _SETTINGS_CACHE_TTL = int(os.getenv("SETTINGS_CACHE_TTL", "30"))
+# How long past the TTL a stale snapshot may still be served while one
+# background refresh runs; beyond that readers reload synchronously.
+_SETTINGS_STALE_MAX = int(os.getenv("SETTINGS_STALE_MAX", "300"))
+# TTL used while vme_lib.settings_sync is watching the version counter: any
+# write anywhere invalidates the snapshot, so expiry is only a safety net.
+_SETTINGS_CACHE_TTL_WATCHED = int(os.getenv("SETTINGS_CACHE_TTL_WATCHED", "3600"))
 _SECRET_KEYS = set(
     (os.getenv("SETTINGS_SECRET_KEYS") or "OPENAI_API_KEY,SUPABASE_SERVICE_ROLE_KEY,SUPABASE_ANON_KEY,SETTINGS_ADMIN_TOKEN,CI_SETTINGS_ADMIN_TOKEN,GITHUB_TOKEN,GITHUB_PAT,SUPABASE_SERVICE_KEY").split(",")
 )
@@ -14,13 +23,20 @@ try:
 except Exception:
     _CRYPTO_OK = False
 
+_fernet_cached: tuple[Optional[str], Any] = (None, None)
+
 def _fernet():
+    global _fernet_cached
     key = os.getenv("APP_ENCRYPTION_KEY")
     if _CRYPTO_OK and key:
+        if _fernet_cached[0] == key:
+            return _fernet_cached[1]
         try:
-            return Fernet(key)
+            f = Fernet(key)
         except Exception:
             return None
+        _fernet_cached = (key, f)
+        return f
     return None
 
 def _client() -> Optional[Client]:
@@ -29,6 +45,8 @@ def _client() -> Optional[Client]:
     Environment variables checked:
       - SUPABASE_URL
       - SUPABASE_SERVICE_ROLE_KEY or SUPABASE_ANON_KEY
+      - STORAGE_BACKEND=sqlite|auto returns the embedded SQLite store instead
+        (see vme_lib.sqlite_store)
     """
     global _sb
     if _sb is not None:
@@ -39,6 +57,10 @@ def _client() -> Optional[Client]:
     key = (os.getenv("SUPABASE_SERVICE_ROLE_KEY") or
         os.getenv("SUPABASE_SERVICE_KEY") or
         os.getenv("SUPABASE_ANON_KEY"))
+    if _sqlite.selected(bool(url and key)):
+        # STORAGE_BACKEND=sqlite (or auto without credentials): local store
+        _sb = _sqlite.get_store()
+        return _sb
     if not url or not key:
         return None
     try:
@@ -59,22 +81,302 @@ def create_session(label: Optional[str] = None) -> Optional[int]:
         return None
 
 
+def update_session_title(session_id: int, title: str) -> bool:
+    """Best-effort: update the label/title of an existing session. Returns True on success."""
+    sb = _client()
+    if not sb:
+        return False
+    try:
+        sb.table("va_sessions").update({"label": title}).eq("id", int(session_id)).execute()
+        _notify_session_changed(int(session_id))
+        return True
+    except Exception:
+        return False
+
+
+# Called as fn(session_id) when a session's row changes (e.g. its title).
+_session_listeners: List[Any] = []
+
+
+def add_session_listener(fn):
+    if fn not in _session_listeners:
+        _session_listeners.append(fn)
+
+
+def _notify_session_changed(session_id: int):
+    for fn in list(_session_listeners):
+        try:
+            fn(session_id)
+        except Exception:
+            pass
+
+
+def _coerce_session_id(session_id: Union[int, str, None]) -> Optional[int]:
+    sid = session_id
+    if isinstance(sid, str):
+        try:
+            sid = int(sid)
+        except ValueError:
+            sid = None
+    return sid
+
+
+# ---------------- Write-behind log writer (va_messages / va_tool_events) ----------------
+_LOG_WRITE_BEHIND = os.getenv("LOG_WRITE_BEHIND", "1").lower() not in ("0", "false", "no", "off")
+_LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+_LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "100"))
+_LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL_MS", "250")) / 1000.0
+
+
+class _LogWriter:
+    """Bounded in-process queue that turns single-row log inserts into bulk inserts.
+
+    Records are drained by one flusher thread in FIFO order, so rows for a
+    session reach each table in the order they were logged. A batch is flushed
+    when `batch_size` records are waiting or the oldest has waited `interval`
+    seconds. When the queue is full new records are dropped and counted.
+    """
+
+    def __init__(self, client_fn, max_size: int, batch_size: int, interval: float):
+        self._client_fn = client_fn
+        self._max_size = max(1, int(max_size))
+        self._batch_size = max(1, int(batch_size))
+        self._interval = max(0.0, float(interval))
+        self._buf: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._inflight = 0
+        self._flush_requested = False
+        self._stopping = False
+        self._stats: Dict[str, Any] = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_flush_ms": None,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    def submit(self, table: str, row: Dict[str, Any], sb: Any = None) -> bool:
+        """Queue one row for `table`, written with `sb` (default: the writer's client).
+
+        Returns False if it was dropped (queue full).
+        """
+        with self._cond:
+            if len(self._buf) >= self._max_size:
+                self._stats["dropped"] += 1
+                return False
+            self._buf.append((table, row, sb))
+            self._stats["enqueued"] += 1
+            if len(self._buf) >= self._batch_size:
+                self._cond.notify_all()
+        self._ensure_thread()
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is written. Returns False on timeout."""
+        deadline = time.time() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            alive = self._thread is not None and self._thread.is_alive()
+            while alive and (self._buf or self._inflight):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._flush_requested = False
+                    return False
+                self._cond.wait(remaining)
+                alive = self._thread is not None and self._thread.is_alive()
+            self._flush_requested = False
+        if alive:
+            return True
+        # No live flusher (never started, or stopped): drain inline.
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return True
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._inflight = 0
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """Flush pending records and stop the flusher thread."""
+        ok = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        t = self._thread
+        if t is not None and t.is_alive():
+            t.join(timeout)
+        with self._cond:
+            self._thread = None
+            self._stopping = False
+        return ok
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            out = dict(self._stats)
+            out["depth"] = len(self._buf)
+            out["inflight"] = self._inflight
+            out["capacity"] = self._max_size
+        out["avg_flush_ms"] = round(out["total_flush_ms"] / out["batches"], 3) if out["batches"] else None
+        return out
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._stopping:
+                return
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="vme-log-writer", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> List[tuple]:
+        with self._cond:
+            n = min(self._batch_size, len(self._buf))
+            batch = [self._buf.popleft() for _ in range(n)]
+            self._inflight = n
+            return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._buf and not self._stopping:
+                    self._cond.wait()
+                if self._stopping and not self._buf:
+                    return
+                # Give the batch a chance to fill unless a flush was requested.
+                deadline = time.time() + self._interval
+                while (len(self._buf) < self._batch_size and not self._flush_requested
+                       and not self._stopping):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            batch = self._take_batch()
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                with self._cond:
+                    self._inflight = 0
+                    self._cond.notify_all()
+
+    def _write(self, batch: List[tuple]):
+        t0 = time.perf_counter()
+        written = failed = 0
+        try:
+            default = self._client_fn()
+        except Exception:
+            default = None
+        # Group by table, preserving arrival order within each table; rows
+        # submitted with another client are written in runs of their own.
+        by_table: Dict[str, List[tuple]] = {}
+        for table, row, client in batch:
+            client = client if client is not None else default
+            runs = by_table.setdefault(table, [])
+            if runs and runs[-1][0] is client:
+                runs[-1][1].append(row)
+            else:
+                runs.append((client, [row]))
+        for table, runs in by_table.items():
+            for sb, rows in runs:
+                if not sb:
+                    failed += len(rows)
+                    continue
+                try:
+                    res = sb.table(table).insert(rows).execute()
+                    written += len(rows)
+                    _notify_written(table, getattr(res, "data", None))
+                except Exception:
+                    # One bad row shouldn't lose the batch: retry individually.
+                    for row in rows:
+                        try:
+                            res = sb.table(table).insert(row).execute()
+                            written += 1
+                            _notify_written(table, getattr(res, "data", None))
+                        except Exception:
+                            failed += 1
+        ms = (time.perf_counter() - t0) * 1000.0
+        with self._cond:
+            self._stats["written"] += written
+            self._stats["failed"] += failed
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = round(ms, 3)
+            self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], ms), 3)
+            self._stats["total_flush_ms"] += ms
+
+
+_log_writer = _LogWriter(lambda: _client(), _LOG_QUEUE_MAX, _LOG_BATCH_SIZE, _LOG_FLUSH_INTERVAL)
+
+# Called as fn(table, rows) with the stored rows (ids assigned) after each
+# successful log insert; vme_lib.history_cache uses this for write-through.
+_write_listeners: List[Any] = []
+
+
+def add_write_listener(fn):
+    if fn not in _write_listeners:
+        _write_listeners.append(fn)
+
+
+def _notify_written(table: str, rows: Any):
+    if not isinstance(rows, list) or not rows:
+        return
+    for fn in list(_write_listeners):
+        try:
+            fn(table, rows)
+        except Exception:
+            pass
+
+
+def _log_submit(sb: Client, table: str, row: Dict[str, Any]):
+    """Queue a log row for bulk insert, or write it inline when write-behind is off."""
+    if _LOG_WRITE_BEHIND:
+        _log_writer.submit(table, row, sb)
+        return
+    try:
+        res = sb.table(table).insert(row).execute()
+        _notify_written(table, getattr(res, "data", None))
+    except Exception:
+        pass
+
+
+def log_writer_flush(timeout: float = 5.0) -> bool:
+    """Write out any queued log rows now. Returns False if the timeout elapsed first."""
+    return _log_writer.flush(timeout)
+
+
+def log_writer_shutdown(timeout: float = 5.0) -> bool:
+    """Flush queued log rows and stop the flusher thread (app shutdown / atexit)."""
+    return _log_writer.stop(timeout)
+
+
+def log_writer_stats() -> Dict[str, Any]:
+    """Queue depth, drop count and flush-latency counters for the log writer."""
+    out = _log_writer.stats()
+    out["enabled"] = _LOG_WRITE_BEHIND
+    return out
+
+
+atexit.register(log_writer_shutdown)
+
+
 def safe_log_message(session_id: Union[int, str, None], role: str, content: str):
     sb = _client()
     if not sb:
         return
     try:
-        sid = session_id
-        if isinstance(sid, str):
-            try:
-                sid = int(sid)
-            except ValueError:
-                sid = None
-        sb.table("va_messages").insert({
-            "session_id": sid,
+        _log_submit(sb, "va_messages", {
+            "session_id": _coerce_session_id(session_id),
             "role": role,
             "content": content,
-        }).execute()
+        })
     except Exception:
         pass
 
@@ -84,91 +386,272 @@ def safe_log_tool_event(session_id: Union[int, str, None], tool_name: str, input
     if not sb:
         return
     try:
-        sid = session_id
-        if isinstance(sid, str):
-            try:
-                sid = int(sid)
-            except ValueError:
-                sid = None
         payload = {
-            "session_id": sid,
+            "session_id": _coerce_session_id(session_id),
             "tool_name": tool_name,
             "input_json": input_json,
             "output_json": output_json,
         }
-        sb.table("va_tool_events").insert(payload).execute()
+        _log_submit(sb, "va_tool_events", payload)
     except Exception:
         pass
 
 
-def select_tool_events(session_id: Union[int, str], limit: int = 10):
+def select_tool_events(session_id: Union[int, str], limit: int = 10, tool_name: Optional[str] = None):
     sb = _client()
     if not sb:
         return []
     try:
         sid = int(session_id) if isinstance(session_id, str) else session_id
-        res = sb.table("va_tool_events").select("*").eq("session_id", sid).order("created_at", desc=True).limit(limit).execute()
+        q = sb.table("va_tool_events").select("*").eq("session_id", sid)
+        if tool_name:
+            q = q.eq("tool_name", tool_name)
+        res = q.order("created_at", desc=True).limit(limit).execute()
         return res.data or []
     except Exception:
         return []
 
 
-# ---------------- Settings helpers (backed by va_settings) ----------------
-def _cache_get(k: str):
-    t = _SETTINGS_CACHE.get(k)
-    if not t: return None
-    ts, val = t
-    if (time.time()-ts) > _SETTINGS_CACHE_TTL:
-        _SETTINGS_CACHE.pop(k, None)
+# ---------------- Maintained counters (va_stats, see db/schema.sql) ----------------
+def stats_get() -> Optional[Dict[str, int]]:
+    """Trigger-maintained row counts, e.g. {"va_sessions": 12, "va_messages": 340}.
+
+    One small read instead of count(*) scans. None when Supabase isn't
+    configured or the va_stats table hasn't been created yet.
+    """
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        rows = sb.table("va_stats").select("key,value").execute().data or []
+    except Exception:
+        return None
+    if not rows:
         return None
-    return val
+    return {r["key"]: int(r["value"]) for r in rows}
 
-def _cache_set(k: str, v: Any):
-    _SETTINGS_CACHE[k] = (time.time(), v)
 
-def settings_refresh():
-    _SETTINGS_CACHE.clear()
+def stats_reconcile() -> Optional[Dict[str, int]]:
+    """Recompute va_stats and per-session message_count/last_message_at from the base tables."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        return sb.rpc("va_stats_reconcile", {}).execute().data
+    except Exception:
+        return None
 
-def settings_get(key: str, default: Any=None, decrypt: bool=True) -> Any:
-    """Fetch a setting from va_settings. Uses small in-proc cache."""
-    cv = _cache_get(key)
-    if cv is not None:
-        return cv
+
+_reconciler_stop = threading.Event()
+_reconciler: Optional[threading.Thread] = None
+
+
+def start_stats_reconciler(interval: float) -> bool:
+    """Run stats_reconcile() every `interval` seconds in a daemon thread."""
+    global _reconciler
+    if interval <= 0 or (_reconciler and _reconciler.is_alive()):
+        return False
+    _reconciler_stop.clear()
+
+    def run():
+        while not _reconciler_stop.wait(interval):
+            stats_reconcile()
+    _reconciler = threading.Thread(target=run, name="vme-stats-reconcile", daemon=True)
+    _reconciler.start()
+    return True
+
+
+def stop_stats_reconciler():
+    global _reconciler
+    _reconciler_stop.set()
+    if _reconciler:
+        _reconciler.join(timeout=2.0)
+    _reconciler = None
+
+
+# ---------------- Settings helpers (backed by va_settings) ----------------
+# settings_get() reads from a snapshot of the whole va_settings table, loaded
+# with one query. A key missing from the snapshot is missing from the table,
+# so absent keys (e.g. SETTINGS_ADMIN_TOKEN when only the env var is used) are
+# answered from memory too. Once the TTL passes, readers keep getting the
+# stale snapshot while a single background thread reloads it.
+_settings_lock = threading.Lock()          # held by synchronous (cold) loads
+_settings_bg_lock = threading.Lock()       # guards _settings_refreshing
+_settings_loaded_at = 0.0        # 0 = no snapshot
+_settings_refreshing = False
+_settings_retry_at = 0.0         # back-off after a failed cold load
+_DECRYPTED: Dict[str, Any] = {}  # ciphertext -> decrypted value
+_settings_watched = False        # set by vme_lib.settings_sync while healthy
+_settings_stats: Dict[str, int] = {"hits": 0, "stale_hits": 0, "loads": 0, "load_errors": 0, "decrypts": 0}
+
+
+def _settings_install(rows: List[Dict[str, Any]]):
+    """Swap in a new snapshot built from `key,value` rows."""
+    global _SETTINGS_CACHE, _settings_loaded_at
+    snap = {r.get("key"): r.get("value") for r in rows if r.get("key") is not None}
+    live = {v for v in snap.values() if isinstance(v, str) and v.startswith("enc:v1:")}
+    for ct in [c for c in _DECRYPTED if c not in live]:
+        _DECRYPTED.pop(ct, None)
+    _SETTINGS_CACHE = snap
+    _settings_loaded_at = time.time()
+    _settings_stats["loads"] += 1
+
+
+def _settings_load() -> bool:
+    """Load the whole table. Returns False if there is no client or the query failed."""
+    global _settings_retry_at
     sb = _client()
     if not sb:
-        return default
+        return False
     try:
-        res = sb.table("va_settings").select("*").eq("key", key).limit(1).execute()
-        rows = res.data or []
-        if not rows:
-            return default
-        v = rows[0].get("value")
-        # decrypt if needed
-        if decrypt and isinstance(v, str) and v.startswith("enc:v1:"):
-            f = _fernet()
-            if f:
-                try:
-                    raw = f.decrypt(base64.b64decode(v.split("enc:v1:",1)[1]))
-                    v = json.loads(raw.decode("utf-8"))
-                except Exception:
-                    v = default
-        _cache_set(key, v)
-        return v
+        rows = sb.table("va_settings").select("key,value").execute().data or []
     except Exception:
+        _settings_stats["load_errors"] += 1
+        _settings_retry_at = time.time() + 5
+        return False
+    _settings_install(rows)
+    return True
+
+
+def _settings_refresh_bg():
+    global _settings_refreshing, _settings_loaded_at
+    try:
+        if not _settings_load() and _settings_loaded_at:
+            # keep serving the old snapshot; try again after another TTL
+            _settings_loaded_at = time.time()
+    finally:
+        _settings_refreshing = False
+
+
+def _settings_ttl() -> float:
+    return _SETTINGS_CACHE_TTL_WATCHED if _settings_watched else _SETTINGS_CACHE_TTL
+
+
+def _settings_peek() -> Optional[Dict[str, Any]]:
+    """Return the snapshot if it can be served without blocking, else None.
+
+    A stale (but not too stale) snapshot is returned as-is and one
+    background refresh is started.
+    """
+    global _settings_refreshing
+    if not _settings_loaded_at:
+        return None
+    age = time.time() - _settings_loaded_at
+    ttl = _settings_ttl()
+    if age <= ttl:
+        _settings_stats["hits"] += 1
+        return _SETTINGS_CACHE
+    if age > ttl + _SETTINGS_STALE_MAX:
+        return None
+    _settings_stats["stale_hits"] += 1
+    snap = _SETTINGS_CACHE
+    with _settings_bg_lock:
+        if not _settings_refreshing:
+            _settings_refreshing = True
+            threading.Thread(target=_settings_refresh_bg, name="vme-settings-refresh", daemon=True).start()
+    return snap
+
+
+def _settings_snapshot() -> Optional[Dict[str, Any]]:
+    """Return the snapshot, loading it synchronously (single-flight) when cold."""
+    snap = _settings_peek()
+    if snap is not None:
+        return snap
+    if time.time() < _settings_retry_at:
+        return _SETTINGS_CACHE if _settings_loaded_at else None
+    with _settings_lock:
+        # another thread may have loaded it while we waited
+        if _settings_loaded_at and time.time() - _settings_loaded_at <= _settings_ttl():
+            return _SETTINGS_CACHE
+        if not _settings_load():
+            return _SETTINGS_CACHE if _settings_loaded_at else None
+    return _SETTINGS_CACHE
+
+
+def settings_refresh():
+    """Drop the snapshot; the next read reloads the table."""
+    global _SETTINGS_CACHE, _settings_loaded_at, _settings_retry_at
+    with _settings_lock:
+        _SETTINGS_CACHE = {}
+        _settings_loaded_at = 0.0
+        _settings_retry_at = 0.0
+        _DECRYPTED.clear()
+
+
+def settings_stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = dict(_settings_stats)
+    out["keys"] = len(_SETTINGS_CACHE)
+    out["age_s"] = round(time.time() - _settings_loaded_at, 3) if _settings_loaded_at else None
+    out["refreshing"] = _settings_refreshing
+    out["ttl_s"] = _settings_ttl()
+    out["watched"] = _settings_watched
+    return out
+
+def _decode_setting(v: Any, default: Any = None, decrypt: bool = True) -> Any:
+    """Decrypt an `enc:v1:` value when a Fernet key is available.
+
+    Decrypted values are memoised by ciphertext, so repeated reads of the
+    same secret don't rerun Fernet.
+    """
+    if decrypt and isinstance(v, str) and v.startswith("enc:v1:"):
+        if v in _DECRYPTED:
+            return _DECRYPTED[v]
+        f = _fernet()
+        if f:
+            try:
+                raw = f.decrypt(base64.b64decode(v.split("enc:v1:",1)[1]))
+                dv = json.loads(raw.decode("utf-8"))
+                _settings_stats["decrypts"] += 1
+                _DECRYPTED[v] = dv
+                return dv
+            except Exception:
+                v = default
+    return v
+
+def _encode_setting(k: str, v: Any) -> Any:
+    """Encrypt values of secret keys when APP_ENCRYPTION_KEY is set."""
+    f = _fernet()
+    if k in _SECRET_KEYS and f:
+        payload = json.dumps(v).encode("utf-8")
+        token = f.encrypt(payload)
+        return "enc:v1:" + base64.b64encode(token).decode("ascii")
+    return v
+
+def _mask_settings(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for r in rows:
+        k = r["key"]; v = r.get("value")
+        if k in _SECRET_KEYS:
+            # mask secrets: show only last 4 chars if string
+            s = ""
+            if isinstance(v, str):
+                # show enc marker or last 4
+                if v.startswith("enc:v1:"):
+                    s = "enc(v1)"
+                else:
+                    s = ("*"*6) + (v[-4:] if len(v) >= 4 else "")
+            out[k] = s or "*****"
+        else:
+            out[k] = v
+    return out
+
+def settings_get(key: str, default: Any=None, decrypt: bool=True) -> Any:
+    """Fetch a setting from the va_settings snapshot (absent keys return `default`)."""
+    snap = _settings_snapshot()
+    if snap is None or key not in snap:
         return default
+    v = snap[key]
+    if v is None:
+        return default
+    return _decode_setting(v, default, decrypt)
 
 def settings_put(mapping: Dict[str, Any]):
     """Upsert settings into va_settings. Secrets are optionally encrypted if APP_ENCRYPTION_KEY is set."""
     sb = _client()
     if not sb:
         raise RuntimeError("Supabase not configured")
-    f = _fernet()
     for k, v in mapping.items():
-        store_v: Any = v
-        if k in _SECRET_KEYS and f:
-            payload = json.dumps(v).encode("utf-8")
-            token = f.encrypt(payload)
-            store_v = "enc:v1:" + base64.b64encode(token).decode("ascii")
+        store_v = _encode_setting(k, v)
         try:
             # preferred (newer supabase-py)
             sb.table("va_settings").upsert({"key": k, "value": store_v}).on_conflict("key").execute()
@@ -179,7 +662,12 @@ def settings_put(mapping: Dict[str, Any]):
             except Exception:
                 pass
             sb.table("va_settings").insert({"key": k, "value": store_v}).execute()
-        _SETTINGS_CACHE.pop(k, None)
+        _settings_write_through(k, store_v)
+
+def _settings_write_through(k: str, store_v: Any):
+    """Reflect a successful write in the snapshot instead of dropping it."""
+    if _settings_loaded_at:
+        _SETTINGS_CACHE[k] = store_v
 
 def settings_list() -> Dict[str, Any]:
     """Return all settings as {key:value}, masking secrets."""
@@ -187,19 +675,140 @@ def settings_list() -> Dict[str, Any]:
     if not sb:
         return {}
     rows = sb.table("va_settings").select("*").execute().data or []
-    out: Dict[str, Any] = {}
-    for r in rows:
-        k = r["key"]; v = r.get("value")
-        if k in _SECRET_KEYS:
-            # mask secrets: show only last 4 chars if string
-            s = ""
-            if isinstance(v, str):
-                # show enc marker or last 4
-                if v.startswith("enc:v1:"):
-                    s = "enc(v1)"
-                else:
-                    s = ("*"*6) + (v[-4:] if len(v) >= 4 else "")
-            out[k] = s or "*****"
-        else:
-            out[k] = v
-    return out
+    return _mask_settings(rows)
+
+
+# ---------------- Tasks helpers (va_tasks / va_task_events) ----------------
+def insert_task(title: str, body: str | None = None) -> int | None:
+    """Insert a va_tasks row and return the new id, or None on failure / missing client."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        res = sb.table('va_tasks').insert({'title': title, 'body': body}).execute()
+        return res.data[0]['id'] if res.data else None
+    except Exception:
+        return None
+
+
+def update_task_status(id: int, status: str, branch: str | None = None, pr_number: int | None = None, error: str | None = None) -> bool:
+    sb = _client()
+    if not sb:
+        return False
+    try:
+        upd = {'status': status}
+        if branch is not None: upd['branch'] = branch
+        if pr_number is not None: upd['pr_number'] = pr_number
+        if error is not None: upd['error'] = error
+        sb.table('va_tasks').update(upd).eq('id', int(id)).execute()
+        return True
+    except Exception:
+        return False
+
+
+def insert_task_event(task_id: int, kind: str, data_dict: dict | None = None) -> Optional[Dict[str, Any]]:
+    """Insert a va_task_events row; returns the stored row (with its id) when the store reports it."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        res = sb.table('va_task_events').insert({'task_id': int(task_id), 'kind': kind, 'data': data_dict or {}}).execute()
+        row = res.data[0] if isinstance(res.data, list) and res.data else None
+        return row if isinstance(row, dict) else None
+    except Exception:
+        return None
+
+
+def get_task(task_id: int) -> Optional[Dict[str, Any]]:
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        rows = sb.table('va_tasks').select('*').eq('id', int(task_id)).limit(1).execute().data or []
+        return rows[0] if rows else None
+    except Exception:
+        return None
+
+
+def list_tasks(limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+    """Most recent tasks first. Returns None when the store is unavailable."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        return sb.table('va_tasks').select('*').order('created_at', desc=True).limit(limit).execute().data or []
+    except Exception:
+        return None
+
+
+def select_task_events(task_id: int, after_id: int | None = None, limit: int | None = None) -> List[Dict[str, Any]]:
+    """A task's events in id order; only those with id > after_id when given (stream cursors)."""
+    sb = _client()
+    if not sb:
+        return []
+    try:
+        q = sb.table('va_task_events').select('*').eq('task_id', int(task_id))
+        if after_id is not None:
+            q = q.gt('id', int(after_id))
+        q = q.order('id')
+        if limit is not None:
+            q = q.limit(int(limit))
+        return q.execute().data or []
+    except Exception:
+        return []
+
+
+# ---------------- Task queue leases (va_task_claim & co., see db/schema.sql) ----------------
+def task_claim(worker: str, lease_s: float) -> Optional[Dict[str, Any]]:
+    """Atomically claim the oldest queued task for `worker`; the row (now running), or None when none is queued.
+
+    Unlike the other helpers this raises when there is no store or the call
+    fails (e.g. `va_task_claim` hasn't been applied yet), so the caller can
+    tell "nothing to do" from "the queue doesn't work".
+    """
+    sb = _client()
+    if not sb:
+        raise RuntimeError('no store configured')
+    data = sb.rpc('va_task_claim', {'p_worker': worker, 'p_lease_s': max(1, int(lease_s))}).execute().data
+    if isinstance(data, dict):
+        data = [data]
+    row = data[0] if isinstance(data, list) and data else None
+    return row if isinstance(row, dict) and row.get('id') is not None else None
+
+
+def task_heartbeat(task_id: int, worker: str, lease_s: float) -> Optional[bool]:
+    """Extend the lease. False when `worker` no longer holds it (expired, cancelled); None on error."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        data = sb.rpc('va_task_heartbeat', {'p_id': int(task_id), 'p_worker': worker,
+                                            'p_lease_s': max(1, int(lease_s))}).execute().data
+    except Exception:
+        return None
+    return data if isinstance(data, bool) else None
+
+
+def task_finish(task_id: int, worker: str, status: str, error: str | None = None) -> Optional[bool]:
+    """Set the final status if `worker` still holds the lease. False when it doesn't; None on error."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        data = sb.rpc('va_task_finish', {'p_id': int(task_id), 'p_worker': worker, 'p_status': status,
+                                         'p_error': error}).execute().data
+    except Exception:
+        return None
+    return data if isinstance(data, bool) else None
+
+
+def task_requeue_expired(max_attempts: int = 3) -> Optional[int]:
+    """Put running tasks whose lease expired back in the queue (failed after max_attempts). Count, or None."""
+    sb = _client()
+    if not sb:
+        return None
+    try:
+        data = sb.rpc('va_task_requeue_expired', {'p_max_attempts': int(max_attempts)}).execute().data
+    except Exception:
+        return None
+    return data if isinstance(data, int) and not isinstance(data, bool) else None